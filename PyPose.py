@@ -20,6 +20,7 @@
 """
 
 import sys, time, os
+STARTED = time.time()
 sys.path.append("tools")
 import wx
 import serial
@@ -41,9 +42,13 @@ except Exception:
     print("Driver dynamixel_zmq not supported!")
 
 
-from PoseEditor import *
-from SeqEditor import *
 from project import *
+from motion import Interpolator
+from player import SequencePlayer
+from trajectory import TrajectoryCache
+from slots import PoseSlots
+from toolindex import findTools
+from ports import PortCache
 
 VERSION = "PyPose/NUKE 0015"
 
@@ -65,6 +70,7 @@ class editor(wx.Frame):
     ID_TIMER=wx.NewId()
     ID_COL_MENU=wx.NewId()
     ID_LIVE_UPDATE=wx.NewId()
+    ID_SPEED_SYNC=wx.NewId()
     ID_2COL=wx.NewId()
     ID_3COL=wx.NewId()
     ID_4COL=wx.NewId()
@@ -79,10 +85,17 @@ class editor(wx.Frame):
         self.toolIndex = dict() # existant tools
         self.saveReq = False
         self.panel = None
+        self.tool = ""              # module of the tool shown
         self.driver = None
+        self.interpolator = None    # host interpolation, when the driver has none
+        self.player = None          # host sequence player, likewise
+        self.trajectories = TrajectoryCache()   # compiled sequences, for the player
+        self.slots = None           # what the PyPose sketch already has
         self.filename = ""
         self.dirname = ""
         self.columns = 2        # column count for pose editor
+        self.portCache = PortCache()
+        self.portCache.refresh()    # so the connection dialog opens at once
 
         # for clearing red color on status bar
         self.timer = wx.Timer(self, self.ID_TIMER)
@@ -102,15 +115,8 @@ class editor(wx.Frame):
         self.menubar.Append(prjmenu, "project")
 
         toolsmenu = wx.Menu()
-        # find our tools
-        toolFiles = list()
-        for file in os.listdir("tools"):
-            if file[-3:] == '.py' and file != "__init__.py" and file != "ToolPane.py":
-                toolFiles.append(file[0:-3])       
-        # load tool names, give them IDs
-        for t in toolFiles:
-            module = __import__(t, globals(), locals(), ["NAME"])    
-            name = getattr(module, "NAME")
+        # find our tools, they are imported when first opened
+        for (t, name, status) in findTools("tools"):
             cid = wx.NewId()
             self.toolIndex[cid] = (t, name)
             toolsmenu.Append(cid,name)   
@@ -128,6 +134,8 @@ class editor(wx.Frame):
         self.menu_config.AppendMenu(self.ID_COL_MENU,"pose editor",self.menu_column)
         # live update
         self.live = self.menu_config.Append(self.ID_LIVE_UPDATE,"live pose update",kind=wx.ITEM_CHECK)
+        # without on-board interpolation: stream frames, or set goal speeds?
+        self.speedSync = self.menu_config.Append(self.ID_SPEED_SYNC,"simultaneous arrival",kind=wx.ITEM_CHECK)
         #menu_config.Append(self.ID_TEST,"test") # for in-house testing of boards
         self.menubar.Append(self.menu_config, "config")    
 
@@ -157,6 +165,7 @@ class editor(wx.Frame):
         self.Bind(wx.EVT_TIMER, self.OnTimer, id=self.ID_TIMER)
 
         wx.EVT_MENU(self, self.ID_LIVE_UPDATE, self.setLiveUpdate)
+        wx.EVT_MENU(self, self.ID_SPEED_SYNC, self.setSpeedSync)
         wx.EVT_MENU(self, self.ID_2COL, self.do2Col)
         wx.EVT_MENU(self, self.ID_3COL, self.do3Col)
         wx.EVT_MENU(self, self.ID_4COL, self.do4Col)
@@ -166,6 +175,9 @@ class editor(wx.Frame):
         self.sb.SetStatusWidths([-1,250])
         self.sb.SetStatusText('not connected',1)
 
+        self.sizer = wx.BoxSizer(wx.VERTICAL)
+        self.SetSizer(self.sizer)
+        self.SetAutoLayout(1)
         self.loadTool()
         self.sb.SetStatusText('please create or open a project...',0)
         self.Centre()
@@ -178,30 +190,50 @@ class editor(wx.Frame):
     ###########################################################################
     # toolpane handling   
     def loadTool(self, e=None):
+        """ Show a tool. Panes are built the first time their tool is
+        chosen, then kept (hidden) in self.tools for next time. """
         if e == None:
             t = "PoseEditor"
         else:
             t = self.toolIndex[e.GetId()][0]  # get name of file for this tool  
-            if self.tool == t:
-                return
+        if self.tool == t and self.panel != None:
+            return
+        self.Freeze()
         if self.panel != None:
+            self.panel.cancelJob()
             self.panel.save()
-            self.sizer.Remove(self.panel)
-            self.panel.Destroy()
-        self.ClearBackground()
-        # instantiate
-        module = __import__(t, globals(), locals(), [t,"STATUS"])
-        panelClass = getattr(module, t)
-        self.panel = panelClass(self,self.driver)
-        self.sizer=wx.BoxSizer(wx.VERTICAL)
-        self.sizer.Add(self.panel,1,wx.EXPAND|wx.ALL,10)
-        self.SetSizer(self.sizer)
-        self.SetAutoLayout(1)
+            self.sizer.Show(self.panel, False)
+        if t not in self.tools:
+            # instantiate
+            module = __import__(t, globals(), locals(), [t,"STATUS"])
+            panelClass = getattr(module, t)
+            self.tools[t] = panelClass(self,self.driver)
+            self.sizer.Add(self.tools[t],1,wx.EXPAND|wx.ALL,10)
+        self.panel = self.tools[t]
+        if self.panel.port != self.driver:
+            self.panel.port = self.driver
+            self.panel.portUpdated()
+        self.panel.activated()
+        self.sizer.Show(self.panel, True)
         self.sizer.Fit(self)
-        self.sb.SetStatusText(getattr(module,"STATUS"),0)
+        self.Layout()
+        self.Thaw()
+        self.sb.SetStatusText(getattr(sys.modules[t],"STATUS"),0)
         self.tool = t
         self.panel.SetFocus()
 
+    def portUpdated(self):
+        """ Tell every pane we built about the new driver. """
+        for panel in self.tools.values():
+            panel.port = self.driver
+            panel.portUpdated()
+
+    def projectUpdated(self):
+        """ Tell every pane we built that the project was replaced. """
+        for panel in self.tools.values():
+            panel.projectUpdated()
+        self.sizer.Fit(self)
+
     ###########################################################################
     # file handling                
     def newFile(self, e):  
@@ -209,6 +241,8 @@ class editor(wx.Frame):
         dlg = NewProjectDialog(self, -1, "Create New Project")
         if dlg.ShowModal() == wx.ID_OK:
             self.project.new(dlg.name.GetValue(), dlg.count.GetValue(), int(dlg.resolution.GetValue()))
+            self.trajectories.clear()
+            self.projectUpdated()
             self.loadTool()      
             self.sb.SetStatusText('created new project ' + self.project.name + ', please create a pose...')
             self.SetTitle(VERSION+" - " + self.project.name)
@@ -224,8 +258,10 @@ class editor(wx.Frame):
             self.dirname = dlg.GetDirectory()
             print("Opening: " + self.filename)            
             self.project.load(self.filename)  
+            self.trajectories.clear()
             self.SetTitle(VERSION+" - " + self.project.name)
             dlg.Destroy()
+            self.projectUpdated()
             self.loadTool()
             self.sb.SetStatusText('opened ' + self.filename)
 
@@ -267,33 +303,7 @@ class editor(wx.Frame):
     # Port Manipulation
     def findPorts(self):
         """ return a list of serial ports """
-        self.ports = list()
-        # windows first
-        for i in range(20):
-            try:
-                s = serial.Serial("COM"+str(i))
-                s.close()
-                self.ports.append("COM"+str(i))
-            except:
-                pass
-        if len(self.ports) > 0:
-            return self.ports
-        # mac specific next:        
-        try:
-            for port in os.listdir("/dev/"):
-                if port.startswith("tty.usbserial"):
-                    self.ports.append("/dev/"+port)
-        except:
-            pass
-        # linux/some-macs
-        for k in ["/dev/ttyUSB","/dev/ttyACM","/dev/ttyS"]:
-                for i in range(6):
-                    try:
-                        s = serial.Serial(k+str(i))
-                        s.close()
-                        self.ports.append(k+str(i))
-                    except:
-                        pass
+        self.ports = self.portCache.get()
         return self.ports
 			
     def doConnect(self):
@@ -307,10 +317,12 @@ class editor(wx.Frame):
                 else:
                     con_port=self.project.connection['settings']['serial']['port']
                     con_baudrate=self.project.connection['settings']['serial']['baudrate']
+                    # is the PyPose sketch on the other end, or just a bus?
+                    con_sketch=self.project.connection['settings']['serial'].get('sketch',True)
                     self.driver = serial_Driver(
                         con_port,
                         con_baudrate,
-                        True
+                        con_sketch
                     )
 
                     status_text="%s @ %i"%(con_port,con_baudrate)
@@ -322,7 +334,7 @@ class editor(wx.Frame):
                 con_uri=self.project.connection['settings']['dynamixel_zmq']['uri']
                 self.driver = dynamixel_zmq_Driver(
                     con_uri,
-                    True
+                    False
                 )
                 status_text="ZMQ: %s"%(con_uri)
                 
@@ -341,16 +353,24 @@ class editor(wx.Frame):
             self.timer.Start(20)
         else:
             self.connected=True
+            self.interpolator = Interpolator(self.driver)
+            self.setSpeedSync()
+            self.player = SequencePlayer(self.interpolator, self.trajectories)
+            self.slots = PoseSlots(self.driver)
             self.menu_config.SetLabel(self.ID_CONNECT,'disconnect')
-            self.panel.port = self.driver
-            self.panel.portUpdated()
+            self.portUpdated()
             self.sb.SetStatusText(status_text,1)
             
     def doDisconnect(self):
-        if self.project.connection['type'] == 'serial':
-            if self.driver:
-                self.driver.close()
-                self.driver=None
+        if self.driver:
+            self.player.halt()
+            self.panel.cancelJob()
+            self.driver.close()
+            self.driver=None
+            self.interpolator = None
+            self.player = None
+            self.slots = None
+            self.portUpdated()
         self.connected=False
         self.menu_config.SetLabel(self.ID_CONNECT,'connect')
 
@@ -430,19 +450,28 @@ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA)
     # Pose Editor settings
     def do2Col(self, e=None):
         self.columns = 2
-        if self.tool == "PoseEditor":
-            self.loadTool()
+        if "PoseEditor" in self.tools:
+            self.tools["PoseEditor"].projectUpdated()
+            self.sizer.Fit(self)
     def do3Col(self, e=None):
         self.columns = 3
-        if self.tool == "PoseEditor":
-            self.loadTool()
+        if "PoseEditor" in self.tools:
+            self.tools["PoseEditor"].projectUpdated()
+            self.sizer.Fit(self)
     def do4Col(self, e=None):
         self.columns = 4
-        if self.tool == "PoseEditor":
-            self.loadTool()
+        if "PoseEditor" in self.tools:
+            self.tools["PoseEditor"].projectUpdated()
+            self.sizer.Fit(self)
     def setLiveUpdate(self, e=None):
-        if self.tool == "PoseEditor":
-            self.panel.live = self.live.IsChecked()
+        if "PoseEditor" in self.tools:
+            self.tools["PoseEditor"].live = self.live.IsChecked()
+    def setSpeedSync(self, e=None):
+        if self.interpolator != None:
+            if self.speedSync.IsChecked():
+                self.interpolator.mode = "speed"
+            else:
+                self.interpolator.mode = "stream"
         
 ###############################################################################
 # New Project Dialog
@@ -494,6 +523,8 @@ class ConnectionSetup(wx.Frame):
         self.combo_port = wx.ComboBox(self.con_pane_serial, -1, choices=[], style=wx.CB_DROPDOWN)
         self.label_baudrate = wx.StaticText(self.con_pane_serial, -1, "Baudrate")
         self.combo_baudrate = wx.ComboBox(self.con_pane_serial, -1, choices=self.baudrates, style=wx.CB_DROPDOWN)
+        self.check_sketch = wx.CheckBox(self.con_pane_serial, -1, "PyPose sketch")
+        self.check_sketch.SetValue(True)
 
         #page for dynamixel_zmq
         self.con_pane_dzmq = wx.Panel(self.con_type, -1)
@@ -532,6 +563,9 @@ class ConnectionSetup(wx.Frame):
         
             if ('baudrate' in connection_settings['serial']) and (type(connection_settings['serial']['baudrate'])==int):
                 self.combo_baudrate.SetValue(str(connection_settings['serial']['baudrate']))
+
+            if ('sketch' in connection_settings['serial']):
+                self.check_sketch.SetValue(connection_settings['serial']['sketch'])
         
         #fill dzmq_pane
         if ('dynamixel_zmq' in connection_settings):
@@ -553,6 +587,7 @@ class ConnectionSetup(wx.Frame):
         grid_sizer_3.Add(self.combo_port, 0, wx.ALIGN_CENTER_HORIZONTAL|wx.ALIGN_CENTER_VERTICAL, 0)
         grid_sizer_3.Add(self.label_baudrate, 0, wx.ALIGN_CENTER_HORIZONTAL|wx.ALIGN_CENTER_VERTICAL, 0)
         grid_sizer_3.Add(self.combo_baudrate, 0, wx.ALIGN_CENTER_HORIZONTAL|wx.ALIGN_CENTER_VERTICAL, 0)
+        grid_sizer_3.Add(self.check_sketch, 0, wx.ALIGN_CENTER_HORIZONTAL|wx.ALIGN_CENTER_VERTICAL, 0)
         self.con_pane_serial.SetSizer(grid_sizer_3)
         self.con_type.AddPage(self.con_pane_serial, "Serial")
 
@@ -588,6 +623,7 @@ class ConnectionSetup(wx.Frame):
              
             settings_p['serial']['port']=str(self.combo_port.GetValue())
             settings_p['serial']['baudrate']=int(self.combo_baudrate.GetValue())
+            settings_p['serial']['sketch']=self.check_sketch.GetValue()
         elif new_con_type == 'dynamixel_zmq':
             if not 'dynamixel_zmq' in settings_p:
                 settings_p['dynamixel_zmq']={}
@@ -610,5 +646,6 @@ if __name__ == "__main__":
     print("PyPose starting... ")
     app = wx.App()
     frame = editor()
+    print("PyPose started in %.2f S" % (time.time() - STARTED))
     app.MainLoop()
 
@@ -86,4 +86,9 @@ AX_REG_WRITE = 4
 AX_ACTION = 5
 AX_RESET = 6
 AX_SYNC_WRITE = 131
+AX_SYNC_READ = 132      # ArbotiX extension, the board replies with all values
 
+
+# Bus baud rates, fastest first, with their P_BAUD_RATE values (2M/(n+1))
+AX_BAUD_RATES = [(1000000, 1), (500000, 3), (400000, 4), (250000, 7),
+                 (200000, 9), (115200, 16), (57600, 34), (19200, 103), (9600, 207)]
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+""" Benchmark of the lizard3 IK hot path: radToServo, bodyIK, legIK,
+    doIK and batchIK, over 4/6 legs and 1024/4096 servos, with random
+    body poses. Runs without wx.
+
+    bench_ik.py          run, and compare against the stored baseline
+    bench_ik.py --save   run, and store the results as the new baseline
+
+    Rates depend on the machine, so the baseline is kept per machine and
+    not checked in. Each case also records a checksum of its output, so a
+    change that makes the IK faster but different shows up too. """
+
+import sys, os, time, random, json, zlib
+from math import pi
+BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH, "..", "tools"))
+sys.path.insert(0, os.path.join(BENCH, "..", "tools", "models", "lizard3"))
+import lizard3 as model
+
+BASELINE = os.path.join(BENCH, "bench_ik_baseline.json")
+POSES = 500         # random body poses per case
+
+# synthetic leg dimensions: coxa, femur, tibia, X, Y, mid-Y
+DIMS = [52, 47, 125, 60, 40, 70]
+
+def build(legs, resolution):
+    """ a calibrated model, as NukeEditor would set it up. """
+    m = model.lizard3(legs)
+    m.config(legs, DIMS, resolutions=[resolution for i in range(3*legs+1)])
+    m.mins = [0 for i in range(3*legs+1)]
+    m.maxs = [resolution-1 for i in range(3*legs+1)]
+    m.neutrals = [resolution//2 for i in range(3*legs+1)]
+    m.nextPose = list(m.neutrals)
+    # stance, within reach of the synthetic legs
+    for (e,g,p,mount,mi) in model.LEGS:
+        m[e] = [int(mount[0]*110), (mi[1])*120, 90]
+    return m
+
+def bodyPoses(seed=42):
+    """ random body rotations (+/- 0.2 rad) and shifts (+/- 20mm). """
+    rnd = random.Random(seed)
+    return [([rnd.uniform(-0.2,0.2) for i in range(3)], [rnd.uniform(-20,20) for i in range(2)]) for i in range(POSES)]
+
+def setBody(m, rot, pos):
+    m.bodyRotX, m.bodyRotY, m.bodyRotZ = rot
+    m.bodyPosX, m.bodyPosY = pos
+
+def best(fn, reps=5):
+    """ best of reps runs, returns (seconds, output). """
+    t = None
+    for i in range(reps):
+        start = time.time()
+        out = fn()
+        dt = time.time() - start
+        if t == None or dt < t:
+            t = dt
+    return t, out
+
+def checksum(out):
+    return zlib.crc32(repr(out).encode()) & 0xffffffff
+
+###############################################################################
+# Cases, each returns (solves, seconds, checksum)
+def benchRadToServo(m, resolution, body):
+    rads = [i*pi/POSES - pi/2 for i in range(POSES)]
+    t, out = best(lambda: [model.radToServo(r, resolution) for r in rads])
+    return len(rads), t, checksum(out)
+
+def benchBodyIK(m, resolution, body):
+    def run():
+        out = list()
+        for rot, pos in body:
+            setBody(m, rot, pos)
+            for (disp, (e,g,p,mount,mi)) in zip(m.legMounts(), model.LEGS):
+                out.append(m.bodyIK(m[e][0], m[e][1], m[e][2], disp[0], disp[1], 0))
+        return out
+    t, out = best(run)
+    return len(out), t, checksum(out)
+
+def benchLegIK(m, resolution, body):
+    rnd = random.Random(7)
+    targets = [(rnd.uniform(60,140), rnd.uniform(60,140), rnd.uniform(50,120)) for i in range(POSES)]
+    t, out = best(lambda: [m.legIK(x, y, z, resolution) for (x,y,z) in targets])
+    return len(targets), t, checksum(out)
+
+def benchDoIK(m, resolution, body):
+    def run():
+        out = list()
+        for rot, pos in body:
+            setBody(m, rot, pos)
+            fails = m.doIK()
+            out.append((fails, list(m.nextPose)))
+        return out
+    t, out = best(run)
+    return len(out), t, checksum(out)
+
+def benchBatchIK(m, resolution, body):
+    # one batch is quick, make it bigger so the timing means something
+    body = body*20
+    rot = model.numpy.array([r for (r,p) in body])
+    pos = model.numpy.array([p for (r,p) in body])
+    endpoints = [m.endpoints()]*len(body)
+    t, out = best(lambda: m.batchIK(endpoints, bodyRot=rot, bodyPos=pos))
+    return len(body), t, checksum(out[0].tolist())
+
+CASES = [("radToServo", benchRadToServo),
+         ("bodyIK", benchBodyIK),
+         ("legIK", benchLegIK),
+         ("doIK", benchDoIK)]
+if model.HAS_NUMPY:
+    CASES.append(("batchIK", benchBatchIK))
+
+def run():
+    body = bodyPoses()
+    results = dict()
+    for legs in [4, 6]:
+        for resolution in [1024, 4096]:
+            for name, fn in CASES:
+                m = build(legs, resolution)
+                n, t, check = fn(m, resolution, body)
+                results["%s/%d legs/%d" % (name, legs, resolution)] = {"rate": n/t, "checksum": check}
+    return results
+
+def compare(results, baseline, tolerance):
+    """ print results against the baseline, return the number of regressions. """
+    bad = 0
+    for k in sorted(results.keys()):
+        rate = results[k]["rate"]
+        line = "%-26s %12.0f solves/S" % (k, rate)
+        if k in baseline:
+            ratio = rate/baseline[k]["rate"]
+            line = line + "  %5.2fx baseline" % ratio
+            if ratio < 1.0 - tolerance:
+                line = line + "  SLOWER"
+                bad = bad + 1
+            if results[k]["checksum"] != baseline[k]["checksum"]:
+                line = line + "  OUTPUT CHANGED"
+                bad = bad + 1
+        print(line)
+    return bad
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="lizard3 IK benchmarks")
+    parser.add_argument("--save", action="store_true", help="store results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown, as a fraction (0.2)")
+    args = parser.parse_args()
+
+    results = run()
+    baseline = dict()
+    if os.path.exists(BASELINE) and not args.save:
+        baseline = json.load(open(BASELINE))
+    bad = compare(results, baseline, args.tolerance)
+    if args.save:
+        json.dump(results, open(BASELINE, "w"), indent=1, sort_keys=True)
+        print("Saved baseline to " + BASELINE)
+    elif bad > 0:
+        print(str(bad) + " regressions against baseline")
+        sys.exit(1)
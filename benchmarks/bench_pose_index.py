@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+""" Benchmark of the pose -> sequence reference index,
+    versus scanning every transition of every sequence. """
+
+import sys, os, time, random
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from project import *
+
+def build(seqCount, poseCount=200, tranCount=20, seed=42):
+    """ build a synthetic project with seqCount sequences. """
+    rnd = random.Random(seed)
+    prj = project()
+    prj.new("bench", 18, 1024)
+    for i in range(poseCount):
+        prj.poses["pose"+str(i)] = pose("", prj.count)
+    for i in range(seqCount):
+        seq = sequence()
+        for j in range(tranCount):
+            seq.append("pose" + str(rnd.randrange(poseCount)) + "|" + str(rnd.randrange(100,1000)))
+        prj.setSequence("seq"+str(i), seq)
+    return prj
+
+def scanUsers(prj, poseName):
+    """ the old way: parse every transition of every sequence. """
+    users = list()
+    for s in prj.sequences.keys():
+        for t in prj.sequences[s]:
+            if t[0:t.find("|")] == poseName:
+                users.append(s)
+                break
+    return users
+
+def timeit(fn, reps):
+    start = time.time()
+    for i in range(reps):
+        fn(i)
+    return (time.time() - start) / reps
+
+def run(seqCount, reps=200):
+    prj = build(seqCount)
+    names = sorted(prj.poses.keys())
+    scan = timeit(lambda i: scanUsers(prj, names[i%len(names)]), reps)
+    indexed = timeit(lambda i: prj.poseUsers(names[i%len(names)]), reps)
+    # rename back and forth, so the project stays the same size
+    def rename(i):
+        prj.renamePose("pose0", "renamed")
+        prj.renamePose("renamed", "pose0")
+    renames = timeit(rename, reps) / 2
+    print("%6d sequences: scan %9.1f us, index %7.2f us, rename %8.1f us" % (seqCount, scan*1e6, indexed*1e6, renames*1e6))
+
+if __name__ == "__main__":
+    for n in [100, 1000, 5000, 10000]:
+        run(n)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+
+""" Cold start cost of finding the tools: reading NAME from the sources
+    (toolindex.findTools, what PyPose does now) versus importing every
+    tool module. Each way runs in a fresh interpreter, so nothing is
+    already imported or cached. Importing the tools needs wx. """
+
+import sys, os, subprocess
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+RUNS = 5
+
+PRELUDE = "import sys, time; start = time.time(); sys.path.insert(0, 'tools'); sys.path.insert(0, '.'); "
+SCAN = "from toolindex import findTools; tools = findTools('tools'); "
+IMPORT = "from toolindex import findTools; tools = [__import__(t).NAME for (t, n, s) in findTools('tools')]; "
+REPORT = "print('%f %d' % (time.time() - start, len(tools)))"
+
+def cold(code):
+    """ best of RUNS fresh interpreters, returns (seconds, tools) or None. """
+    best = None
+    for i in range(RUNS):
+        p = subprocess.Popen([sys.executable, "-c", PRELUDE + code + REPORT], cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = p.communicate()
+        if p.returncode != 0:
+            return None
+        t, n = out.split()
+        if best == None or float(t) < best[0]:
+            best = (float(t), int(n))
+    return best
+
+if __name__ == "__main__":
+    for name, code in [("scan sources", SCAN), ("import tools", IMPORT)]:
+        result = cold(code)
+        if result == None:
+            print("%-14s failed (is wx installed?)" % name)
+        else:
+            print("%-14s %8.1f mS for %d tools" % (name, 1000*result[0], result[1]))
@@ -37,9 +37,10 @@ width = 300
 class Commander(wx.Frame):
     TIMER_ID = 100
 
-    def __init__(self, parent, ser, debug = False):  
+    def __init__(self, parent, ser, debug = False, walker = None):  
         wx.Frame.__init__(self, parent, -1, "ArbotiX Commander", style = wx.DEFAULT_FRAME_STYLE & ~ (wx.RESIZE_BORDER | wx.MAXIMIZE_BOX))
         self.ser = ser    
+        self.walker = walker    # walk with the host IK, rather than the sketch
 
         sizer = wx.GridBagSizer(10,10)
 
@@ -91,10 +92,15 @@ class Commander(wx.Frame):
 
         self.SetSizerAndFit(sizer)
         self.Show(True)
+        if self.walker != None:
+            self.walker.start()
 
     def onClose(self, event):
         self.timer.Stop()
-        self.sendPacket(128,128,128,128,0)
+        if self.walker != None:
+            self.walker.halt()
+        else:
+            self.sendPacket(128,128,128,128,0)
         self.Destroy()
 
     def onMove(self, event=None):
@@ -112,9 +118,12 @@ class Commander(wx.Frame):
         Buttons = 0
         if self.selStrafe.GetValue():
             Buttons = BUT_LT
-        self.sendPacket(self.tilt.GetValue(), self.pan.GetValue(), self.forward, self.turn, Buttons)
-        while self.ser.inWaiting() > 0:
-            print self.ser.read(),
+        if self.walker != None:
+            self.walker.command(self.tilt.GetValue(), self.pan.GetValue(), self.forward, self.turn, Buttons)
+        else:
+            self.sendPacket(self.tilt.GetValue(), self.pan.GetValue(), self.forward, self.turn, Buttons)
+            while self.ser.inWaiting() > 0:
+                print self.ser.read(),
         self.timer.Start(50)
         
     def sendPacket(self, right_vertical, right_horizontal, left_vertical, left_horizontal, Buttons):
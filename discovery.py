@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+
+"""
+  PyPose: fast servo discovery, pipelined pings over IDs and baud rates
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software Foundation,
+  Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import time
+from multiprocessing.pool import ThreadPool
+from ax12 import AX_PING, AX_BAUD_RATES, P_ID
+from monotonic import clock
+
+IDS = range(0, 253)         # every ID but the controller (253) and broadcast
+PING = 6                    # FF FF ID 2 PING CHECKSUM
+REPLY = 6                   # FF FF ID 2 ERROR CHECKSUM
+RETURN_DELAY = 0.0005       # AX-12 default return delay, 250*2uS
+RELAY_DELAY = 0.002         # extra, when the PyPose sketch relays for us
+DRAIN = 0.05                # S to wait for the last replies, USB adapters buffer
+REPLY_WAIT = 0.02           # S to wait for each reply when not pipelining
+
+def pingPacket(index):
+    return [0xFF, 0xFF, index, 2, AX_PING, 255 - ((index + 2 + AX_PING)%256)]
+
+def parse(data):
+    """ Find status packets in a byte list. Returns the (id, error) of
+    every good packet, the bytes left over (a packet still arriving) and
+    how many bytes were garbage, a sign that replies collided. """
+    replies = list()
+    garbage = 0
+    i = 0
+    while i + 1 < len(data):
+        if data[i] != 0xFF or data[i+1] != 0xFF:
+            garbage = garbage + 1
+            i = i + 1
+            continue
+        if i + 4 > len(data):
+            break
+        length = data[i+3]
+        if i + 4 + length > len(data):
+            break
+        packet = data[i+2:i+4+length]
+        if sum(packet) % 256 == 255 and length >= 2:
+            replies.append((packet[0], packet[2]))
+            i = i + 4 + length
+        else:
+            garbage = garbage + 1
+            i = i + 1
+    return replies, data[i:], garbage
+
+###############################################################################
+# Scanning one port
+class BusScan:
+    """ Pings IDs back to back on a serial port. Each ping gets a slot just
+    long enough for the ping and the reply to cross the bus, replies are
+    matched by the ID in them, not by when they arrive, so the USB latency
+    is paid once per scan instead of once per ID. Where replies collide
+    (garbage on the line) the IDs pinged just before it are pinged again
+    with a slot twice as long. A board that relays the pings itself (the
+    PyPose sketch) can't be flooded like this, with pipeline False each
+    ping waits for its reply, or REPLY_WAIT, before the next goes out. """
+
+    def __init__(self, ser, returnDelay=RETURN_DELAY, margin=1.5, pipeline=True):
+        self.ser = ser
+        self.returnDelay = returnDelay
+        self.margin = margin
+        self.pipeline = pipeline
+
+    def slot(self, baud):
+        """ S per ID: ping and reply bytes at 10 bits each, plus the delay. """
+        return self.margin*((PING + REPLY)*10.0/baud + self.returnDelay)
+
+    def read(self):
+        n = self.ser.inWaiting()
+        if n == 0:
+            return list()
+        return [ord(c) for c in self.ser.read(n)]
+
+    def sweep(self, ids, slot, found, cancelled):
+        """ One pass, found(id, error) is called for each reply. Returns
+        the IDs that may have been lost to a collision: those pinged
+        shortly before garbage showed up. """
+        pending = list()
+        suspects = list()
+        sent = list()       # (time, id)
+        def collided(garbage):
+            if garbage > 0:
+                since = clock() - DRAIN - slot
+                suspects.extend([index for (t, index) in sent if t >= since and index not in suspects])
+        start = clock()
+        for k, index in enumerate(ids):
+            if cancelled != None and cancelled():
+                return list()
+            self.ser.write("".join([chr(b) for b in pingPacket(index)]))
+            sent.append((clock(), index))
+            if self.pipeline:
+                deadline = start + (k+1)*slot
+            else:
+                deadline = clock() + slot + REPLY_WAIT
+            while True:
+                pending = pending + self.read()
+                now = clock()
+                if now >= deadline:
+                    break
+                if not self.pipeline and len(pending) >= REPLY:
+                    replies, pending, garbage = parse(pending)
+                    for (servo, error) in replies:
+                        found(servo, error)
+                    collided(garbage)
+                    if index in [servo for (servo, error) in replies]:
+                        break
+                time.sleep(min(deadline - now, 0.0002))
+            replies, pending, garbage = parse(pending)
+            for (servo, error) in replies:
+                found(servo, error)
+            collided(garbage)
+        # replies still coming through the adapter
+        end = clock() + DRAIN
+        while clock() < end:
+            time.sleep(0.001)
+            pending = pending + self.read()
+        replies, pending, garbage = parse(pending)
+        for (servo, error) in replies:
+            found(servo, error)
+        collided(garbage + len(pending))
+        return suspects
+
+    def scan(self, ids=IDS, found=None, cancelled=None, retries=2):
+        """ Ping ids at the port's baud rate, returns {id: error}. found(id),
+        if given, is called as each servo answers. """
+        servos = dict()
+        def seen(servo, error):
+            if servo not in servos:
+                servos[servo] = error
+                if found != None:
+                    found(servo)
+        timeout = self.ser.timeout
+        self.ser.timeout = 0
+        try:
+            self.ser.flushInput()
+            slot = self.slot(self.ser.baudrate)
+            todo = list(ids)
+            for attempt in range(retries + 1):
+                todo = [i for i in self.sweep(todo, slot, seen, cancelled) if i not in servos]
+                if len(todo) == 0:
+                    break
+                slot = 2*slot
+        finally:
+            self.ser.timeout = timeout
+        return servos
+
+    def scanBauds(self, bauds=None, ids=IDS, found=None, cancelled=None):
+        """ Scan at each baud rate (fastest first), returns {baud: {id:
+        error}} for the rates where something answered. found(baud, id)
+        is called as servos answer. Only for a port wired to the bus. """
+        if bauds == None:
+            bauds = [b for (b, v) in AX_BAUD_RATES]
+        baudrate = self.ser.baudrate
+        result = dict()
+        try:
+            for baud in bauds:
+                if cancelled != None and cancelled():
+                    break
+                self.ser.baudrate = baud
+                servos = self.scan(ids, lambda servo: found != None and found(baud, servo), cancelled)
+                if len(servos) > 0:
+                    result[baud] = servos
+        finally:
+            self.ser.baudrate = baudrate
+        return result
+
+class DriverScan:
+    """ Finds servos through a driver that has no serial port of its own
+    (dynamixel_zmq), by reading the ID register of each servo in turn. """
+
+    def __init__(self, port):
+        self.port = port
+
+    def scan(self, ids=IDS, found=None, cancelled=None):
+        servos = dict()
+        for index in ids:
+            if cancelled != None and cancelled():
+                break
+            if self.port.getRegs([index], P_ID, 1)[0] != None:
+                servos[index] = self.port.error
+                if found != None:
+                    found(index)
+        return servos
+
+###############################################################################
+# Scanning several ports at once
+def scanPort(args):
+    name, bauds, ids = args
+    import serial
+    ser = serial.Serial(name, bauds[0])
+    try:
+        return name, BusScan(ser).scanBauds(bauds, ids)
+    finally:
+        ser.close()
+
+def scanPorts(names, bauds=None, ids=IDS):
+    """ scanBauds on every port, in parallel, returns {port: {baud: {id:
+    error}}}. The ports must be wired straight to a bus. """
+    if bauds == None:
+        bauds = [b for (b, v) in AX_BAUD_RATES]
+    if len(names) == 0:
+        return dict()
+    pool = ThreadPool(len(names))
+    try:
+        return dict(pool.map(scanPort, [(name, bauds, ids) for name in names]))
+    finally:
+        pool.close()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="find AX servos on one or more buses (USB2Dynamixel or similar)")
+    parser.add_argument("ports", nargs="+", help="serial ports to scan, in parallel")
+    parser.add_argument("--baud", type=int, action="append", help="only this baud rate (repeatable), default all")
+    args = parser.parse_args()
+
+    start = time.time()
+    results = scanPorts(args.ports, args.baud)
+    for name in args.ports:
+        for baud in sorted(results[name].keys(), reverse=True):
+            print("%s @ %d: %s" % (name, baud, " ".join([str(i) for i in sorted(results[name][baud].keys())])))
+    print("scanned in %.2f S" % (time.time() - start))
@@ -22,6 +22,7 @@
 import serial
 import time
 import sys
+import threading
 from binascii import b2a_hex
 from ax12 import *
 
@@ -38,17 +39,20 @@ class Driver:
         self.error = 0
         self.hasInterpolation = interpolation
         self.direct = direct
+        self.syncRead = True    # until the board shows it can't
+        self.lock = threading.RLock()   # one packet exchange at a time, GUI and workers share us
 
     def execute(self, index, ins, params):
         """ Send an instruction to a device. """
-        self.ser.flushInput()
-        length = 2 + len(params)
-        checksum = 255 - ((index + length + ins + sum(params))%256)
-        self.ser.write(chr(0xFF)+chr(0xFF)+chr(index)+chr(length)+chr(ins))
-        for val in params:
-            self.ser.write(chr(val))
-        self.ser.write(chr(checksum))
-        return self.getPacket(0)
+        with self.lock:
+            self.ser.flushInput()
+            length = 2 + len(params)
+            checksum = 255 - ((index + length + ins + sum(params))%256)
+            self.ser.write(chr(0xFF)+chr(0xFF)+chr(index)+chr(length)+chr(ins))
+            for val in params:
+                self.ser.write(chr(val))
+            self.ser.write(chr(checksum))
+            return self.getPacket(0)
 
     def setReg(self, index, regstart, values):
         """ Set the value of registers. Should be called as such:
@@ -125,10 +129,30 @@ class Driver:
             return vals[0]
         return vals
 
+    def getRegs(self, ids, regstart, rlength):
+        """ Get the same registers of several servos, as a list of values
+        per servo, None where a read failed. Uses a single ArbotiX sync
+        read if the board has it, else reads servo by servo. """
+        if self.syncRead and len(ids) > 0:
+            vals = self.execute(0xFE, AX_SYNC_READ, [regstart, rlength] + list(ids))
+            if vals != None and len(vals) == len(ids)*rlength:
+                return [vals[i*rlength:(i+1)*rlength] for i in range(len(ids))]
+            if vals == None:
+                print("Sync read not supported, reading servos one at a time")
+                self.syncRead = False
+            # else a servo is missing, a short reply doesn't say which: ask each
+        out = list()
+        for index in ids:
+            vals = self.execute(index, AX_READ_DATA, [regstart, rlength])
+            if vals == None or len(vals) != rlength:
+                out.append(None)
+            else:
+                out.append(vals)
+        return out
+
     def syncWrite(self, regstart, vals):
         """ Set the value of registers. Should be called as such:
         ax12.syncWrite(reg, ((id1, val1, val2), (id2, val1, val2))) """ 
-        self.ser.flushInput()
         length = 4
         valsum = 0
         for i in vals:
@@ -136,11 +160,14 @@ class Driver:
             valsum = valsum + sum(i)
         checksum = 255 - ((254 + length + AX_SYNC_WRITE + regstart + len(vals[0]) - 1 + valsum)%256)
         # packet: FF FF ID LENGTH INS(0x03) PARAM .. CHECKSUM
-        self.ser.write(chr(0xFF)+chr(0xFF)+chr(0xFE)+chr(length)+chr(AX_SYNC_WRITE)+chr(regstart)+chr(len(vals[0])-1))
+        # build it all up front, so it goes out in a single write
+        packet = [0xFF, 0xFF, 0xFE, length, AX_SYNC_WRITE, regstart, len(vals[0])-1]
         for servo in vals:
-            for value in servo:
-                self.ser.write(chr(value))
-        self.ser.write(chr(checksum))
+            packet.extend(servo)
+        packet.append(checksum)
+        with self.lock:
+            self.ser.flushInput()
+            self.ser.write("".join([chr(value) for value in packet]))
         # no return info...
         
     def close(self):
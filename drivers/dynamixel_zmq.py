@@ -30,6 +30,7 @@ DYNAMIXEL_RQ_SYNC_WRITE		=0x83
 
 import time
 import sys
+import threading
 import msgpack
 import zmq
 from ax12 import *
@@ -48,31 +49,47 @@ class Driver:
         self.error = 0
         self.hasInterpolation = interpolation
         self.direct = direct
+        self.lock = threading.RLock()   # a REQ socket takes one request at a time
 
     def execute(self, index, ins, params):
         """ Send an instruction to a device. """
         print('execute',index, ins, params)
-        self._socket.send(msgpack.packb([ins, index]+params))
-        ret=msgpack.unpackb(self._socket.recv())
+        with self.lock:
+            self._socket.send(msgpack.packb([ins, index]+params))
+            ret=msgpack.unpackb(self._socket.recv())
         return ret
 
     def setReg(self, index, regstart, values):
         """ Set the value of registers. Should be called as such:
         ax12.setReg(1,1,(0x01,0x05)) """ 
         print('setReg',index,regstart,values)
-        self._socket.send(msgpack.packb([DYNAMIXEL_RQ_WRITE_DATA, index, regstart,len(values)]+values))
-        ret=msgpack.unpackb(self._socket.recv())
+        with self.lock:
+            self._socket.send(msgpack.packb([DYNAMIXEL_RQ_WRITE_DATA, index, regstart,len(values)]+values))
+            ret=msgpack.unpackb(self._socket.recv())
         return self.error
 
     def getReg(self, index, regstart, rlength):
         """ Get the value of registers, should be called as such:
         ax12.getReg(1,1,1) """
         print('getReg',index,regstart,rlength)
-        self._socket.send(msgpack.packb([DYNAMIXEL_RQ_READ_DATA, index,regstart, rlength]))
-        ret=msgpack.unpackb(self._socket.recv())
+        with self.lock:
+            self._socket.send(msgpack.packb([DYNAMIXEL_RQ_READ_DATA, index,regstart, rlength]))
+            ret=msgpack.unpackb(self._socket.recv())
         self.error=ret[0]
         return ret[1:]
 
+    def getRegs(self, ids, regstart, rlength):
+        """ Get the same registers of several servos, as a list of values
+        per servo, None where a read failed. """
+        out = list()
+        for index in ids:
+            vals = self.getReg(index, regstart, rlength)
+            if self.error != 0 or len(vals) != rlength:
+                out.append(None)
+            else:
+                out.append(vals)
+        return out
+
     def syncWrite(self, regstart, vals):
         """ Set the value of registers. Should be called as such:
         ax12.syncWrite(reg, ((id1, val1, val2), (id2, val1, val2))) """ 
@@ -82,8 +99,9 @@ class Driver:
         reg_count=len(vals[0])
         for cluster in vals:
           data=data+cluster
-        self._socket.send(msgpack.packb([DYNAMIXEL_RQ_SYNC_WRITE, regstart]+data))
-        ret=msgpack.unpackb(self._socket.recv())
+        with self.lock:
+            self._socket.send(msgpack.packb([DYNAMIXEL_RQ_SYNC_WRITE, regstart]+data))
+            ret=msgpack.unpackb(self._socket.recv())
         self.error=ret[0]
 
     def close(self):
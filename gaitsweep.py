@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+"""
+  PyPose: offline gait sweep for the lizard3 IK model
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software Foundation,
+  Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import sys, os, itertools
+from multiprocessing import Pool, cpu_count
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+sys.path.insert(0, os.path.join(ROOT, "tools", "models", "lizard3"))
+import lizard3 as model
+import motion
+from models.manifest import iKmodels
+from walker import STD_TRANSITION
+
+# sweepable parameters, in table order
+PARAMS = ["coxa", "femur", "tibia", "xstance", "ystance", "zstance", "speed", "turn"]
+
+SYNC_HEADER = 8     # FF FF FE LEN INS REG SIZE ... CHECKSUM
+SYNC_SERVO = 3      # id, low, high
+
+###############################################################################
+# Robot setup, from a project or synthetic
+def loadProject(filename):
+    """ Calibration of a lizard3 project, as NukeEditor.configModel sets it. """
+    import project
+    prj = project.project()
+    prj.load(filename)
+    fields = prj.nuke.rstrip().split(",")
+    # the nuke string starts with the iKmodels name the editor shows
+    if fields[0] not in iKmodels or iKmodels[fields[0]].folder != "lizard3":
+        raise ValueError("not a lizard3 project: " + str(fields[0]))
+    dims = [int(v) for v in fields[3:11]]
+    return {"legs": int(fields[1]),
+            "dims": dims,
+            "servos": [int(v) for v in fields[11:29]],
+            "resolutions": [1024,] + prj.resolution,
+            "mins": [512,] + prj.poses["ik_min"],
+            "maxs": [512,] + prj.poses["ik_max"],
+            "neutrals": [512,] + prj.poses["ik_neutral"],
+            "signs": [1,] + [1+(-2*(t=="-")) for t in fields[2]]}
+
+def synthetic(legs, resolution):
+    """ No project: full range servos, only reach limits the gait. """
+    m = model.lizard3(legs)
+    count = 3*legs+1
+    return {"legs": legs,
+            "dims": [m.vars[i][1] for i in range(8)],
+            "servos": None,
+            "resolutions": [resolution]*count,
+            "mins": [0]*count,
+            "maxs": [resolution-1]*count,
+            "neutrals": [resolution//2]*count,
+            "signs": [1]*count}
+
+def build(base, p):
+    """ A calibrated model for one point of the sweep. """
+    m = model.lizard3(base["legs"])
+    m.gaitGen = m.defaultGait
+    # count targets out of reach rather than solve them, against the
+    # envelope only: it costs nothing to build and the servo limits
+    # already show up as fails
+    m.feet = "reject"
+    m.reachLimits = False
+    dims = list(base["dims"])
+    dims[0:3] = [p["coxa"], p["femur"], p["tibia"]]
+    m.config(base["legs"], dims, base["servos"], base["resolutions"])
+    m.mins = base["mins"]
+    m.maxs = base["maxs"]
+    m.neutrals = base["neutrals"]
+    m.signs = base["signs"]
+    for (e,g,pre,mount,mi) in model.LEGS:
+        m[e] = [mount[0]*p["xstance"], mi[1]*p["ystance"], p["zstance"]]
+    cycleTime = m.STEPS*STD_TRANSITION
+    m.travelX = p["speed"]*cycleTime
+    m.travelRotZ = p["turn"]*cycleTime
+    return m
+
+###############################################################################
+# One point of the sweep, runs in a worker
+BASE = None
+
+def setBase(base):
+    global BASE
+    BASE = base
+
+def evaluate(args):
+    """ Walk for a number of gait cycles, return the parameters and
+    (fails, foot targets out of reach, peak servo velocity deg/S, mean
+    syncWrite bytes per frame). """
+    p, cycles, frameRate = args
+    m = build(BASE, p)
+    steps = m.STEPS*cycles
+    for i in range(m.STEPS):
+        m.gaitStep()        # first cycle, the gait table is already settled
+    m.rejected = 0
+    prev = list(m.nextPose[1:])
+    degrees = [motion.UNITS.get(r, motion.UNITS[1024])[0] for r in m.resolutions[1:]]
+    perStep = max(1, int(STD_TRANSITION*frameRate))
+    fails = 0
+    peak = 0.0
+    sent = 0
+    for i in range(steps):
+        fails = fails + m.gaitStep()     # the inputs never change, a table lookup
+        pose = m.nextPose[1:]
+        for a, b, d in zip(prev, pose, degrees):
+            peak = max(peak, abs(b-a)*d/STD_TRANSITION)
+        # the step goes out as interpolated frames, every servo in each
+        # syncWrite as Interpolator.writeFrame and Walker.frame send them
+        for frame in motion.interpolate(prev, pose, perStep):
+            sent = sent + SYNC_HEADER + SYNC_SERVO*len(frame)
+        prev = list(pose)
+    return (p, fails, m.rejected, peak, sent/float(steps*perStep))
+
+def grid(values):
+    """ every combination of the sweep values, as dicts. """
+    return [dict(zip(PARAMS, combo)) for combo in itertools.product(*[values[k] for k in PARAMS])]
+
+def sweep(base, points, cycles=20, frameRate=40, jobs=None):
+    """ Evaluate the points over a process pool, return results ranked by
+    targets out of reach, then fails, then peak velocity, then bus load. """
+    work = [(p, cycles, frameRate) for p in points]
+    jobs = jobs or cpu_count()
+    pool = Pool(jobs, setBase, (base,))
+    try:
+        results = pool.map(evaluate, work, chunksize=max(1, len(work)//(4*jobs)))
+    finally:
+        pool.close()
+        pool.join()
+    return sorted(results, key=lambda r: (r[2], r[1], r[3], r[4]))
+
+def table(results, top=None):
+    lines = ["".join(["%9s" % k for k in PARAMS]) + "    fails  rejected  peak deg/S  bytes/frame"]
+    for p, fails, rejected, peak, load in results[0:top]:
+        lines.append("".join(["%9s" % ("%g" % p[k]) for k in PARAMS]) + "%9d%10d%12.0f%13.1f" % (fails, rejected, peak, load))
+    return "\n".join(lines)
+
+def values(text):
+    return [float(v) for v in text.split(",")]
+
+if __name__ == "__main__":
+    import argparse, time
+    parser = argparse.ArgumentParser(description="lizard3 gait parameter sweep, each option takes a comma separated list")
+    parser.add_argument("--project", help="take legs, body and servo limits from this project")
+    parser.add_argument("--legs", type=int, default=4, help="without a project (4)")
+    parser.add_argument("--resolution", type=int, default=1024, help="without a project (1024)")
+    parser.add_argument("--coxa", type=values, help="mm")
+    parser.add_argument("--femur", type=values, help="mm")
+    parser.add_argument("--tibia", type=values, help="mm")
+    parser.add_argument("--xstance", type=values, help="foot X from center, mm (default coxa, as exported)")
+    parser.add_argument("--ystance", type=values, help="foot Y from center, mm (default coxa+femur)")
+    parser.add_argument("--zstance", type=values, help="body height, mm (default 0.75*tibia)")
+    parser.add_argument("--speed", type=values, default=[50.0], help="walking speed, mm/S (50)")
+    parser.add_argument("--turn", type=values, default=[0.0], help="turning speed, rad/S (0)")
+    parser.add_argument("--cycles", type=int, default=20, help="gait cycles per point (20)")
+    parser.add_argument("--rate", type=int, default=40, help="frames per second on the bus (40)")
+    parser.add_argument("--jobs", type=int, help="worker processes (one per CPU)")
+    parser.add_argument("--top", type=int, help="only show the best N")
+    args = parser.parse_args()
+
+    if args.project:
+        base = loadProject(args.project)
+    else:
+        base = synthetic(args.legs, args.resolution)
+    if base["legs"] != 4:
+        parser.error("the host gait generator only does 4 legs")
+    dims = base["dims"]
+    sweepValues = {"coxa": args.coxa or [dims[0]], "femur": args.femur or [dims[1]], "tibia": args.tibia or [dims[2]],
+                   "speed": args.speed, "turn": args.turn}
+    # stance defaults follow the dimensions, like the export heuristics
+    points = list()
+    for c, f, t in itertools.product(sweepValues["coxa"], sweepValues["femur"], sweepValues["tibia"]):
+        v = dict(sweepValues)
+        v.update({"coxa": [c], "femur": [f], "tibia": [t],
+                  "xstance": args.xstance or [c], "ystance": args.ystance or [c+f], "zstance": args.zstance or [int(0.75*t)]})
+        points.extend(grid(v))
+
+    start = time.time()
+    results = sweep(base, points, args.cycles, args.rate, args.jobs)
+    print(table(results, args.top))
+    print("%d points in %.1f S" % (len(results), time.time() - start))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+"""
+  PyPose: capture the limits of all servos at once
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software Foundation,
+  Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import project
+from ax12 import P_PRESENT_POSITION_L
+
+###############################################################################
+# Streaming limits capture
+class LimitsCapture:
+    """ Samples the present position of every servo with one bulk read
+    each time, and keeps the lowest and highest seen, while the user
+    moves all the limbs through their range. Nothing is written to the
+    project until commit(). """
+
+    def __init__(self, port, count):
+        self.port = port
+        self.count = count
+        self.reset()
+
+    def reset(self):
+        self.mins = [None]*self.count
+        self.maxs = [None]*self.count
+        self.current = [None]*self.count
+        self.samples = 0    # bulk reads done
+        self.misses = 0     # servo reads that failed
+
+    def sample(self):
+        """ Read all servos once, return how many answered. """
+        read = 0
+        values = self.port.getRegs(range(1, self.count+1), P_PRESENT_POSITION_L, 2)
+        for i, pos in enumerate(values):
+            if pos == None:
+                self.misses = self.misses + 1
+                continue
+            p = pos[0] + (pos[1]<<8)
+            self.current[i] = p
+            if self.mins[i] == None or p < self.mins[i]:
+                self.mins[i] = p
+            if self.maxs[i] == None or p > self.maxs[i]:
+                self.maxs[i] = p
+            read = read + 1
+        self.samples = self.samples + 1
+        return read
+
+    def neutral(self, i):
+        """ Middle of the range seen for servo i (0 based), a candidate
+        for the neutral position. """
+        if self.mins[i] == None:
+            return None
+        return (self.mins[i] + self.maxs[i])//2
+
+    def missing(self):
+        """ Servos (1 based) we never got a position from. """
+        return [i+1 for i in range(self.count) if self.mins[i] == None]
+
+    def commit(self, prj, neutrals=False):
+        """ Store ik_min/ik_max (and ik_neutral, if asked) in the project.
+        Servos never read keep what the project had. """
+        for name in ["ik_min", "ik_max", "ik_neutral"]:
+            if name not in prj.poses:
+                prj.poses[name] = project.pose("", prj.count)
+        for i in range(min(self.count, prj.count)):
+            if self.mins[i] == None:
+                continue
+            prj.poses["ik_min"][i] = self.mins[i]
+            prj.poses["ik_max"][i] = self.maxs[i]
+            if neutrals:
+                prj.poses["ik_neutral"][i] = self.neutral(i)
+        prj.save = True
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""
+  PyPose: a monotonic clock, for frame scheduling
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software Foundation,
+  Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import sys, time
+
+# clock_gettime() id of CLOCK_MONOTONIC, it differs between systems
+CLOCK_MONOTONIC = {"linux": 1, "darwin": 6, "freebsd": 4, "openbsd": 3, "netbsd": 3}
+
+def posixClock():
+    """ clock_gettime(CLOCK_MONOTONIC) through ctypes, None if this system
+    doesn't have it. """
+    import ctypes, ctypes.util
+    ident = None
+    for name, value in CLOCK_MONOTONIC.items():
+        if sys.platform.startswith(name):
+            ident = value
+    if ident == None:
+        return None
+    class timespec(ctypes.Structure):
+        _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+    for lib in ["c", "rt"]:    # older glibc keeps it in librt
+        path = ctypes.util.find_library(lib)
+        if path == None:
+            continue
+        try:
+            clock_gettime = ctypes.CDLL(path, use_errno=True).clock_gettime
+        except (OSError, AttributeError):
+            continue
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        t = timespec()
+        if clock_gettime(ident, ctypes.byref(t)) != 0:
+            return None
+        def clock():
+            clock_gettime(ident, ctypes.byref(t))
+            return t.tv_sec + t.tv_nsec*1e-9
+        return clock
+    return None
+
+def findClock():
+    """ Seconds from an arbitrary start that never jump with the wall
+    clock (NTP, the user setting the time). """
+    if hasattr(time, "monotonic"):
+        return time.monotonic
+    if sys.platform == "win32":
+        return time.clock       # QueryPerformanceCounter on windows
+    try:
+        clock = posixClock()
+    except Exception:
+        clock = None
+    if clock != None:
+        return clock
+    print("No monotonic clock, frame timing follows the wall clock")
+    return time.time
+
+clock = findClock()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+"""
+  PyPose: host-side motion for drivers without on-board interpolation
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software Foundation,
+  Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import time, math
+from ax12 import *
+from monotonic import clock
+
+try:
+    import numpy
+    HAS_NUMPY=True
+except ImportError:
+    HAS_NUMPY=False
+
+###############################################################################
+# Interpolation profiles, map t in (0,1] to the fraction of the move done
+def linear(t):
+    return t
+
+def cosine(t):
+    """ ease in and out, no velocity step at the keyframes """
+    if HAS_NUMPY:
+        return (1.0 - numpy.cos(numpy.pi*t))/2.0
+    return (1.0 - math.cos(math.pi*t))/2.0
+
+PROFILES = {"linear":linear, "cosine":cosine}
+
+def interpolate(start, end, n, profile="linear"):
+    """ Return n frames from start to end, the last frame is end.
+    Rows are frames, columns are servos. """
+    shape = PROFILES[profile]
+    if HAS_NUMPY:
+        s = numpy.asarray(start, dtype=numpy.float64)
+        t = shape(numpy.arange(1, n+1, dtype=numpy.float64)/n)
+        f = s + numpy.outer(t, numpy.asarray(end, dtype=numpy.float64) - s)
+        return numpy.rint(f).astype(numpy.uint16)
+    else:
+        return [[int(round(s + (e-s)*shape((i+1)/float(n)))) for s, e in zip(start, end)] for i in range(n)]
+
+def packets(frames):
+    """ syncWrite parameters for each frame: [[[id, low, high], ...], ...] """
+    if HAS_NUMPY:
+        f = numpy.asarray(frames, dtype=numpy.uint16)
+        ids = numpy.empty(f.shape, dtype=numpy.uint16)
+        ids[:] = numpy.arange(1, f.shape[1]+1)
+        return numpy.dstack((ids, f & 0xff, f >> 8)).tolist()
+    else:
+        return [[[i+1, p%256, p>>8] for i, p in enumerate(frame)] for frame in frames]
+
+###############################################################################
+# Goal speeds, so that every servo arrives at the same time
+# degrees per position unit, and degrees/S per goal speed unit (0.111/0.114 RPM)
+UNITS = {1024: (300.0/1024, 0.111*6), 4096: (360.0/4096, 0.114*6)}
+
+def goalSpeeds(start, end, deltaT, resolutions=None):
+    """ Return the goal speed each servo needs to get from start to end in
+    deltaT mS, clamped to 1..1023 (0 would mean no speed control). """
+    if resolutions == None:
+        resolutions = [1024]*len(end)
+    seconds = max(deltaT, 1)/1000.0
+    if HAS_NUMPY:
+        res = numpy.asarray(resolutions)
+        pos = numpy.where(res == 4096, UNITS[4096][0], UNITS[1024][0])
+        spd = numpy.where(res == 4096, UNITS[4096][1], UNITS[1024][1])
+        dist = numpy.abs(numpy.asarray(end, dtype=numpy.float64) - numpy.asarray(start, dtype=numpy.float64))
+        return numpy.clip(numpy.ceil(dist*pos/(seconds*spd)), 1, 1023).astype(numpy.uint16)
+    else:
+        out = list()
+        for s, e, r in zip(start, end, resolutions):
+            pos, spd = UNITS.get(r, UNITS[1024])
+            out.append(min(1023, max(1, int(math.ceil(abs(e-s)*pos/(seconds*spd))))))
+        return out
+
+def speedPacket(start, end, deltaT, resolutions=None):
+    """ syncWrite parameters from P_GOAL_POSITION_L through P_GOAL_SPEED_H:
+    [[id, pos low, pos high, speed low, speed high], ...] """
+    speeds = goalSpeeds(start, end, deltaT, resolutions)
+    if HAS_NUMPY:
+        f = numpy.asarray(end, dtype=numpy.uint16)
+        ids = numpy.arange(1, len(f)+1, dtype=numpy.uint16)
+        return numpy.column_stack((ids, f & 0xff, f >> 8, speeds & 0xff, speeds >> 8)).tolist()
+    else:
+        return [[i+1, p%256, p>>8, v%256, v>>8] for i, (p, v) in enumerate(zip(end, speeds))]
+
+###############################################################################
+# Host interpolation engine
+class Interpolator:
+    """ Computes the intermediate frames of a move for all servos at once,
+    and streams them to the bus as one syncWrite per frame. In "speed" mode
+    it instead sends one packet per move, with goal speeds set so that all
+    servos arrive together. """
+
+    def __init__(self, port, frameRate=30, profile="linear", mode="stream"):
+        self.port = port
+        self.frameRate = frameRate
+        self.profile = profile
+        self.mode = mode
+        self.lastPose = None    # last pose written, start of the next move
+        self.speedSet = False   # have we left goal speeds on the servos?
+
+    def frameCount(self, deltaT):
+        """ Number of frames to cover deltaT (mS), at least one. """
+        return max(1, int(deltaT*self.frameRate/1000))
+
+    def frames(self, start, end, deltaT):
+        """ Return the frames to move from start to end in deltaT mS. """
+        return interpolate(start, end, self.frameCount(deltaT), self.profile)
+
+    def packet(self, frame):
+        """ syncWrite parameters for a frame: [[id, low, high], ...] """
+        return packets([frame])[0]
+
+    def writeFrame(self, frame):
+        self.port.syncWrite(P_GOAL_POSITION_L, self.packet(frame))
+
+    def writePacket(self, packet):
+        self.port.syncWrite(P_GOAL_POSITION_L, packet)
+
+    def readPose(self, count):
+        """ Read the present position of servos 1..count, None if any fails. """
+        pose = list()
+        for pos in self.port.getRegs(range(1, count+1), P_PRESENT_POSITION_L, 2):
+            if pos == None:
+                return None
+            pose.append(pos[0] + (pos[1]<<8))
+        return pose
+
+    def fullSpeed(self, count):
+        """ Clear goal speeds left by speed mode, before streaming frames. """
+        if self.speedSet:
+            self.port.syncWrite(P_GOAL_SPEED_L, [[i+1, 0, 0] for i in range(count)])
+            self.speedSet = False
+
+    def speedTo(self, pose, deltaT, resolutions=None):
+        """ Move from the last pose to pose in deltaT mS, with one packet. """
+        start = self.lastPose
+        if start == None or len(start) != len(pose):
+            start = self.readPose(len(pose))
+        if start == None:
+            # can't tell where we are, just jump there
+            self.fullSpeed(len(pose))
+            self.writeFrame(pose)
+        else:
+            self.writePacket(speedPacket(start, pose, deltaT, resolutions))
+            self.speedSet = True
+        self.lastPose = list(pose)
+
+    def moveTo(self, pose, deltaT, resolutions=None, cancelled=None):
+        """ Move smoothly from the last pose to pose, over deltaT mS. It
+        takes that long, run it on a worker; cancelled(), if given, is
+        checked before each frame. """
+        if self.mode == "speed":
+            return self.speedTo(pose, deltaT, resolutions)
+        self.fullSpeed(len(pose))
+        start = self.lastPose
+        if start == None or len(start) != len(pose):
+            start = self.readPose(len(pose))
+        if start == None:
+            # can't tell where we are, just jump there
+            self.writeFrame(pose)
+        else:
+            period = 1.0/self.frameRate
+            deadline = clock()
+            for frame in self.frames(start, pose, deltaT):
+                if cancelled != None and cancelled():
+                    self.lastPose = None    # stopped part way, who knows where
+                    return
+                self.writeFrame(frame)
+                deadline = deadline + period
+                wait = deadline - clock()
+                if wait > 0:
+                    time.sleep(wait)
+        self.lastPose = list(pose)
+
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+"""
+  PyPose: host-side sequence player, for drivers without the PyPose sketch
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software Foundation,
+  Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import time, threading
+import motion
+from trajectory import TrajectoryCache
+from monotonic import clock
+
+###############################################################################
+# Frame timing statistics
+class FrameStats:
+    """ Lateness of each frame against its deadline, and the missed ones. """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.frames = 0     # frames sent
+        self.missed = 0     # frames dropped because their slot had passed
+        self.total = 0.0    # sum of lateness (S)
+        self.squares = 0.0  # sum of lateness^2
+        self.worst = 0.0    # max lateness (S)
+
+    def record(self, late):
+        self.frames = self.frames + 1
+        self.total = self.total + late
+        self.squares = self.squares + late*late
+        if late > self.worst:
+            self.worst = late
+
+    def miss(self):
+        self.missed = self.missed + 1
+
+    def jitter(self):
+        """ Return (mean, rms, max) lateness in mS. """
+        if self.frames == 0:
+            return (0.0, 0.0, 0.0)
+        return (1000*self.total/self.frames, 1000*(self.squares/self.frames)**0.5, 1000*self.worst)
+
+    def __str__(self):
+        return "%d frames, %d missed, jitter mean %.2f rms %.2f max %.2f mS" % ((self.frames, self.missed) + self.jitter())
+
+###############################################################################
+# Sequence player
+class SequencePlayer:
+    """ Plays a project sequence through any driver, by streaming the rows
+    of its compiled Trajectory on a fixed-rate, deadline-based schedule. """
+
+    def __init__(self, interpolator, cache=None):
+        self.interpolator = interpolator
+        self.cache = cache or TrajectoryCache()
+        self.stats = FrameStats()
+        self.thread = None
+        self.halted = threading.Event()
+
+    def playing(self):
+        return self.thread != None and self.thread.is_alive()
+
+    def play(self, prj, seqName, loop=False):
+        """ Start playing, returns immediately. Equivalent of run/loop. """
+        self.halt()
+        traj = self.cache.get(prj, seqName, self.interpolator.frameRate, self.interpolator.profile)
+        if traj == None:
+            return
+        self.halted.clear()
+        self.stats.reset()
+        self.thread = threading.Thread(target=self.run, args=(traj, loop, prj.resolution))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def halt(self):
+        """ Stop playing, at the next frame. Equivalent of halt. """
+        if self.playing():
+            self.halted.set()
+            self.thread.join()
+
+    def run(self, traj, loop, resolutions):
+        if self.interpolator.mode == "speed":
+            done = self.playKeyframes(traj, loop, resolutions)
+        else:
+            done = self.playTable(traj, loop)
+        if done:
+            self.interpolator.lastPose = list(traj.poses[-1])
+            print("Sequence done: " + str(self.stats))
+        else:
+            self.interpolator.lastPose = None   # halted, who knows where
+
+    def current(self, traj):
+        """ Where we are starting from. """
+        current = self.interpolator.lastPose
+        if current == None or len(current) != len(traj.poses[0]):
+            current = self.interpolator.readPose(len(traj.poses[0])) or traj.poses[0]
+        return current
+
+    def playKeyframes(self, traj, loop, resolutions):
+        """ One goal position+speed packet per keyframe, the servos do the rest. """
+        start = clock()
+        elapsed = 0.0
+        prev = self.current(traj)
+        while True:
+            for pose, dt in zip(traj.poses, traj.times):
+                if not self.waitUntil(start + elapsed):
+                    return False
+                self.interpolator.writePacket(motion.speedPacket(prev, pose, dt, resolutions))
+                self.interpolator.speedSet = True
+                prev = pose
+                elapsed = elapsed + dt/1000.0
+            if not loop:
+                # let the last move finish
+                return self.waitUntil(start + elapsed)
+
+    def waitUntil(self, deadline):
+        """ Sleep until deadline and record how late we are, in slices so a
+        halt is noticed. Return False if we were halted. """
+        while True:
+            if self.halted.is_set():
+                return False
+            now = clock()
+            if now >= deadline:
+                self.stats.record(now - deadline)
+                return True
+            time.sleep(min(deadline - now, 0.05))
+
+    def playTable(self, traj, loop):
+        self.period = 1.0/traj.frameRate
+        self.start = clock()
+        self.k = 0  # frame number since start, deadlines are absolute so we don't drift
+        self.interpolator.fullSpeed(len(traj.poses[0]))
+        # lead in, from wherever we are to the first keyframe
+        current = self.current(traj)
+        leadIn = motion.packets(self.interpolator.frames(current, traj.poses[0], traj.times[0]))
+        if not self.stream(leadIn, [len(leadIn)-1]):
+            return False
+        # then straight from the table
+        packets = traj.packets()
+        first = traj.keyframes[0]+1
+        while True:
+            if not self.stream(packets[first:], [k-first for k in traj.keyframes if k >= first]):
+                return False
+            if not loop:
+                return True
+            first = 0
+
+    def stream(self, packets, keyframes):
+        """ Send packets on schedule, return False if we were halted. """
+        keyframes = set(keyframes)
+        for i in range(len(packets)):
+            if self.halted.is_set():
+                return False
+            self.k = self.k + 1
+            deadline = self.start + self.k*self.period
+            now = clock()
+            if now < deadline:
+                time.sleep(deadline - now)
+            elif now - deadline > self.period and i not in keyframes:
+                # slot is long gone, drop the frame, but never a keyframe
+                self.stats.miss()
+                continue
+            self.stats.record(clock() - deadline)
+            self.interpolator.writePacket(packets[i])
+        return True
+
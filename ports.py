@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+"""
+  PyPose: serial port enumeration
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software Foundation,
+  Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import os, sys, time, threading
+from multiprocessing.pool import ThreadPool
+import serial
+try:
+    from serial.tools import list_ports
+    HAS_LIST_PORTS = True
+except ImportError:
+    HAS_LIST_PORTS = False
+
+# USB adapters (ArbotiX, USB2Dynamixel) first, then the rest
+ORDER = ["/dev/ttyUSB", "/dev/ttyACM", "/dev/tty.usbserial", "/dev/cu.usbserial", "COM", "/dev/ttyS"]
+
+WINDOWS = ["COM"+str(i) for i in range(20)]
+MAX_AGE = 10.0      # S a scan is trusted when we can't see hotplug events
+
+def rank(port):
+    for i, prefix in enumerate(ORDER):
+        if port.startswith(prefix):
+            return (i, len(port), port)
+    return (len(ORDER), len(port), port)
+
+###############################################################################
+# Finding ports, without opening them
+def sysfsPorts(root="/sys/class/tty"):
+    """ Linux: ttys backed by a device. The legacy ttyS UARTs are always
+    listed, a type of 0 means there is no hardware behind one. """
+    ports = list()
+    for name in os.listdir(root):
+        if not os.path.exists(os.path.join(root, name, "device")):
+            continue    # consoles, ptys
+        if name.startswith("ttyS"):
+            try:
+                if int(open(os.path.join(root, name, "type")).read()) == 0:
+                    continue
+            except (IOError, ValueError):
+                continue
+        ports.append("/dev/"+name)
+    return ports
+
+def listPorts():
+    """ Serial ports the OS describes, or None if it doesn't say and we
+    have to probe. """
+    if HAS_LIST_PORTS:
+        return sorted([p[0] for p in list_ports.comports()], key=rank)
+    if os.path.isdir("/sys/class/tty"):
+        return sorted(sysfsPorts(), key=rank)
+    if sys.platform == "darwin":
+        return sorted(["/dev/"+p for p in os.listdir("/dev") if p.startswith("tty.usbserial")], key=rank)
+    return None
+
+###############################################################################
+# Probing, when there is no metadata or to skip ports in use
+def canOpen(port):
+    try:
+        s = serial.Serial(port)
+        s.close()
+        return True
+    except Exception:
+        return False
+
+def probe(ports, jobs=8):
+    """ The ports that open, tried in parallel, since an open can block. """
+    if len(ports) == 0:
+        return list()
+    pool = ThreadPool(min(jobs, len(ports)))
+    try:
+        ok = pool.map(canOpen, ports)
+    finally:
+        pool.close()
+    return [p for p, o in zip(ports, ok) if o]
+
+###############################################################################
+# Cached scan
+class PortCache:
+    """ The last port scan. It is redone when /dev changes, that is when a
+    device is plugged in or removed, or after MAX_AGE where there is no
+    /dev. refresh() scans in the background, so get() is instant later. """
+
+    def __init__(self, probing=False):
+        self.probing = probing  # also open each port, to drop busy ones
+        self.ports = None
+        self.stamp = None
+        self.scanned = 0
+        self.lock = threading.Lock()
+
+    def hotplug(self):
+        """ Changes when a device node is added or removed. """
+        try:
+            return os.stat("/dev").st_mtime
+        except OSError:
+            return None
+
+    def stale(self):
+        if self.ports == None:
+            return True
+        stamp = self.hotplug()
+        if stamp == None:
+            return time.time() - self.scanned > MAX_AGE
+        return stamp != self.stamp
+
+    def scan(self):
+        stamp = self.hotplug()
+        ports = listPorts()
+        if ports == None:
+            ports = probe(WINDOWS)
+        elif self.probing:
+            ports = probe(ports)
+        self.ports = ports
+        self.stamp = stamp
+        self.scanned = time.time()
+        return ports
+
+    def get(self):
+        """ Known serial ports, scanning only if something changed. """
+        with self.lock:
+            if self.stale():
+                self.scan()
+            return list(self.ports)
+
+    def refresh(self):
+        """ Scan in the background. """
+        thread = threading.Thread(target=self.get)
+        thread.daemon = True
+        thread.start()
+
+    def invalidate(self):
+        with self.lock:
+            self.ports = None
@@ -72,6 +72,14 @@ class sequence(list):
     def __str__(self):
         return ", ".join([str(t) for t in self])     
 
+def tranPose(t):
+    """ pose name of a "pose|time" transition """
+    return t[0:t.find("|")]
+
+def tranTime(t):
+    """ delta-T of a "pose|time" transition """
+    return int(t[t.find("|")+1:])
+
 
 ###############################################################################
 # Class for dealing with project files
@@ -82,6 +90,7 @@ class project:
         self.resolution = [1024 for i in range(self.count)]
         self.poses = dict()
         self.sequences = dict()
+        self.poseRefs = dict()  # pose name -> {sequence name: # of transitions}
         self.nuke = ""    
         self.save = False
         self.connection = {'type':None, 'settings':None}
@@ -121,6 +130,7 @@ class project:
                     # these next two lines can be removed later, once everyone is moved to Ver 0.91         
                     else:
                         self.poses[line[0:line.index(":")]] = pose(line[line.index(":")+1:].rstrip(),self.count)   
+            self.reindex()
             self.save = False
         except Exception:
             exc_type, exc_value, exc_traceback = sys.exc_info()
@@ -164,12 +174,73 @@ class project:
     def new(self, nName, nCount, nResolution):
         self.poses = dict()
         self.sequences = dict()
+        self.poseRefs = dict()
         self.filename = ""
         self.count = nCount
         self.name = nName
         self.resolution = [nResolution for i in range(self.count)]
         self.save = True
 
+    ###########################################################################
+    # Pose -> sequence reference index
+    def reindex(self):
+        """ Rebuild the reference index from scratch, after a load. """
+        self.poseRefs = dict()
+        for s in self.sequences.keys():
+            self._addRefs(s)
+
+    def _addRefs(self, seqName):
+        for t in self.sequences[seqName]:
+            refs = self.poseRefs.setdefault(tranPose(t), dict())
+            refs[seqName] = refs.get(seqName, 0) + 1
+
+    def _remRefs(self, seqName):
+        for t in self.sequences[seqName]:
+            p = tranPose(t)
+            refs = self.poseRefs[p]
+            refs[seqName] = refs[seqName] - 1
+            if refs[seqName] == 0:
+                del refs[seqName]
+                if len(refs) == 0:
+                    del self.poseRefs[p]
+
+    def setSequence(self, seqName, seq):
+        """ Add or replace a sequence, keeping the index up to date. """
+        if seqName in self.sequences:
+            self._remRefs(seqName)
+        self.sequences[seqName] = seq
+        self._addRefs(seqName)
+
+    def removeSequence(self, seqName):
+        """ Remove a sequence, and its references. """
+        self._remRefs(seqName)
+        del self.sequences[seqName]
+
+    def poseUsers(self, poseName):
+        """ Return names of the sequences that use a pose. """
+        return list(self.poseRefs.get(poseName, dict()).keys())
+
+    def renamePose(self, oldName, newName):
+        """ Rename a pose, and every transition that refers to it. """
+        self.poses[newName] = self.poses.pop(oldName)
+        refs = self.poseRefs.pop(oldName, None)
+        if refs == None:
+            return
+        for s in refs.keys():
+            seq = self.sequences[s]
+            for i in range(len(seq)):
+                if tranPose(seq[i]) == oldName:
+                    seq[i] = newName + seq[i][seq[i].find("|"):]
+        # merge with any references to a sequence that used newName already
+        newRefs = self.poseRefs.setdefault(newName, dict())
+        for s, c in refs.items():
+            newRefs[s] = newRefs.get(s, 0) + c
+
+    def removePose(self, poseName):
+        """ Remove a pose, return the sequences that still use it. """
+        del self.poses[poseName]
+        return self.poseUsers(poseName)
+
     ###########################################################################
     # Export functionality
     def export(self, filename):        
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""
+  PyPose: track what is already downloaded to the PyPose sketch
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software Foundation,
+  Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import project
+
+###############################################################################
+# On-board pose slots
+class PoseSlots:
+    """ Remembers the pose size, the content of each pose slot and the
+    transition list on the board, so only what changed is downloaded.
+    Everything that downloads poses should go through here, or call reset(). """
+
+    def __init__(self, port):
+        self.port = port
+        self.reset()
+
+    def reset(self):
+        """ Forget everything, the board may have been reset. """
+        self.size = None
+        self.slots = dict()     # slot -> tuple of pose values
+        self.transitions = None
+
+    def setSize(self, count):
+        """ Set pose size -- IMPORTANT! """
+        if self.size != count:
+            print("Setting pose size at " + str(count))
+            self.port.execute(253, 7, [count])
+            self.size = count
+            self.slots = dict()
+
+    def sendPose(self, slot, pose):
+        """ Download a pose to a slot, unless it is already there. """
+        key = tuple(pose)
+        if self.slots.get(slot) != key:
+            print("Sending pose to position " + str(slot))
+            self.port.execute(253, 8, [slot] + project.extract(pose))
+            self.slots[slot] = key
+
+    def sendTransitions(self, tranDL):
+        """ Download a transition list, unless it is already there. The
+        sketch takes the list whole, so any change resends all of it. """
+        key = tuple(tranDL)
+        if self.transitions != key:
+            print("Sending sequence: " + str(tranDL))
+            self.port.execute(253, 9, tranDL)
+            self.transitions = key
+
+    def assign(self, poses):
+        """ Give each pose (name -> values) a slot in 0..len(poses)-1,
+        reusing the slots that already hold the same values. """
+        holder = dict()
+        for slot, key in self.slots.items():
+            if slot < len(poses):
+                holder[key] = slot
+        out = dict()
+        for name, values in poses.items():
+            slot = holder.pop(tuple(values), None)
+            if slot != None:
+                out[name] = slot
+        taken = set(out.values())
+        free = [i for i in range(len(poses)) if i not in taken]
+        for name in poses.keys():
+            if name not in out:
+                out[name] = free.pop(0)
+        return out
+
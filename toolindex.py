@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+"""
+  PyPose: find the tools without importing them
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software Foundation,
+  Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import os, re
+
+# files in the tools folder that are not tools
+NOT_TOOLS = ["__init__.py", "ToolPane.py"]
+
+# module level string constants, as every tool declares them
+CONSTANT = re.compile(r"""^(NAME|STATUS)\s*=\s*(["'])(.*)\2\s*$""")
+
+def scan(filename):
+    """ NAME and STATUS of a tool file, read from its source. """
+    found = dict()
+    for line in open(filename):
+        m = CONSTANT.match(line)
+        if m != None:
+            found[m.group(1)] = m.group(3)
+    return found
+
+def findTools(folder="tools"):
+    """ List of (module, name, status) for the tools in folder, sorted by
+    module. Nothing is imported, so the IK models, commander and so on
+    are only loaded when their tool is first opened. Files without a
+    NAME are skipped. """
+    tools = list()
+    for file in sorted(os.listdir(folder)):
+        if file[-3:] != ".py" or file in NOT_TOOLS:
+            continue
+        found = scan(os.path.join(folder, file))
+        if "NAME" in found:
+            tools.append((file[0:-3], found["NAME"], found.get("STATUS", "")))
+    return tools
@@ -19,27 +19,70 @@
   Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 """
 
-import wx
+import wx, time, threading
 from ax12 import *
 from ToolPane import ToolPane
+from discovery import BusScan, DriverScan, IDS, RETURN_DELAY, RELAY_DELAY
 
 # help phrases
 help = ["\rPyPose Terminal VA.1",
 "\r",
 "\rvalid commands:",
-"\rls - list the servos found on the bus at current baud",
+"\rls [all] [ids] - list the servos found on the bus at current baud (or every baud, bus adapters only), Esc stops it; through the PyPose sketch only IDs 1 to the servo count, unless given ids",
 "\rmv id id2 - rename any servo with ID=id, to id2",
-"\rset param id val - set parameter on servo ID=id to val",
-"\rget param id - get a parameter value from a servo",
+"\rset param ids val - set parameter on servos ids to val",
+"\rget param ids - get a parameter value from servos, with one bulk read",
+"\rwatch param ids [rate [samples]] - stream a parameter, rate/S (10), until Esc or samples",
+"\rrun file - run the commands in a file, one per line, # starts a comment",
 "\rbaud b - set baud rate of bus to b",
 "\r",
+"\rids are an ID, a range or a list: 3, 1-18, 1,3,5-7",
+"\r",
 "\rvalid parameters",
-"\rpos - current position of a servo, 0-1023",
+"\rpos - current (get) or goal (set) position of a servo, 0-1023",
+"\rload - current load, READ ONLY",
+"\rvolt - current voltage, 1/10 V, READ ONLY",
+"\rtemp - current temperature, degrees C, READ ONLY",
 "\rbaud - baud rate",
-"\rtemp - current temperature, degrees C, READ ONLY"]
+"\rled - LED on (1) or off (0)",
+"\rtorque - torque on (1) or off (0)"]
+
+# parameter: register to read, register to write, length
+PARAMS = {"pos": (P_PRESENT_POSITION_L, P_GOAL_POSITION_L, 2),
+          "load": (P_PRESENT_LOAD_L, None, 2),
+          "volt": (P_PRESENT_VOLTAGE, None, 1),
+          "temp": (P_PRESENT_TEMPERATURE, None, 1),
+          "baud": (P_BAUD_RATE, P_BAUD_RATE, 1),
+          "led": (P_LED, P_LED, 1),
+          "torque": (P_TORQUE_ENABLE, P_TORQUE_ENABLE, 1)}
+
+FLUSH = 50          # mS between output updates
+MAX_LINES = 1000    # older lines are dropped
+
+def servoList(text):
+    """ IDs from "3", "1-18" or "1,3,5-7". """
+    ids = list()
+    for part in text.split(","):
+        if part.find("-") > 0:
+            first, last = part.split("-")
+            ids.extend(range(int(first), int(last)+1))
+        else:
+            ids.append(int(part))
+    return ids
+
+def value(param, vals):
+    """ A register value, as a number. """
+    v = vals[0]
+    if len(vals) > 1:
+        v = v + (vals[1]<<8)
+    if param == "load" and v & 1024:
+        v = -(v & 1023)
+    return v
 
 class shell(wx.TextCtrl):
-    """ The actual terminal part. """
+    """ The actual terminal part. Output is buffered, and written at most
+    every FLUSH mS, so bulk commands and watch can't flood the control;
+    workers may call out() too. """
     def __init__(self, parent, id=-1, conn=None, font_size=10, encoding="utf-8"):
         self.parent = parent
         self.encoding = encoding
@@ -57,27 +100,46 @@ class shell(wx.TextCtrl):
         
         self.SetFont(mono)
         self.Bind(wx.EVT_CHAR, self.OnEnterChar)        
+        self.pending = list()
+        self.lock = threading.Lock()
+        self.timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.flush, self.timer)
+        self.timer.Start(FLUSH)
         
         self.SetValue("PyPose Terminal VA.0\r>> ")
         self.SetInsertionPoint(len(self.GetValue()))
 
+    ###########################################################################
+    # Buffered output
+    def out(self, text):
+        with self.lock:
+            self.pending.append(text)
+
+    def flush(self, e=None):
+        with self.lock:
+            if len(self.pending) == 0:
+                return
+            text = "".join(self.pending)
+            self.pending = list()
+        self.write(text)
+        extra = self.GetNumberOfLines() - MAX_LINES
+        if extra > 0:
+            self.Remove(0, self.XYToPosition(0, extra))
+            self.SetInsertionPointEnd()
+
     def OnEnterChar(self, event):
         keycode = event.GetKeyCode()
         if keycode == wx.WXK_RETURN:
             # process the command!
             line = self.PositionToXY(self.GetLastPosition())[1]
-            l = self.GetLineText(line)[3:].split(" ")
+            l = self.GetLineText(line)[3:].split()
             try:
-                if l[0] == u"help":   # display help data
+                if len(l) == 0:
+                    pass
+                elif l[0] == u"help":   # display help data
                     if len(l) > 1:      # for a particular command
-                        if l[1] == u"li":   
-                            self.write(help[3])
-                        elif l[1] == u"mv":
-                            self.write(help[4])
-                        elif l[1] == u"set":
-                            self.write(help[5])
-                        elif l[1] == u"get":   
-                            self.write(help[6])
+                        topics = {u"ls": 3, u"mv": 4, u"set": 5, u"get": 6, u"watch": 7, u"run": 8}
+                        self.write(help[topics[l[1]]])
                     else:
                         for h in help:
                             self.write(h)
@@ -87,76 +149,174 @@ class shell(wx.TextCtrl):
                     self.SetInsertionPoint(3)
                     return                      
                 elif l[0] == u"serial":
-                    # open a serial port
-                    if self.parent.parent.port != None:
-                        self.parent.parent.port.ser.close()
-                    print "Opening port: " + l[1]
-                    self.port = self.parent.parent.openPort(str(l[1]))
-                elif self.parent.parent.port == None:
+                    # open a serial port, the way the connection dialog does
+                    self.openSerial(str(l[1]))
+                elif self.parent.port == None:
                     self.write("\rNo port open!")
-                elif l[0] == u"ls":      # list servos
-                    to = self.parent.parent.port.ser.timeout
-                    self.parent.parent.port.ser.timeout = 0.25
-                    #baud = 1000000
-                    #if len(l) > 1:       # we have a baud too!
-                    #    baud = int(l[1])
-                    k = 0                # how many id's have we printed...
-                    self.write("\r")
-                    for i in range(18):
-                        if self.parent.parent.port.getReg(i+1,P_PRESENT_POSITION_L, 1) != -1:
-                            if k > 8:    # limit the width of each printout
-                                k = 0
-                                self.write("\r")
-                            self.write(repr(i+1).rjust(4)) 
-                            k = k + 1
-                            wx.SafeYield()
-                    self.parent.parent.port.ser.timeout = to
-                elif l[0] == u"mv":      # rename a servo
-                    if self.parent.parent.port.setReg(int(l[1]),P_ID,[int(l[2])]) == 0:
-                        self.write("\rOK")
-                #elif l[0] == u"baud":    # set bus baud rate
-                #    if self.parent.parent.port.setReg(253,P_BAUD_RATE, [self.convertBaud(int(l[1]))] )
-                #elif l[0] == u"set":
-                    #if l[1] == u"baud":
-                    #    self.write("\r" + str(self.parent.parent.port.setReg(int(l[2]),P_BAUD_RATE, [self.convertBaud(int(l[3]))] ) )
-                    #elif l[1] == u"pos":
-                    #    pass
-                        #self.write("\r" + str(self.parent.parent.port.setReg(int(l[2]),P_BAUD_RATE, [self.convertBaud(int(l[3]))] ) )
-                        #self.write("\r" + str(self.parent.parent.port.setReg(int(l[2]),P_PRESENT_POSITION,2)))
-                elif l[0] == u"get":
-                    if l[1] == u"temp":
-                        self.write("\r" + str(self.parent.parent.port.getReg(int(l[2]),P_PRESENT_TEMPERATURE,2)))
-                    elif l[1] == u"pos":
-                        self.write("\r" + str(self.parent.parent.port.getReg(int(l[2]),P_PRESENT_POSITION,2)))
+                else:
+                    # bus commands run in the background, the prompt comes back when done
+                    if l[0] == u"run":
+                        commands = self.script(l[1])
+                    else:
+                        commands = [l]
+                    if self.parent.startJob(lambda job: self.batch(commands, job), self.scanned) != None:
+                        return
             except:
                 self.write("\runrecognized command!")
             # new line!
             self.write("\r>> ")
+        elif keycode == wx.WXK_ESCAPE and self.parent.busy():
+            self.parent.cancelJob()
+            self.flush()
+            self.write("\rcancelled\r>> ")
         elif keycode == wx.WXK_BACK:
             if(self.PositionToXY(self.GetLastPosition())[0] > 3):
                 self.Remove(self.GetLastPosition()-1,self.GetLastPosition())
         else:
             self.write(unichr(keycode))
-    
-    def convertBaud(self, b):
-        if b == 500000:
-            return 3
-        elif b == 400000:
-            return 4
-        elif b == 250000:
-            return 7
-        elif b == 200000:
-            return 9
-        elif b == 115200:
-            return 16
-        elif b == 57600:
-            return 34
-        elif b == 19200:    
-            return 103
-        elif b == 9600:
-            return 207
+
+    def openSerial(self, name):
+        """ Connect the editor to a serial port, keeping the baud and
+        sketch settings of the project. """
+        frame = self.parent.parent
+        if frame.project.connection.get('settings') == None:
+            frame.project.connection['settings'] = dict()
+        settings = frame.project.connection['settings'].setdefault('serial', dict())
+        settings['port'] = name
+        settings.setdefault('baudrate', 38400)
+        frame.project.connection['type'] = 'serial'
+        if frame.connected:
+            frame.doDisconnect()
+        print "Opening port: " + name
+        frame.doConnect()
+        if self.parent.port == None:
+            self.write("\rcould not open " + name)
+
+    ###########################################################################
+    # Bus commands, on a worker
+    def script(self, filename):
+        """ The commands of a script file. """
+        commands = list()
+        for line in open(filename):
+            line = line.split("#")[0].split()
+            if len(line) > 0:
+                commands.append(line)
+        return commands
+
+    def batch(self, commands, job):
+        """ Run commands one after the other, stop if cancelled. """
+        for l in commands:
+            if job.cancelled():
+                return
+            if len(commands) > 1:
+                self.out("\r>> " + " ".join(l))
+            try:
+                self.command(l, job)
+            except Exception:
+                self.out("\runrecognized command!")
+
+    def command(self, l, job):
+        port = self.parent.port
+        if l[0] == u"ls":           # list servos
+            self.printed = 0        # how many id's have we printed...
+            self.baud = None        # baud of the id's being printed
+            ids = IDS
+            if port.hasInterpolation or not hasattr(port, "ser"):
+                # each ping waits for its reply, only the usual IDs
+                ids = range(1, self.parent.parent.project.count+1)
+            if len(l) > 1 and l[-1] != u"all":
+                ids = servoList(l[-1])
+            if len(l) > 1 and l[1] == u"all":
+                if port.hasInterpolation:
+                    self.out("\rthe PyPose sketch sets the bus baud, use ls")
+                elif not hasattr(port, "ser"):
+                    self.out("\rls all needs a serial port, use ls")
+                else:
+                    with port.lock:     # the scan talks to the port directly
+                        self.busScan().scanBauds(ids=ids, found=self.found, cancelled=job.cancelled)
+            else:
+                self.out("\r")
+                with port.lock:
+                    self.busScan().scan(ids, found=lambda servo: self.found(None, servo), cancelled=job.cancelled)
+        elif l[0] == u"mv":         # rename a servo
+            if port.setReg(int(l[1]),P_ID,[int(l[2])]) == 0:
+                self.out("\rOK")
+        elif l[0] == u"get":
+            self.out(self.get(l[1], servoList(l[2])))
+        elif l[0] == u"set":
+            reg = PARAMS[l[1]][1]
+            v = int(l[3])
+            if l[1] == u"baud":
+                v = self.convertBaud(v)
+            if PARAMS[l[1]][2] == 2:
+                vals = [v%256, v>>8]
+            else:
+                vals = [v]
+            port.syncWrite(reg, [[servo] + vals for servo in servoList(l[2])])
+            self.out("\rOK")
+        elif l[0] == u"watch":
+            self.watch(l[1], servoList(l[2]), job, *[float(v) for v in l[3:5]])
         else:
-            return 1    # default to 1Mbps
+            raise ValueError(l[0])
+
+    def get(self, param, ids):
+        """ One bulk read of a parameter, as text. """
+        reg, w, length = PARAMS[param]
+        values = self.parent.port.getRegs(ids, reg, length)
+        if len(ids) == 1:
+            if values[0] == None:
+                return "\r-1"
+            return "\r" + str(value(param, values[0]))
+        text = ""
+        for k, (servo, vals) in enumerate(zip(ids, values)):
+            if k%9 == 0:
+                text = text + "\r"
+            if vals == None:
+                text = text + ("%d:-" % servo).rjust(9)
+            else:
+                text = text + ("%d:%d" % (servo, value(param, vals))).rjust(9)
+        return text
+
+    def watch(self, param, ids, job, rate=10, samples=0):
+        """ get, rate times a second, until cancelled or samples done. """
+        period = 1.0/rate
+        deadline = time.time()
+        k = 0
+        while not job.cancelled() and (samples == 0 or k < samples):
+            self.out(self.get(param, ids))
+            k = k + 1
+            deadline = deadline + period
+            wait = deadline - time.time()
+            if wait > 0:
+                job.stop.wait(wait)
+            else:
+                deadline = time.time()
+
+    def busScan(self):
+        port = self.parent.port
+        if not hasattr(port, "ser"):
+            return DriverScan(port)
+        if port.hasInterpolation:       # the sketch relays each ping
+            return BusScan(port.ser, RETURN_DELAY + RELAY_DELAY, pipeline=False)
+        return BusScan(port.ser)
+
+    def found(self, baud, servo):
+        if baud != self.baud:
+            self.baud = baud
+            self.printed = 0
+            self.out("\r" + str(baud) + ":")
+        if self.printed > 8:    # limit the width of each printout
+            self.printed = 0
+            self.out("\r")
+        self.out(repr(servo).rjust(4)) 
+        self.printed = self.printed + 1
+
+    def scanned(self, result=None):
+        self.flush()
+        self.write("\r>> ")
+
+    def convertBaud(self, b):
+        return dict(AX_BAUD_RATES).get(b, 1)    # default to 1Mbps
 
 class ArbotixTerminal(ToolPane):
     """ arbotix/bioloid terminal. """
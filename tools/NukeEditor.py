@@ -26,9 +26,13 @@ from ToolPane import ToolPane
 from ax12 import *
 import time
 from commander import Commander
+from walker import Walker
+from limits import LimitsCapture
 
 # Which IK models to load?
 from models.manifest import iKmodels
+from models import fixedik
+from models import templating
 
 ###############################################################################
 # nuke editor window
@@ -43,6 +47,7 @@ class NukeEditor(ToolPane):
     BT_DRIVE = wx.NewId()
     ID_IKTYPE = wx.NewId()
     ID_IKOPT = wx.NewId()
+    ID_MATH = wx.NewId()
     ID_GAIT_BOX = wx.NewId()
     ID_ANY = wx.NewId()
 
@@ -53,6 +58,7 @@ class NukeEditor(ToolPane):
         self.curpose = ""
         self.ikChoice = ""
         self.optChoice = ""
+        self.mathChoice = "float"
 
         self.sizer = wx.GridBagSizer(10,10)
 
@@ -71,6 +77,12 @@ class NukeEditor(ToolPane):
         configSizer.Add(self.optLabel,(1,0), wx.GBSpan(1,1),wx.ALIGN_CENTER_VERTICAL)
         self.ikOpt = wx.ComboBox(self, self.ID_IKOPT, choices=["4","6"])
         configSizer.Add(self.ikOpt,(1,1))
+
+        # IK math of the exported sketch, fixed point is what small AVRs
+        # want; PyPose itself always solves in float, it is faster here
+        configSizer.Add(wx.StaticText(self, -1, "Math:"),(2,0), wx.GBSpan(1,1),wx.ALIGN_CENTER_VERTICAL)
+        self.ikMath = wx.ComboBox(self, self.ID_MATH, self.mathChoice, choices=["float","fixed"], style=wx.CB_READONLY)
+        configSizer.Add(self.ikMath,(2,1))
         configBox.Add(configSizer)
         self.sizer.Add(configBox, (0,1), wx.GBSpan(1,1), wx.EXPAND)
 
@@ -124,6 +136,7 @@ class NukeEditor(ToolPane):
 
         wx.EVT_COMBOBOX(self, self.ID_IKTYPE, self.doIKType)
         wx.EVT_COMBOBOX(self, self.ID_IKOPT, self.doIkOpt)
+        wx.EVT_COMBOBOX(self, self.ID_MATH, self.doMath)
         wx.EVT_SPINCTRL(self, self.ID_ANY, self.save)
 
 
@@ -143,13 +156,7 @@ class NukeEditor(ToolPane):
         if self.ikChoice == "":
             return
         self.getModel()
-        try:
-            self.servoBox.Clear(True)
-            self.bodyBox.Clear(True)
-            self.sizer.Remove(self.servoBox)
-            self.sizer.Remove(self.bodyBox)
-        except:
-            pass
+        self.clearPanel()
 
         # Body Dimensions
         temp = wx.StaticBox(self, -1, 'Body Dimensions')
@@ -203,6 +210,32 @@ class NukeEditor(ToolPane):
         self.Refresh()
 
 
+    def clearPanel(self):
+        """ Remove the model's dimension and servo boxes, if any. """
+        try:
+            self.servoBox.Clear(True)
+            self.bodyBox.Clear(True)
+            self.sizer.Remove(self.servoBox)
+            self.sizer.Remove(self.bodyBox)
+        except:
+            pass
+
+    def projectUpdated(self):
+        """ A new project, start over from its NUKE string. """
+        self.signs = "+"*18
+        self.curpose = ""
+        self.ikChoice = ""
+        self.optChoice = ""
+        self.clearPanel()
+        self.vars = list()
+        self.servos = list()
+        self.ikType.SetValue("")
+        self.ikOpt.SetValue("")
+        self.ikType.Enable()
+        self.ikOpt.Enable()
+        self.loadData()
+        self.sizer.Fit(self)
+
     ###########################################################################
     # sitrep checks
     def doChecks(self, checks):
@@ -245,6 +278,12 @@ class NukeEditor(ToolPane):
         else:
             print "NUKE: " + self.parent.project.nuke.rstrip()
             nukeStr = self.parent.project.nuke.rstrip()
+            # math, only stored when fixed so older PyPose still reads it
+            self.mathChoice = "float"
+            if nukeStr.endswith(",fixed"):
+                self.mathChoice = "fixed"
+                nukeStr = nukeStr[0:nukeStr.rfind(",")]
+            self.ikMath.SetValue(self.mathChoice)
             # primary data
             self.ikChoice = nukeStr[0:nukeStr.find(",")]
             self.ikType.SetValue(self.ikChoice)
@@ -293,6 +332,8 @@ class NukeEditor(ToolPane):
         for servo in self.servos:
             nukeStr = nukeStr + str(servo.GetValue()) + ","
         nukeStr = nukeStr[0:-1]  # trim last ','
+        if self.mathChoice == "fixed":
+            nukeStr = nukeStr + ",fixed"
         self.parent.project.nuke = nukeStr
         self.parent.project.save = True
 
@@ -316,10 +357,10 @@ class NukeEditor(ToolPane):
     # holla back -- the simple callbacks
     def writePose(self, pose, dt):
         # set pose size -- IMPORTANT!
-        self.port.execute(253, 7, [self.parent.project.count])
+        self.parent.slots.setSize(self.parent.project.count)
         # download the pose
-        self.port.execute(253, 8, [0] + project.extract(pose))
-        self.port.execute(253, 9, [0, dt%256, dt>>8,255,0,0])
+        self.parent.slots.sendPose(0, pose)
+        self.parent.slots.sendTransitions([0, dt%256, dt>>8,255,0,0])
         self.port.execute(253, 10, list())
     def doSignTest(self, e=None):
         """ Do the sign test, let's hope we pass. This is handled by the model. """
@@ -328,10 +369,19 @@ class NukeEditor(ToolPane):
             self.signs = self.model.doSignTest(self)
             self.save()
     def doWalkTest(self, e=None):
-        """ Load a virtual commander, to drive around. """
-        # TODO: Popup box telling you not to do this with the PyPose sketch!
+        """ Load a virtual commander, to drive around. With the PyPose sketch
+        (or a driver that is not a serial port) the IK runs here instead. """
         if self.doChecks(["port"]) > 0:
-            comm = Commander(self, self.port.ser)
+            walker = None
+            ser = getattr(self.port, "ser", None)
+            if ser == None or wx.MessageBox("Solve the IK here and stream poses to the servos?\n(No, if the robot runs an exported NUKE sketch)", "Walk Test", wx.YES_NO) == wx.YES:
+                if self.doChecks(["project","ik"]) == 0:
+                    return
+                self.configModel()
+                if self.model.legs == 4:    # the host gait is for 4 legs only, 6 can pose the body
+                    self.model.gaitGen = self.model.defaultGait
+                walker = Walker(self.port, self.model)
+            comm = Commander(self, ser, walker=walker)
             comm.Center()
     def doIKType(self, e=None):
         """ Set IKType, make leg box visible """
@@ -350,74 +400,50 @@ class NukeEditor(ToolPane):
         self.model.adjustPanel(self)
         self.save()
 
+    def doMath(self, e=None):
+        """ Float or fixed point IK in the exported sketch. """
+        self.mathChoice = self.ikMath.GetValue()
+        self.save()
+
     ###########################################################################
     # Limit & Neutral capture
     def doLimits(self, e=None):
+        """ Capture the limits of all servos at once, while the user moves
+        every limb through its range. """
         if self.doChecks(["project","port"]) == 0:
             return
         else:
             print "Relax servos for capture..."
             self.parent.doRelax()
             print "Capturing limits..."
-            self.parent.project.poses["ik_min"] = project.pose("",self.parent.project.count)
-            self.parent.project.poses["ik_max"] = project.pose("",self.parent.project.count)
-            self.parent.project.save = True
-            self.captureLimits(1)
-    def captureLimits(self, servoID, end=0, prev=0, error=0):
-        """ Capture the limits of this servo, recursively call next. """
-        if servoID <= self.parent.project.count:
-            if end == 0:
-                result = wx.ID_OK
-                if error == 0:      # first time through, ask user to prepare
-                    dlg = NukeDialog(self.parent, 'Capture Limits', 'Click OK when you have moved\n   servo ' + str(servoID) + ' to one extreme')
-                    result = dlg.ShowModal()
-                    dlg.Destroy()
-                if result == wx.ID_OK:
-                    try:
-                        # read in servo position
-                        a = self.port.getReg(servoID,P_PRESENT_POSITION_L, 2)
-                        a = a[0] + (a[1]<<8)
-                        # get other limit
-                        self.captureLimits(servoID,1,a)
-                    except:
-                        if error < 3:   # try again
-                            self.captureLimits(servoID, 0, 0, error+1)
-                        else:           # fail and move on
-                            dlg = wx.MessageDialog(self.parent, 'Unable to read servo ' + str(servoID), 'Capture Error', wx.OK)
-                            dlg.ShowModal()
-                            self.captureLimits(servoID+1)
-                elif result == 42:
-                    self.captureLimits(servoID-1)
+            capture = LimitsCapture(self.port, self.parent.project.count)
+            if self.startJob(lambda job: self.sampleLimits(job, capture)) == None:
+                return
+            dlg = LimitsDialog(self.parent, capture)
+            result = dlg.ShowModal()
+            self.cancelJob()    # wait for the worker to let go of the capture
+            if result == wx.ID_OK:
+                capture.commit(self.parent.project, dlg.setNeutral.GetValue())
+                missing = capture.missing()
+                if len(missing) > 0:
+                    self.parent.sb.SetStatusText("could not read servos: " + ", ".join([str(i) for i in missing]),0)
+                print "Captured limits in", capture.samples, "samples"
+            dlg.Destroy()
+
+    def sampleLimits(self, job, capture, rate=20):
+        """ Sample the servos rate times a second, on a worker, until the
+        limits dialog is closed. """
+        period = 1.0/rate
+        deadline = time.time()
+        while not job.cancelled():
+            capture.sample()
+            deadline = deadline + period
+            wait = deadline - time.time()
+            if wait > 0:
+                job.stop.wait(wait)
             else:
-                result = wx.ID_OK
-                if error == 0:      # first time through, ask user to prepare
-                    dlg = NukeDialog(self.parent, 'Capture Limits', 'Click OK when you have moved\n    servo ' + str(servoID) + ' to the other extreme')
-                    result = dlg.ShowModal()
-                    dlg.Destroy()
-                if result == wx.ID_OK:
-                    # read in other position
-                    try:
-                        a = self.port.getReg(servoID,P_PRESENT_POSITION_L, 2)
-                        a = a[0] + (a[1]<<8)
-                        # do our update to pose
-                        if prev > a:
-                            self.parent.project.poses["ik_max"][servoID-1] = prev
-                            self.parent.project.poses["ik_min"][servoID-1] = a
-                            print "Capture Limits", servoID, ":", a, " to ", prev
-                        else:
-                            self.parent.project.poses["ik_max"][servoID-1] = a
-                            self.parent.project.poses["ik_min"][servoID-1] = prev
-                            print "Capture Limits", servoID, ":", prev, ",", a
-                        self.captureLimits(servoID+1)
-                    except:
-                        if error < 3:   # try again
-                            self.captureLimits(servoID, 1, prev, error+1)
-                        else:           # fail and move on
-                            dlg = wx.MessageDialog(self.parent, 'Unable to read servo ' + str(servoID), 'Capture Error', wx.OK)
-                            dlg.ShowModal()
-                            self.captureLimits(servoID+1)
-                elif result == 42:
-                    self.captureLimits(servoID)
+                deadline = time.time()  # the bus is slower than asked, don't try to catch up
+
     def doNeutral(self, e = None):
         """ Capture the Neutral Position. """
         if self.doChecks(["project","port"]) > 0:
@@ -429,16 +455,25 @@ class NukeEditor(ToolPane):
             dlg = NeutralDialog(self.parent, 'Capture Neutral Position', "tools/models/"+modelClassName+"/neutral.jpg")
             #dlg = wx.MessageDialog(self.parent, 'Click OK when ready!', 'Capture Neutral Position', wx.OK | wx.CANCEL)
             if dlg.ShowModal() == wx.ID_OK:
-                self.parent.project.poses["ik_neutral"] = project.pose("",self.parent.project.count)
-                errors = "could not read servos: "
-                for servo in range(self.parent.project.count):
-                    pos = self.port.getReg(servo+1,P_PRESENT_POSITION_L, 2)
-                    if pos != -1:
-                        self.parent.project.poses["ik_neutral"][servo] = pos[0] + (pos[1]<<8)
-                    else:
-                        errors = errors + str(servo+1) + ", "
-                if errors != "could not read servos: ":
-                    self.parent.sb.SetStatusText(errors[0:-2],0)
+                count = self.parent.project.count
+                self.parent.sb.SetStatusText("capturing neutral...",0)
+                self.startJob(lambda job: self.port.getRegs(range(1, count+1), P_PRESENT_POSITION_L, 2), self.capturedNeutral)
+            dlg.Destroy()
+
+    def capturedNeutral(self, positions):
+        """ Store the neutral position, on the GUI thread. """
+        self.parent.project.poses["ik_neutral"] = project.pose("",self.parent.project.count)
+        errors = "could not read servos: "
+        for servo, pos in enumerate(positions):
+            if pos != None:
+                self.parent.project.poses["ik_neutral"][servo] = pos[0] + (pos[1]<<8)
+            else:
+                errors = errors + str(servo+1) + ", "
+        if errors != "could not read servos: ":
+            self.parent.sb.SetStatusText(errors[0:-2],0)
+        else:
+            self.parent.sb.SetStatusText("captured neutral!",0)
+        self.parent.project.save = True
 
     ###########################################################################
     # export
@@ -481,6 +516,7 @@ class NukeEditor(ToolPane):
             params = dict()
             params["legs"] = str(self.ikOpt.GetValue())
             params["dof"] = str(self.ikOpt.GetValue())
+            params["math"] = self.mathChoice
             params["@VAL_LCOXA"] = str(self.vars[0].GetValue())
             params["@VAL_LFEMUR"] = str(self.vars[1].GetValue())
             params["@VAL_LTIBIA"] = str(self.vars[2].GetValue())
@@ -503,94 +539,43 @@ class NukeEditor(ToolPane):
                 params["@RAD_TO_SERVO_RESOLUTION"] = "195.56959407132f"
             elif self.parent.project.resolution[0] == 4096:
                 params["@RAD_TO_SERVO_RESOLUTION"] = "651.89864690440f"
+            # fixed point: the tables and scaling PyPose's fixedik uses, so both agree
+            params["@SIN_TABLE"] = ", ".join([str(v) for v in fixedik.SIN])
+            params["@ATAN_TABLE"] = ", ".join([str(v) for v in fixedik.ATAN])
+            params["@RAD_TO_BRAD"] = fixedik.RAD_TO_BRAD + "f"
+            if self.parent.project.resolution[0] == 4096:
+                params["@BRAD_TO_SERVO"] = "b/4"
+            else:
+                params["@BRAD_TO_SERVO"] = "(b*3)/40"
 
-            # load general parameters
-            template = open("tools/models/core/template.ik").readlines()
-            code = dict()
-            current = ""
-            for line in template:
-                if line.find("@") == 0 and current == "":
-                    current = line.strip().rstrip()
-                elif line.find("@END_SECTION") > -1:
-                    current = ""
-                else:
-                    try:
-                        code[current] = code[current] + line
-                    except:
-                        code[current] = line
-            # load the parameters for our particular model
+            # code sections, general then for our particular model
             modelDir = iKmodels[self.ikType.GetValue()].folder
-            template = open("tools/models/"+modelDir+"/template.ik").readlines()
-            current = ""
-            for line in template:
-                if line.find("@") == 0 and current == "":
-                    current = line.strip().rstrip()
-                elif line.find("@END_SECTION") > -1:
-                    current = ""
-                else:
-                    try:
-                        code[current] = code[current] + line
-                    except:
-                        code[current] = line
-            code.pop("")
+            code = dict(templating.CACHE.sections("tools/models/core/template.ik"))
+            code.update(templating.CACHE.sections("tools/models/"+modelDir+"/template.ik"))
+            # variables
+            values = dict([(var, val) for var, val in params.items() if var.find("@") == 0])
+            for k,v in servoMap.items():
+                values["@NEUTRAL_"+k] = str(self.parent.project.poses["ik_neutral"][v-1])
+                values["@SIGN_"+k] = self.signs[v-1:v]
 
             templates = dict()
             # load default templates
-            templates["gaits.h"] = open("tools/models/core/gaits.h").read()
-            templates["nuke.h"] = open("tools/models/core/nuke.h").read()
-            templates["nuke.cpp"] = open("tools/models/core/nuke.cpp").read()
+            templates["gaits.h"] = "tools/models/core/gaits.h"
+            templates["nuke.h"] = "tools/models/core/nuke.h"
+            templates["nuke.cpp"] = "tools/models/core/nuke.cpp"
             sketch = os.path.split(skDir)[1]
-            templates[sketch+".ino"] = open("tools/models/core/default.pde").read()
+            templates[sketch+".ino"] = "tools/models/core/default.pde"
             # for each file
-            for fileName in templates.keys():
-                # insert code blocks
-                for var, val in code.items():
-                    templates[fileName] = templates[fileName].replace(var,val)
-                # search and replace variables
-                for var, val in params.items():
-                    if var.find("@") == 0:
-                        templates[fileName] = templates[fileName].replace(var,val)
-                for k,v in servoMap.items():
-                    templates[fileName] = templates[fileName].replace("@NEUTRAL_"+k, str(self.parent.project.poses["ik_neutral"][v-1]))
-                    templates[fileName] = templates[fileName].replace("@SIGN_"+k, self.signs[v-1:v])
-                # save and reopen as lines
-                open(skDir+"/temp","w").write(templates[fileName])
-                template = open(skDir+"/temp").readlines()
-                # process IF/ELSE/END
-                i = 0
-                out = None
-                if fileName.endswith(".pde"):
-                    if os.path.exists(skDir+"/"+fileName):
-                        # open a different file, not the actual sketch
-                        out = open(skDir+"/sketch.NEW","w")
-                    else:
-                        out = open(skDir+"/"+fileName,"w")
+            for fileName, path in templates.items():
+                # insert code blocks and variables, then process IF/ELSE/END
+                text = "".join(templating.render(templating.CACHE.template(path), values, code))
+                text = templating.conditionals(text, params)
+                if fileName.endswith(".pde") and os.path.exists(skDir+"/"+fileName):
+                    # open a different file, not the actual sketch
+                    out = open(skDir+"/sketch.NEW","w")
                 else:
                     out = open(skDir+"/"+fileName,"w")
-                while i < len(template):
-                    if template[i].find("@IF") >= 0:
-                        # do we include this?
-                        line = template[i][template[i].find("@IF")+3:].strip().rstrip()
-                        var = line[0:line.find(" ")].rstrip()
-                        val = line[line.find(" ")+1:].strip().rstrip().split()
-                        i = i + 1
-                        if params[var] in val:
-                            while template[i].find("@ELSE") < 0 and template[i].find("@END_IF") < 0:
-                                print>>out, template[i].rstrip()
-                                i = i + 1
-                            while template[i].find("@END_IF") < 0:
-                                i = i + 1
-                        else:
-                            while template[i].find("@ELSE") < 0 and template[i].find("@END_IF") < 0:
-                                i = i + 1
-                            if template[i].find("@ELSE") >= 0:
-                                i = i + 1 # don't output @ELSE
-                            while template[i].find("@END_IF") < 0:
-                                print>>out, template[i].rstrip()
-                                i = i + 1
-                    else:
-                        print>>out, template[i].rstrip()
-                    i = i + 1
+                out.write(text)
                 out.close()
 
 
@@ -619,6 +604,52 @@ class NukeDialog(wx.Dialog):
     def doBackUp(self, e=None):
         self.EndModal(42)
 
+###########################################################################
+# Live limits capture
+class LimitsDialog(wx.Dialog):
+    """ Shows the range seen for each servo, redrawn from the capture
+    while a job samples it. """
+    TIMER_ID = 101
+
+    def __init__(self, parent, capture, rate=20):
+        wx.Dialog.__init__(self, parent, -1, 'Capture Limits', style=wx.DEFAULT_DIALOG_STYLE|wx.RESIZE_BORDER)
+        self.capture = capture
+
+        vbox = wx.BoxSizer(wx.VERTICAL)
+        vbox.Add(wx.StaticText(self, -1, 'Move every limb through its full range, then click OK'), 0, wx.ALL, 10)
+        self.grid = wx.ListCtrl(self, -1, size=(360, 380), style=wx.LC_REPORT)
+        for col, label in enumerate(["Servo", "Min", "Max", "Now", "Neutral?"]):
+            self.grid.InsertColumn(col, label, width=70)
+        for i in range(capture.count):
+            self.grid.InsertStringItem(i, str(i+1))
+        vbox.Add(self.grid, 1, wx.EXPAND | wx.LEFT | wx.RIGHT, 10)
+        self.setNeutral = wx.CheckBox(self, -1, 'Also set neutral to the middle of each range')
+        vbox.Add(self.setNeutral, 0, wx.ALL, 10)
+
+        hbox = wx.BoxSizer(wx.HORIZONTAL)
+        hbox.Add(wx.Button(self, wx.ID_CANCEL, 'Cancel', size=(100, 50)), 1)
+        hbox.Add(wx.Button(self, wx.ID_OK, 'Ok', size=(80, 50)), 1, wx.LEFT, 5)
+        vbox.Add(hbox, 0, wx.ALIGN_CENTER | wx.BOTTOM, 10)
+        self.SetSizerAndFit(vbox)
+
+        self.timer = wx.Timer(self, self.TIMER_ID)
+        wx.EVT_TIMER(self, self.TIMER_ID, self.onTimer)
+        wx.EVT_WINDOW_DESTROY(self, self.onDestroy)
+        self.timer.Start(1000/rate)
+
+    def onTimer(self, e=None):
+        c = self.capture
+        for i in range(c.count):
+            if c.mins[i] == None:
+                continue
+            self.grid.SetStringItem(i, 1, str(c.mins[i]))
+            self.grid.SetStringItem(i, 2, str(c.maxs[i]))
+            self.grid.SetStringItem(i, 3, str(c.current[i]))
+            self.grid.SetStringItem(i, 4, str(c.neutral(i)))
+
+    def onDestroy(self, e=None):
+        self.timer.Stop()
+
 ###########################################################################
 # A message box, that can display an image
 class NeutralDialog(wx.Dialog):
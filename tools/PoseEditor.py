@@ -50,32 +50,12 @@ class PoseEditor(ToolPane):
         # pose editor, goes in a box:
         temp = wx.StaticBox(self, -1, 'edit pose')
         temp.SetFont(wx.Font(10, wx.DEFAULT, wx.NORMAL, wx.BOLD))
-        editBox = wx.StaticBoxSizer(temp,orient=wx.VERTICAL) 
-        poseEditSizer = wx.GridBagSizer(5,5)
-        # build servo editors
-        self.servos = list() # the editors in the window
-        for i in range(self.parent.project.count):
-            temp = wx.Panel(self,-1)
-            hbox = wx.BoxSizer(wx.HORIZONTAL)
-            if (i+1)<10: 
-                temp.enable = wx.CheckBox(temp, i, "ID 0"+str(i+1))
-            else:
-                temp.enable = wx.CheckBox(temp, i, "ID "+str(i+1))
-            temp.enable.SetValue(True)
-            temp.position = wx.Slider(temp, i, 512, 0, self.parent.project.resolution[i]-1, wx.DefaultPosition, (200, -1), wx.SL_HORIZONTAL | wx.SL_LABELS)
-            hbox.Add(temp.enable)
-            hbox.Add(temp.position)
-            temp.SetSizer(hbox)
-            # multiple columns now:
-            if i < self.parent.columns:
-                poseEditSizer.Add(temp, (0, i), wx.GBSpan(1,1), wx.TOP,10)
-            else:
-                poseEditSizer.Add(temp, (i/self.parent.columns, i%self.parent.columns))
-            temp.Disable()  # servo editors start out disabled, enabled only when a pose is selected
-            self.servos.append(temp)
+        self.editBox = wx.StaticBoxSizer(temp,orient=wx.VERTICAL) 
+        # build servo editors, only as many as fit on screen
+        self.servos = self.makeServos()
         # grid it
-        editBox.Add(poseEditSizer)
-        sizer.Add(editBox, (0,0), wx.GBSpan(1,1), wx.EXPAND)
+        self.editBox.Add(self.servos)
+        sizer.Add(self.editBox, (0,0), wx.GBSpan(1,1), wx.EXPAND)
 
         # list of poses
         self.posebox = wx.ListBox(self, self.ID_POSE_BOX, choices=self.parent.project.poses.keys())
@@ -95,7 +75,7 @@ class PoseEditor(ToolPane):
         self.deltaTButton.Disable()     
         toolbarsizer.Add(self.deltaTButton,1)
         self.deltaT = 500
-        if port != None and port.hasInterpolation == True:        
+        if port != None:        # either the board or the host interpolates
             self.deltaTButton.Enable()
         toolbarsizer.Add(wx.Button(toolbar, self.BT_RELAX, 'relax'),1)
         toolbarsizer.Add(wx.Button(toolbar, self.BT_CAPTURE, 'capture'),1)         
@@ -103,8 +83,6 @@ class PoseEditor(ToolPane):
         toolbar.SetSizer(toolbarsizer)
         sizer.Add(toolbar, (1,0), wx.GBSpan(1,1), wx.ALIGN_CENTER)
 
-        self.Bind(wx.EVT_SLIDER, self.updatePose)
-        self.Bind(wx.EVT_CHECKBOX, self.relaxServo)
         wx.EVT_BUTTON(self, self.BT_RELAX, self.parent.doRelax)    
         wx.EVT_BUTTON(self, self.BT_CAPTURE, self.capturePose) 
         wx.EVT_BUTTON(self, self.BT_SET, self.setPose)   
@@ -126,33 +104,56 @@ class PoseEditor(ToolPane):
 
         self.SetSizerAndFit(sizer)
 
+    def makeServos(self):
+        servos = ServoGrid(self, self.parent.project.resolution[0:self.parent.project.count], self.parent.columns, self.servoChanged, self.relaxServo)
+        servos.Disable()    # servo editors start out disabled, enabled only when a pose is selected
+        return servos
+
+    def projectUpdated(self):
+        """ Rebuild the servo editors for the new project (or columns). """
+        self.Freeze()
+        self.editBox.Detach(self.servos)
+        self.servos.Destroy()
+        self.servos = self.makeServos()
+        self.editBox.Add(self.servos)
+        self.curpose = ""
+        self.posebox.Set(self.parent.project.poses.keys())
+        self.Fit()
+        self.Thaw()
+
+    def activated(self):
+        """ Pick up poses the NUKE editor added or captured. """
+        names = self.parent.project.poses.keys()
+        if sorted(names) != sorted(self.posebox.GetItems()):
+            self.posebox.Set(names)
+            if self.curpose != "":
+                self.posebox.SetStringSelection(self.curpose)
+        if self.curpose != "":
+            self.servos.setValues(self.parent.project.poses[self.curpose])
+
     ###########################################################################
     # Pose Manipulation
-    def updatePose(self, e=None):
+    def servoChanged(self, servo, pos):
         """ Save updates to a pose, do live update if neeeded. """
         if self.curpose != "":
-            self.parent.project.poses[self.curpose][e.GetId()] = e.GetInt()
+            self.parent.project.poses[self.curpose][servo] = pos
+            self.parent.trajectories.invalidatePose(self.curpose)
             self.parent.project.save = True
-            if self.live and self.servos[e.GetId()].enable.IsChecked():   # live update   
-                pos = e.GetInt()   
-                self.port.setReg(e.GetId()+1, P_GOAL_POSITION_L, [pos%256,pos>>8])
+            if self.live and self.servos.enabled[servo]:   # live update   
+                self.port.setReg(servo+1, P_GOAL_POSITION_L, [pos%256,pos>>8])
 
-    def relaxServo(self, e=None):
+    def relaxServo(self, servo, checked):
         """ Relax or enable a servo. """
-        servo = e.GetId() + 1
-        checked = e.IsChecked()
         if checked: 
-            self.port.setReg(servo, P_TORQUE_ENABLE, [1])
+            self.port.setReg(servo+1, P_TORQUE_ENABLE, [1])
         else:
-            self.port.setReg(servo, P_TORQUE_ENABLE, [0])
+            self.port.setReg(servo+1, P_TORQUE_ENABLE, [0])
 
     def loadPose(self, posename):
         if self.curpose == "":   # if we haven't yet, enable servo editors
-            for servo in self.servos:
-                servo.Enable()
+            self.servos.Enable()
         self.curpose = posename
-        for servo in range(self.parent.project.count):
-            self.servos[servo].position.SetValue(self.parent.project.poses[self.curpose][servo])
+        self.servos.setValues(self.parent.project.poses[self.curpose])
         self.parent.sb.SetStatusText('now editing pose: ' + self.curpose,0)
         self.parent.project.save = True
 
@@ -166,31 +167,23 @@ class PoseEditor(ToolPane):
         if self.port != None: 
             if self.curpose != "":   
                 print "Capturing pose..."
-                errors = "could not read servos: "
-                errCount = 0.0
-                dlg = wx.ProgressDialog("capturing pose","this may take a few seconds, please wait...",self.parent.project.count + 1)
-                dlg.Update(1)
-                for servo in range(self.parent.project.count):
-                    pos = self.port.getReg(servo+1,P_PRESENT_POSITION_L, 2)
-                    if pos != -1 and len(pos) > 1:
-                        self.servos[servo].position.SetValue(pos[0] + (pos[1]<<8))
-                    else: 
-                        errors = errors + str(servo+1) + ", "
-                        errCount = errCount + 1.0
-                    if self.curpose != "":                
-                        self.parent.project.poses[self.curpose][servo] = self.servos[servo].position.GetValue() 
-                    val = servo+2
-                    dlg.Update(val)  
-                if errors != "could not read servos: ":
-                    self.parent.sb.SetStatusText(errors[0:-2],0)   
-                    # if we are failing a lot, raise the timeout
-                    if errCount/self.parent.project.count > 0.1 and self.parent.port.ser.timeout < 10:
-                        self.parent.port.ser.timeout = self.parent.port.ser.timeout * 2.0   
-                        print "Raised timeout threshold to ", self.parent.port.ser.timeout
-                else:
-                    self.parent.sb.SetStatusText("captured pose!",0)
-                dlg.Destroy()
-                self.parent.project.save = True
+                name = self.curpose
+                count = self.parent.project.count
+                def work(job):
+                    positions = list()
+                    for servo in range(count):
+                        if job.cancelled():
+                            return None
+                        pos = self.port.getReg(servo+1,P_PRESENT_POSITION_L, 2)
+                        if pos != -1 and len(pos) > 1:
+                            positions.append(pos[0] + (pos[1]<<8))
+                        else:
+                            positions.append(None)
+                        job.progress(servo+1)
+                    return positions
+                def progress(servo):
+                    self.parent.sb.SetStatusText("capturing pose, servo " + str(servo) + " of " + str(count) + "...",0)
+                self.startJob(work, lambda positions: self.capturedPose(name, positions), progress)
             else:
                 self.parent.sb.SetBackgroundColour('RED')
                 self.parent.sb.SetStatusText("Please Select a Pose",0) 
@@ -200,32 +193,54 @@ class PoseEditor(ToolPane):
             self.parent.sb.SetStatusText("No Port Open",0) 
             self.parent.timer.Start(20)
 
+    def capturedPose(self, name, positions):
+        """ Store a captured pose, on the GUI thread. """
+        if name not in self.parent.project.poses:
+            return  # renamed or deleted while we read
+        errors = "could not read servos: "
+        errCount = 0.0
+        for servo, pos in enumerate(positions):
+            if pos == None:
+                errors = errors + str(servo+1) + ", "
+                errCount = errCount + 1.0
+                pos = self.parent.project.poses[name][servo]
+            self.parent.project.poses[name][servo] = pos
+        if self.curpose == name:
+            self.servos.setValues(self.parent.project.poses[name])
+        self.parent.trajectories.invalidatePose(name)
+        if errors != "could not read servos: ":
+            self.parent.sb.SetStatusText(errors[0:-2],0)   
+            # if we are failing a lot, raise the timeout
+            if errCount/self.parent.project.count > 0.1 and hasattr(self.port, "ser") and self.port.ser.timeout < 10:
+                self.port.ser.timeout = self.port.ser.timeout * 2.0   
+                print "Raised timeout threshold to ", self.port.ser.timeout
+        else:
+            self.parent.sb.SetStatusText("captured pose!",0)
+        self.parent.project.save = True
+
     def setPose(self, e=None):
         """ Write a pose out to the robot. """
         if self.port != None:
             if self.curpose != "":
                 # update pose in project
                 for servo in range(self.parent.project.count):
-                    self.parent.project.poses[self.curpose][servo] = self.servos[servo].position.GetValue()   
+                    self.parent.project.poses[self.curpose][servo] = self.servos.values[servo]
+                self.parent.trajectories.invalidatePose(self.curpose)
                 print "Setting pose..."
                 if self.port.hasInterpolation == True:  # lets do this smoothly!
                     # set pose size -- IMPORTANT!
-                    print "Setting pose size at " + str(self.parent.project.count)
-                    self.port.execute(253, 7, [self.parent.project.count])
+                    self.parent.slots.setSize(self.parent.project.count)
                     # download the pose
-                    self.port.execute(253, 8, [0] + project.extract(self.parent.project.poses[self.curpose]))                 
-                    self.port.execute(253, 9, [0, self.deltaT%256,self.deltaT>>8,255,0,0])                
+                    self.parent.slots.sendPose(0, self.parent.project.poses[self.curpose])
+                    self.parent.slots.sendTransitions([0, self.deltaT%256,self.deltaT>>8,255,0,0])
                     self.port.execute(253, 10, list())
                 else:
-                    # aww shucks...
-                    #curPose = list() TODO: should we use a syncWrite here?
-                    for servo in range(self.parent.project.count):
-                         pos = self.servos[servo].position.GetValue()
-                         self.port.setReg(servo+1, P_GOAL_POSITION_L, [pos%256, pos>>8])
-                         self.parent.project.poses[self.curpose][servo] = self.servos[servo].position.GetValue()                 
-                    #    pos = self.servos[servo].position.get()
-                    #    curPose.append( (servo+1, pos%256, pos>>8) )
-                    #self.pose.syncWrite(P_GOAL_POSITION_L, curPose)
+                    # no interpolation on board, do it here and stream the frames, on a worker
+                    interpolator = self.parent.interpolator
+                    pose = list(self.parent.project.poses[self.curpose])
+                    deltaT = self.deltaT
+                    resolutions = list(self.parent.project.resolution)
+                    self.startJob(lambda job: interpolator.moveTo(pose, deltaT, resolutions, job.cancelled))
             else:
                 self.parent.sb.SetBackgroundColour('RED')
                 self.parent.sb.SetStatusText("Please Select a Pose",0) 
@@ -274,8 +289,8 @@ class PoseEditor(ToolPane):
             if dlg.ShowModal() == wx.ID_OK:
                 # rename in project data
                 newName = dlg.GetValue()
-                self.parent.project.poses[newName] = self.parent.project.poses[self.curpose]
-                del self.parent.project.poses[self.curpose] 
+                self.parent.trajectories.invalidatePose(self.curpose)
+                self.parent.project.renamePose(self.curpose, newName)
                 v = self.posebox.FindString(self.curpose)
                 self.posebox.Delete(v)
                 self.posebox.Insert(newName,v)
@@ -286,16 +301,23 @@ class PoseEditor(ToolPane):
     def remPose(self, e=None):
         """ Remove a pose. """
         if self.curpose != "":
-            dlg = wx.MessageDialog(self, 'Are you sure you want to delete this pose?', 'Confirm', wx.OK|wx.CANCEL|wx.ICON_EXCLAMATION)
+            msg = 'Are you sure you want to delete this pose?'
+            users = self.parent.project.poseUsers(self.curpose)
+            if len(users) > 0:
+                msg = msg + '\nIt is still used by: ' + ", ".join(sorted(users))
+            dlg = wx.MessageDialog(self, msg, 'Confirm', wx.OK|wx.CANCEL|wx.ICON_EXCLAMATION)
+            status = "please create or select a pose to edit..."
             if dlg.ShowModal() == wx.ID_OK:
                 v = self.posebox.FindString(self.curpose)
-                del self.parent.project.poses[self.curpose]
+                self.parent.trajectories.invalidatePose(self.curpose)
+                users = self.parent.project.removePose(self.curpose)
                 self.posebox.Delete(v)
                 self.curpose = ""
                 dlg.Destroy()
-                for servo in self.servos:   # disable editors if we have no pose selected
-                    servo.Disable()
-            self.parent.sb.SetStatusText("please create or select a pose to edit...",0)
+                self.servos.Disable()   # disable editors if we have no pose selected
+                if len(users) > 0:
+                    status = "removed pose, still used by: " + ", ".join(sorted(users))
+            self.parent.sb.SetStatusText(status,0)
             self.parent.project.save = True   
 
     def doDeltaT(self, e=None):
@@ -309,10 +331,114 @@ class PoseEditor(ToolPane):
 
     def portUpdated(self):
         """ Adjust delta-T button """
-        if self.port != None and self.port.hasInterpolation == True:        
+        if self.port != None:        
             self.deltaTButton.Enable()
         else:
             self.deltaTButton.Disable()
 
+###############################################################################
+# Virtual grid of servo editors
+class ServoGrid(wx.Panel):
+    """ Editors for every servo of a pose, in columns. Only the rows that
+    fit on screen have widgets; scrolling rebinds them to other servos.
+    Updates are batched between Freeze/Thaw, and only touch editors whose
+    value changed. """
+    ROWS = 9    # rows shown at once
+
+    def __init__(self, parent, resolutions, columns, onChange, onEnable):
+        wx.Panel.__init__(self, parent, -1)
+        self.resolutions = resolutions
+        self.count = len(resolutions)
+        self.columns = columns
+        self.onChange = onChange    # onChange(servo, position)
+        self.onEnable = onEnable    # onEnable(servo, checked)
+        self.values = [512 for i in range(self.count)]
+        self.enabled = [True for i in range(self.count)]
+        self.top = 0                # first row on screen
+        self.rows = (self.count + columns - 1)//columns
+        shown = min(self.rows, self.ROWS)
+
+        hbox = wx.BoxSizer(wx.HORIZONTAL)
+        grid = wx.GridBagSizer(5,5)
+        self.editors = list()
+        for i in range(shown*columns):
+            temp = wx.Panel(self,-1)
+            box = wx.BoxSizer(wx.HORIZONTAL)
+            temp.enable = wx.CheckBox(temp, -1, "ID 00")
+            temp.position = wx.Slider(temp, -1, 512, 0, 1023, wx.DefaultPosition, (200, -1), wx.SL_HORIZONTAL | wx.SL_LABELS)
+            temp.servo = None
+            box.Add(temp.enable)
+            box.Add(temp.position)
+            temp.SetSizer(box)
+            temp.Bind(wx.EVT_SLIDER, lambda e, editor=temp: self.sliderMoved(editor))
+            temp.Bind(wx.EVT_CHECKBOX, lambda e, editor=temp: self.checkBoxed(editor))
+            if i < columns:
+                grid.Add(temp, (0, i), wx.GBSpan(1,1), wx.TOP,10)
+            else:
+                grid.Add(temp, (i/columns, i%columns))
+            self.editors.append(temp)
+        hbox.Add(grid)
+        if self.rows > shown:
+            self.bar = wx.ScrollBar(self, -1, style=wx.SB_VERTICAL)
+            self.bar.SetScrollbar(0, shown, self.rows, shown)
+            self.Bind(wx.EVT_SCROLL, self.doScroll, self.bar)
+            self.Bind(wx.EVT_MOUSEWHEEL, self.doWheel)
+            hbox.Add(self.bar, 0, wx.EXPAND)
+        self.SetSizerAndFit(hbox)
+        self.bind()
+
+    def bind(self):
+        """ Point the editors at the servos of the rows on screen. """
+        self.Freeze()
+        for i, editor in enumerate(self.editors):
+            servo = self.top*self.columns + i
+            if servo >= self.count:
+                editor.servo = None
+                editor.Hide()
+                continue
+            if editor.servo != servo:
+                editor.servo = servo
+                editor.enable.SetLabel("ID %02d" % (servo+1))
+                editor.position.SetRange(0, self.resolutions[servo]-1)
+            editor.Show()
+            if editor.position.GetValue() != self.values[servo]:
+                editor.position.SetValue(self.values[servo])
+            if editor.enable.GetValue() != self.enabled[servo]:
+                editor.enable.SetValue(self.enabled[servo])
+        self.Thaw()
+
+    def scrollTo(self, row):
+        row = max(0, min(row, self.rows - len(self.editors)//self.columns))
+        if row != self.top:
+            self.top = row
+            self.bind()
+            self.bar.SetThumbPosition(row)
+
+    def doScroll(self, e=None):
+        self.scrollTo(self.bar.GetThumbPosition())
+
+    def doWheel(self, e=None):
+        self.scrollTo(self.top - e.GetWheelRotation()//max(1, e.GetWheelDelta()))
+
+    def setValues(self, values):
+        """ Show a pose, touching only the editors that change. """
+        changed = False
+        for servo in range(self.count):
+            if self.values[servo] != values[servo]:
+                self.values[servo] = values[servo]
+                changed = True
+        if changed:
+            self.bind()
+
+    def sliderMoved(self, editor):
+        if editor.servo != None:
+            self.values[editor.servo] = editor.position.GetValue()
+            self.onChange(editor.servo, self.values[editor.servo])
+
+    def checkBoxed(self, editor):
+        if editor.servo != None:
+            self.enabled[editor.servo] = editor.enable.GetValue()
+            self.onEnable(editor.servo, self.enabled[editor.servo])
+
 NAME = "pose editor"
 STATUS = "please create or select a sequence to edit..."
@@ -48,6 +48,7 @@ class SeqEditor(ToolPane):
         ToolPane.__init__(self, parent, port) 
         self.curseq = ""
         self.curtran = -1
+        self.edited = False     # transitions changed since the last save
 
         sizer = wx.GridBagSizer(10,10)
     
@@ -61,7 +62,7 @@ class SeqEditor(ToolPane):
         temp = wx.StaticText(self, -1, "transitions:")
         temp.SetFont(wx.Font(10, wx.DEFAULT, wx.NORMAL, wx.BOLD))
         seqEditSizer.Add(temp, (0,0), wx.GBSpan(1,1), wx.TOP,10)
-        self.tranbox = wx.ListBox(self, self.ID_TRAN_BOX)
+        self.tranbox = TransitionList(self, self.ID_TRAN_BOX)
         seqEditSizer.Add(self.tranbox, (1,0), wx.GBSpan(5,1), wx.EXPAND|wx.ALL) 
         # and add/remove
         hbox = wx.BoxSizer(wx.HORIZONTAL)
@@ -117,17 +118,47 @@ class SeqEditor(ToolPane):
         wx.EVT_BUTTON(self, self.BT_MOVE_DN, self.moveDn)
         wx.EVT_BUTTON(self, self.BT_TRAN_ADD, self.addTran)
         wx.EVT_BUTTON(self, self.BT_TRAN_REM, self.remTran)   
-        wx.EVT_LISTBOX(self, self.ID_TRAN_BOX, self.doTran)
+        wx.EVT_LIST_ITEM_SELECTED(self, self.ID_TRAN_BOX, self.doTran)
         
         wx.EVT_COMBOBOX(self, self.ID_TRAN_POSE, self.updateTran)
         wx.EVT_SPINCTRL(self, self.ID_TRAN_TIME, self.updateTran)
      
     def save(self):            
-        if self.curseq != "":
-            self.parent.project.sequences[self.curseq] = project.sequence()
-            for i in range(self.tranbox.GetCount()):
-                self.parent.project.sequences[self.curseq].append(self.tranbox.GetString(i).replace(",","|"))               
+        if self.curseq != "" and self.edited:
+            seq = project.sequence()
+            seq.extend(self.tranbox.transitions)
+            self.parent.project.setSequence(self.curseq, seq)
             self.parent.project.save = True
+            self.edited = False
+
+    def editing(self):
+        """ A copy of the current sequence, for the transition list. """
+        seq = project.sequence()
+        seq.extend(self.parent.project.sequences[self.curseq])
+        return seq
+
+    def projectUpdated(self):
+        """ A new project, start with nothing selected. """
+        self.curseq = ""
+        self.curtran = -1
+        self.edited = False
+        self.seqbox.Set(self.parent.project.sequences.keys())
+        self.tranbox.show(project.sequence())
+        self.tranPose.SetItems(self.parent.project.poses.keys())
+        self.tranPose.SetValue("")
+
+    def activated(self):
+        """ Pick up poses added, renamed or removed in the pose editor. """
+        value = self.tranPose.GetValue()
+        self.tranPose.SetItems(self.parent.project.poses.keys())
+        self.tranPose.SetValue(value)
+        if self.curseq != "":
+            if list(self.parent.project.sequences[self.curseq]) != list(self.tranbox.transitions):
+                self.tranbox.show(self.editing())
+                if self.curtran >= len(self.tranbox.transitions):
+                    self.curtran = -1
+                elif self.curtran != -1:
+                    self.tranbox.select(self.curtran)
 
     ###########################################################################
     # Sequence Manipulation
@@ -137,10 +168,7 @@ class SeqEditor(ToolPane):
             self.save()            
             self.curseq = str(e.GetString())
             self.curtran = -1
-            for i in range(self.tranbox.GetCount()):
-                self.tranbox.Delete(0)      # TODO: There has got to be a better way to do this??
-            for transition in self.parent.project.sequences[self.curseq]:
-                self.tranbox.Append(transition.replace("|",","))
+            self.tranbox.show(self.editing())
             self.tranPose.SetValue("")
             self.tranTime.SetValue(500)
             self.parent.sb.SetStatusText('now editing sequence: ' + self.curseq)
@@ -152,7 +180,7 @@ class SeqEditor(ToolPane):
             dlg.SetValue("")
             if dlg.ShowModal() == wx.ID_OK:
                 self.seqbox.Append(dlg.GetValue())
-                self.parent.project.sequences[dlg.GetValue()] = project.sequence("")
+                self.parent.project.setSequence(dlg.GetValue(), project.sequence(""))
                 dlg.Destroy()
                 self.parent.project.save = True
         else:
@@ -166,7 +194,7 @@ class SeqEditor(ToolPane):
             if dlg.ShowModal() == wx.ID_OK:
                 # this order is VERY important!
                 v = self.seqbox.FindString(self.curseq)
-                del self.parent.project.sequences[self.curseq]
+                self.parent.project.removeSequence(self.curseq)
                 self.seqbox.Delete(v)
                 self.curseq = ""
                 dlg.Destroy()
@@ -176,86 +204,90 @@ class SeqEditor(ToolPane):
     # Transition Manipulation
     def doTran(self, e=None):
         """ load a transition into the editor. """
-        if e.IsSelection():
-            if self.curseq != "":
-                self.curtran = e.GetInt()
-                v = str(e.GetString())   
-                self.tranPose.SetValue(v[0:v.find(",")])
-                self.tranTime.SetValue(int(v[v.find(",")+1:]))
-                self.parent.project.save = True 
+        if self.curseq != "":
+            self.curtran = e.GetIndex()
+            t = self.tranbox.transitions[self.curtran]
+            self.tranPose.SetValue(project.tranPose(t))
+            self.tranTime.SetValue(project.tranTime(t))
             
+    def edit(self, first, last=None):
+        """ Transitions first to last (or the end) changed. """
+        self.tranbox.changed(first, last)
+        self.edited = True
+        self.parent.project.save = True
+
     def addTran(self, e=None):       
         """ create a new transtion in this sequence. """
         if self.curseq != "":
             if self.curtran != -1:
-                self.tranbox.Insert("none,500",self.curtran+1)
+                self.tranbox.transitions.insert(self.curtran+1, "none|500")
+                self.edit(self.curtran+1)
             else:
-                self.tranbox.Append("none,500")
-            self.parent.project.save = True
+                self.tranbox.transitions.append("none|500")
+                self.edit(len(self.tranbox.transitions)-1)
     def remTran(self, e=None):
         """ remove a sequence. """
         if self.curseq != "" and self.curtran != -1:
             dlg = wx.MessageDialog(self, 'Are you sure you want to delete this transition?', 'Confirm', wx.OK|wx.CANCEL|wx.ICON_EXCLAMATION)
             if dlg.ShowModal() == wx.ID_OK:
-                self.tranbox.Delete(self.curtran)
+                self.tranbox.SetItemState(self.curtran, 0, wx.LIST_STATE_SELECTED)
+                del self.tranbox.transitions[self.curtran]
+                self.edit(self.curtran)
                 self.curtran = -1
                 self.tranPose.SetValue("")
                 self.tranTime.SetValue(500)
                 dlg.Destroy()
-                self.parent.project.save = True
 
     def moveUp(self, e=None):
         if self.curtran > 0:
-            self.tranbox.Delete(self.curtran)
-            self.curtran = self.curtran - 1
-            self.tranbox.Insert(self.tranPose.GetValue() + "," + str(self.tranTime.GetValue()), self.curtran)
-            self.tranbox.SetSelection(self.curtran)
-            self.parent.project.save = True
+            self.swap(self.curtran - 1)
     def moveDn(self, e=None):
-        if self.curtran < self.tranbox.GetCount()-1:
-            self.tranbox.Delete(self.curtran)
-            self.curtran = self.curtran + 1
-            self.tranbox.Insert(self.tranPose.GetValue() + "," + str(self.tranTime.GetValue()), self.curtran)   
-            self.tranbox.SetSelection(self.curtran)
-            self.parent.project.save = True
+        if self.curtran != -1 and self.curtran < len(self.tranbox.transitions)-1:
+            self.swap(self.curtran + 1)
+    def swap(self, other):
+        """ Swap the current transition with another, and follow it. """
+        transitions = self.tranbox.transitions
+        transitions[self.curtran], transitions[other] = transitions[other], transitions[self.curtran]
+        self.edit(min(self.curtran, other), max(self.curtran, other))
+        self.tranbox.select(other)
     def updateTran(self, e=None):
         if self.curtran != -1:
-            self.tranbox.Delete(self.curtran)
-            self.tranbox.Insert(self.tranPose.GetValue() + "," + str(self.tranTime.GetValue()), self.curtran)
+            self.tranbox.transitions[self.curtran] = self.tranPose.GetValue() + "|" + str(self.tranTime.GetValue())
             print "Updated: " + self.tranPose.GetValue() + "," + str(self.tranTime.GetValue()), self.curtran
-            self.tranbox.SetSelection(self.curtran)
-            self.parent.project.save = True  
+            self.edit(self.curtran, self.curtran)
 
     def runSeq(self, e=None):
         """ download poses, seqeunce, and send. """
         self.save() # save sequence            
         if self.port != None: 
-            if self.curseq != "":
+            if self.curseq != "" and not self.port.hasInterpolation:
+                # no PyPose sketch to download to, play it from here
+                print "Run sequence on host..."
+                self.parent.player.play(self.parent.project, self.curseq, e.GetId() == self.BT_LOOP)
+                self.parent.sb.SetStatusText('Playing Sequence: ' + self.curseq)
+            elif self.curseq != "":
                 print "Run sequence..."
-                poseDL = dict()     # key = pose name, val = index, download them after we build a transition list
+                # find the poses, reuse slots already holding them on the board
+                poses = dict()
+                for t in self.parent.project.sequences[self.curseq]:  
+                    p = project.tranPose(t)
+                    poses[p] = self.parent.project.poses[p]
+                poseDL = self.parent.slots.assign(poses)  # key = pose name, val = index
                 tranDL = list()     # list of bytes to download
                 for t in self.parent.project.sequences[self.curseq]:  
-                    p = t[0:t.find("|")]                    # pose name
-                    dt = int(t[t.find("|")+1:])             # delta-T
-                    if p not in poseDL.keys():
-                        poseDL[p] = len(poseDL.keys())      # get ix for pose
+                    dt = project.tranTime(t)                # delta-T
                     # create transition values to download
-                    tranDL.append(poseDL[p])                # ix of pose
+                    tranDL.append(poseDL[project.tranPose(t)])  # ix of pose
                     tranDL.append(dt%256)                   # time is an int (16-bytes)
                     tranDL.append(dt>>8)
                 tranDL.append(255)      # notice to stop
                 tranDL.append(0)        # time is irrelevant on stop    
                 tranDL.append(0)
-                # set pose size -- IMPORTANT!
-                print "Setting pose size at " + str(self.parent.project.count)
-                self.port.execute(253, 7, [self.parent.project.count])
-                # send poses            
+                # set pose size, send poses and sequence -- only what changed
+                self.parent.slots.setSize(self.parent.project.count)
                 for p in poseDL.keys():
-                    print "Sending pose " + str(p) + " to position " + str(poseDL[p])
-                    self.port.execute(253, 8, [poseDL[p]] + project.extract(self.parent.project.poses[p])) 
-                print "Sending sequence: " + str(tranDL)
-                # send sequence and play            
-                self.port.execute(253, 9, tranDL) 
+                    self.parent.slots.sendPose(poseDL[p], poses[p])
+                self.parent.slots.sendTransitions(tranDL)
                 # run or loop?
                 if e.GetId() == self.BT_LOOP:
                     self.port.execute(253,11,list())
@@ -275,11 +307,56 @@ class SeqEditor(ToolPane):
         """ send halt message ("H") """ 
         if self.port != None:
             print "Halt sequence..."
-            self.port.ser.write("H")
+            if self.parent.player != None and self.parent.player.playing():
+                self.parent.player.halt()
+                self.parent.sb.SetStatusText('Halted: ' + str(self.parent.player.stats))
+            else:
+                self.port.ser.write("H")
         else:
             self.parent.sb.SetBackgroundColour('RED')
             self.parent.sb.SetStatusText("No Port Open",0) 
             self.parent.timer.Start(20)
 
+###############################################################################
+# Transitions of the sequence being edited
+class TransitionList(wx.ListCtrl):
+    """ Virtual list over a list of "pose|time" transitions: rows are only
+    drawn when on screen, straight from the list, so loading a sequence
+    costs the same whatever its length, and an edit only redraws the rows
+    it touched. """
+
+    def __init__(self, parent, id):
+        wx.ListCtrl.__init__(self, parent, id, size=(200,250), style=wx.LC_REPORT|wx.LC_VIRTUAL|wx.LC_SINGLE_SEL)
+        self.InsertColumn(0, "pose", width=120)
+        self.InsertColumn(1, "delta-T", width=70)
+        self.transitions = list()
+
+    def show(self, transitions):
+        self.transitions = transitions
+        self.DeleteAllItems()   # drops the selection too
+        self.SetItemCount(len(transitions))
+        self.Refresh()
+
+    def OnGetItemText(self, item, col):
+        t = self.transitions[item]
+        if col == 0:
+            return project.tranPose(t)
+        return t[t.find("|")+1:]
+
+    def changed(self, first, last=None):
+        """ Redraw rows first to last, or to the end if rows were
+        inserted or removed. """
+        count = len(self.transitions)
+        if self.GetItemCount() != count:
+            self.SetItemCount(count)
+        if last == None:
+            last = count - 1
+        if first <= last:
+            self.RefreshItems(first, last)
+
+    def select(self, item):
+        self.SetItemState(item, wx.LIST_STATE_SELECTED|wx.LIST_STATE_FOCUSED, wx.LIST_STATE_SELECTED|wx.LIST_STATE_FOCUSED)
+        self.EnsureVisible(item)
+
 NAME = "sequence editor"
 STATUS = "please create or select a sequence to edit..."
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+
+"""
+  PyPose: Bioloid pose system for arbotiX robocontroller
+  Copyright (c) 2008-2010 Michael E. Ferguson.  All right reserved.
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software Foundation,
+  Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import wx, time
+from ax12 import *
+from ToolPane import ToolPane
+try:
+    import numpy
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+HISTORY = 1200      # samples kept per channel
+FPS = 60            # plot redraws per second, at most
+
+# what we plot: name, unit, lowest, highest (position is set per project)
+QUANTITIES = [("position", "", 0, 1023),
+              ("load", "", -1023, 1023),
+              ("voltage", "V", 5.0, 16.0),
+              ("temperature", "C", 20, 85)]
+
+COLOURS = ["#e41a1c", "#377eb8", "#4daf4a", "#984ea3", "#ff7f00",
+           "#a65628", "#f781bf", "#999999", "#17becf", "#bcbd22",
+           "#1b9e77", "#d95f02", "#7570b3", "#e7298a", "#66a61e",
+           "#e6ab02", "#1f78b4", "#b15928", "#6a3d9a", "#000000"]
+
+def decode(vals):
+    """ Position, load, voltage and temperature, from the 8 registers
+    starting at P_PRESENT_POSITION_L. """
+    load = vals[4] + ((vals[5]&3)<<8)
+    if vals[5] & 4:
+        load = -load
+    return (vals[0] + (vals[1]<<8), load, vals[6]/10.0, vals[7])
+
+###############################################################################
+# Fixed size history
+class Ring:
+    """ The last size samples of a channel, the oldest overwritten. """
+
+    def __init__(self, size):
+        self.size = size
+        self.data = [0]*size
+        self.head = 0       # where the next sample goes
+        self.count = 0
+
+    def append(self, value):
+        self.data[self.head] = value
+        self.head = (self.head + 1) % self.size
+        if self.count < self.size:
+            self.count = self.count + 1
+
+    def last(self):
+        if self.count == 0:
+            return None
+        return self.data[self.head-1]
+
+    def values(self):
+        """ Oldest to newest. """
+        if self.count < self.size:
+            return self.data[0:self.count]
+        return self.data[self.head:] + self.data[0:self.head]
+
+def decimate(values, width):
+    """ Squeeze values into width columns, as (lowest, highest) of each,
+    so spikes survive however much history is on screen. Each column
+    also reaches to where the previous one ended, to keep the trace
+    joined. """
+    n = len(values)
+    if HAS_NUMPY and n > width:
+        a = numpy.array(values)
+        edges = (numpy.arange(width+1)*n)//width
+        lo = numpy.minimum.reduceat(a, edges[:-1])
+        hi = numpy.maximum.reduceat(a, edges[:-1])
+        ends = a[edges[1:]-1]
+        lo[1:] = numpy.minimum(lo[1:], ends[:-1])
+        hi[1:] = numpy.maximum(hi[1:], ends[:-1])
+        return zip(lo.tolist(), hi.tolist())
+    columns = list()
+    prev = None
+    for x in range(min(n, width)):
+        bucket = values[x*n//min(n, width):(x+1)*n//min(n, width)]
+        lo = min(bucket)
+        hi = max(bucket)
+        if prev != None:
+            lo = min(lo, prev)
+            hi = max(hi, prev)
+        columns.append((lo, hi))
+        prev = bucket[-1]
+    return columns
+
+###############################################################################
+# Double buffered plot
+class Plot(wx.Panel):
+    """ Draws one trace per channel, decimated to the pixel width. """
+
+    def __init__(self, parent, size=(600, 360)):
+        wx.Panel.__init__(self, parent, -1, size=size)
+        self.SetBackgroundStyle(wx.BG_STYLE_CUSTOM)
+        self.channels = list()  # (label, colour, ring)
+        self.range = (0, 1023)
+        self.unit = ""
+        self.Bind(wx.EVT_PAINT, self.onPaint)
+        self.Bind(wx.EVT_SIZE, lambda e: self.Refresh(False))
+
+    def onPaint(self, e=None):
+        dc = wx.AutoBufferedPaintDC(self)
+        dc.SetBackground(wx.WHITE_BRUSH)
+        dc.Clear()
+        width, height = self.GetClientSize()
+        lo, hi = self.range
+        scale = (height - 20)/float(hi - lo)
+        def y(v):
+            return height - 10 - int((v - lo)*scale)
+        dc.SetPen(wx.LIGHT_GREY_PEN)
+        dc.DrawLine(0, y(lo), width, y(lo))
+        dc.DrawLine(0, y(hi), width, y(hi))
+        dc.SetTextForeground(wx.Colour(128,128,128))
+        dc.DrawText(str(hi) + self.unit, 2, 0)
+        dc.DrawText(str(lo) + self.unit, 2, height - 24)
+        plotWidth = max(width - 120, 1)
+        for i, (label, colour, ring) in enumerate(self.channels):
+            if ring.count < 2:
+                continue
+            dc.SetPen(wx.Pen(colour, 1 + i//len(COLOURS)))    # wider once colours repeat
+            columns = decimate(ring.values(), plotWidth)
+            # newest sample at the right edge
+            x0 = plotWidth - len(columns)
+            dc.DrawLineList([(x0+x, y(a), x0+x, y(b)+1) for x, (a, b) in enumerate(columns)])
+            dc.SetTextForeground(colour)
+            dc.DrawText(label + ": " + str(ring.last()) + self.unit, plotWidth + 8, 2 + 14*i)
+
+###############################################################################
+# The tool
+class TelemetryMonitor(ToolPane):
+    """ Watch position, load, voltage and temperature of servos over time.
+    All selected servos are polled with one bulk read per sample, on a
+    worker, and the plot redraws on a timer only when new samples came. """
+    BT_START = wx.NewId()
+    BT_STOP = wx.NewId()
+    BT_ALL = wx.NewId()
+    BT_NONE = wx.NewId()
+    ID_SERVOS = wx.NewId()
+    ID_QUANTITY = wx.NewId()
+
+    def __init__(self, parent, port=None):
+        ToolPane.__init__(self, parent, port)
+        self.poller = None
+        self.samples = 0    # bulk reads done
+        self.misses = 0     # servo reads that failed
+        self.drawn = -1     # samples when we last drew
+        self.ids = list()   # servos being polled
+
+        sizer = wx.GridBagSizer(10,10)
+        temp = wx.StaticBox(self, -1, 'servos')
+        temp.SetFont(wx.Font(10, wx.DEFAULT, wx.NORMAL, wx.BOLD))
+        servoBox = wx.StaticBoxSizer(temp,orient=wx.VERTICAL)
+        self.servos = wx.CheckListBox(self, self.ID_SERVOS, size=(100,200))
+        servoBox.Add(self.servos, 1, wx.EXPAND)
+        hbox = wx.BoxSizer(wx.HORIZONTAL)
+        hbox.Add(wx.Button(self, self.BT_ALL, 'all', size=(50,-1)))
+        hbox.Add(wx.Button(self, self.BT_NONE, 'none', size=(50,-1)))
+        servoBox.Add(hbox)
+        servoBox.Add(wx.StaticText(self, -1, "show:"), 0, wx.TOP, 10)
+        self.quantity = wx.Choice(self, self.ID_QUANTITY, choices=[q[0] for q in QUANTITIES])
+        self.quantity.SetSelection(0)
+        servoBox.Add(self.quantity)
+        servoBox.Add(wx.StaticText(self, -1, "samples/S:"), 0, wx.TOP, 10)
+        self.rate = wx.SpinCtrl(self, -1, '10', min=1, max=100)
+        servoBox.Add(self.rate)
+        sizer.Add(servoBox, (0,0), wx.GBSpan(1,1), wx.EXPAND)
+
+        self.plot = Plot(self)
+        sizer.Add(self.plot, (0,1), wx.GBSpan(1,1), wx.EXPAND)
+
+        # toolbar
+        toolbar = wx.Panel(self, -1)
+        toolbarsizer = wx.BoxSizer(wx.HORIZONTAL)
+        self.startButton = wx.Button(toolbar, self.BT_START, 'start')
+        toolbarsizer.Add(self.startButton,1)
+        self.stopButton = wx.Button(toolbar, self.BT_STOP, 'stop')
+        self.stopButton.Disable()
+        toolbarsizer.Add(self.stopButton,1)
+        toolbar.SetSizer(toolbarsizer)
+        sizer.Add(toolbar, (1,0), wx.GBSpan(1,2), wx.ALIGN_CENTER)
+        self.SetSizerAndFit(sizer)
+
+        self.timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.redraw, self.timer)
+        wx.EVT_BUTTON(self, self.BT_START, self.doStart)
+        wx.EVT_BUTTON(self, self.BT_STOP, self.doStop)
+        wx.EVT_BUTTON(self, self.BT_ALL, lambda e: self.selectAll(True))
+        wx.EVT_BUTTON(self, self.BT_NONE, lambda e: self.selectAll(False))
+        wx.EVT_CHECKLISTBOX(self, self.ID_SERVOS, self.showChannels)
+        wx.EVT_CHOICE(self, self.ID_QUANTITY, self.showChannels)
+        self.projectUpdated()
+
+    ###########################################################################
+    # Polling, on a worker
+    def poll(self, job, period):
+        ids = list(self.ids)
+        deadline = time.time()
+        while not job.cancelled():
+            values = self.port.getRegs(ids, P_PRESENT_POSITION_L, 8)
+            for servo, vals in zip(ids, values):
+                if vals == None:
+                    self.misses = self.misses + 1
+                    continue
+                for ring, v in zip(self.history[servo], decode(vals)):
+                    ring.append(v)
+            self.samples = self.samples + 1
+            deadline = deadline + period
+            wait = deadline - time.time()
+            if wait > 0:
+                job.stop.wait(wait)
+            else:
+                deadline = time.time()  # the bus is slower than asked, don't try to catch up
+
+    def doStart(self, e=None):
+        if self.port == None:
+            self.parent.sb.SetBackgroundColour('RED')
+            self.parent.sb.SetStatusText("No Port Open",0)
+            self.parent.timer.Start(20)
+            return
+        self.ids = [i+1 for i in range(self.servos.GetCount()) if self.servos.IsChecked(i)]
+        if len(self.ids) == 0:
+            self.parent.sb.SetStatusText("please select some servos",0)
+            return
+        period = 1.0/self.rate.GetValue()
+        self.poller = self.startJob(lambda job: self.poll(job, period))
+        if self.poller != None:
+            self.startButton.Disable()
+            self.stopButton.Enable()
+            self.timer.Start(1000//FPS)
+            self.parent.sb.SetStatusText("monitoring " + str(len(self.ids)) + " servos...",0)
+
+    def doStop(self, e=None):
+        self.cancelJob()
+        self.stopped()
+
+    def stopped(self):
+        self.poller = None
+        self.timer.Stop()
+        self.startButton.Enable()
+        self.stopButton.Disable()
+        self.parent.sb.SetStatusText(str(self.samples) + " samples, " + str(self.misses) + " failed reads",0)
+
+    ###########################################################################
+    # Plotting
+    def showChannels(self, e=None):
+        """ Plot the chosen quantity for the checked servos. """
+        name, unit, lo, hi = QUANTITIES[self.quantity.GetSelection()]
+        if name == "position":
+            hi = max(self.parent.project.resolution[0:self.parent.project.count] or [1024]) - 1
+        self.plot.range = (lo, hi)
+        self.plot.unit = unit
+        q = self.quantity.GetSelection()
+        self.plot.channels = [("ID %02d" % (i+1), COLOURS[k%len(COLOURS)], self.history[i+1][q])
+            for k, i in enumerate([i for i in range(self.servos.GetCount()) if self.servos.IsChecked(i)])]
+        self.plot.Refresh(False)
+
+    def redraw(self, e=None):
+        if ToolPane.job is not self.poller:
+            self.stopped()      # cancelled elsewhere, or failed
+        if self.samples != self.drawn:
+            self.drawn = self.samples
+            self.plot.Refresh(False)
+
+    def selectAll(self, checked):
+        for i in range(self.servos.GetCount()):
+            self.servos.Check(i, checked)
+        self.showChannels()
+
+    ###########################################################################
+    # Frame notifications
+    def projectUpdated(self):
+        if self.poller != None:
+            self.doStop()
+        count = self.parent.project.count
+        self.servos.Set(["ID %02d" % (i+1) for i in range(count)])
+        self.history = dict([(i+1, [Ring(HISTORY) for q in QUANTITIES]) for i in range(count)])
+        self.samples = 0
+        self.misses = 0
+        self.showChannels()
+
+    def portUpdated(self):
+        if self.port == None and self.poller != None:
+            self.doStop()
+
+NAME = "telemetry monitor"
+STATUS = "select servos to monitor..."
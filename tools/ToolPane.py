@@ -20,9 +20,58 @@
 """
 
 import wx
+import sys, threading, traceback
+
+class Job:
+    """ A bus operation, run on a worker thread. work(job) returns the
+    result; it may call job.progress(...) as it goes, and should stop early
+    once job.cancelled() is True. Callbacks run on the GUI thread. """
+
+    def __init__(self, work, done=None, progress=None):
+        self.work = work
+        self.done = done
+        self.onProgress = progress
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.result = None
+        self.error = None
+
+    def cancel(self):
+        self.stop.set()
+
+    def cancelled(self):
+        return self.stop.is_set()
+
+    def progress(self, *args):
+        """ Call the progress callback on the GUI thread. """
+        if self.onProgress != None and not self.cancelled():
+            wx.CallAfter(self.report, args)
+
+    def report(self, args):
+        if not self.cancelled():
+            self.onProgress(*args)
+
+    def run(self):
+        try:
+            self.result = self.work(self)
+        except Exception:
+            self.error = "".join(traceback.format_exception(*sys.exc_info()))
+        wx.CallAfter(self.finish)
+
+    def finish(self):
+        if ToolPane.job is self:
+            ToolPane.job = None
+        if self.cancelled():
+            return
+        if self.error != None:
+            print(self.error)
+        elif self.done != None:
+            self.done(self.result)
 
 class ToolPane(wx.Panel):
     """ base class for a tool pane for PyPose. """
+    job = None      # the bus is shared, so one job at a time for all panes
     
     def __init__(self, parent, port=None):
         wx.Panel.__init__(self,parent,style=wx.TAB_TRAVERSAL)
@@ -35,3 +84,41 @@ class ToolPane(wx.Panel):
     def portUpdated(self):
         pass
 
+    def projectUpdated(self):
+        """ The project was replaced (or the pose editor columns changed),
+        panes are kept between tool switches so they must reload. """
+        pass
+
+    def activated(self):
+        """ The pane is about to be shown again. Other tools may have
+        changed the project meanwhile, refresh what depends on it. """
+        pass
+
+    ###########################################################################
+    # background bus jobs
+    def busy(self):
+        return ToolPane.job != None
+
+    def startJob(self, work, done=None, progress=None):
+        """ Run work(job) on a worker, so the editor stays responsive. Then
+        done(result) is called, unless it failed or was cancelled. Returns
+        the job, or None if another one is still running. """
+        if self.busy():
+            self.parent.sb.SetBackgroundColour('RED')
+            self.parent.sb.SetStatusText("Busy, please wait...",0)
+            self.parent.timer.Start(20)
+            return None
+        ToolPane.job = Job(work, done, progress)
+        ToolPane.job.thread.start()
+        return ToolPane.job
+
+    def cancelJob(self, wait=True):
+        """ Cancel the running job, and by default wait until the worker
+        has let go of the bus. Its callbacks won't be called. """
+        job = ToolPane.job
+        if job != None:
+            job.cancel()
+            if wait:
+                job.thread.join()
+            ToolPane.job = None
+
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+""" Generic body and leg IK for legs made of a coxa, femur and tibia servo. """
+
+from math import cos, sin, atan2, sqrt, acos
+
+JOINTS = [" Coxa", " Femur", " Tibia"]
+
+# radians to servo position offset, by resolution
+RAD_TO_SERVO = {1024: 195.56959407132098, 4096: 651.8986469044033}
+
+class Chain:
+    """ A model declares each leg as a Chain: where its endpoint and gait
+    offsets live in the model, the prefix of its servo names, where its
+    coxa is mounted and how the leg frame is mirrored. """
+
+    def __init__(self, endpoint, gait, prefix, mount, mirror, angle=0.0):
+        self.endpoint = endpoint    # e.g. "RIGHT_FRONT"
+        self.gait = gait            # e.g. "RF_GAIT"
+        self.prefix = prefix        # e.g. "RF", servos are "RF Coxa", ...
+        self.mount = mount          # coxa (X,Y), in units of (X_COXA, Y_COXA, Y_MID)
+        self.mirror = mirror        # (X,Y) signs, into the frame of the leg
+        self.angle = angle          # coxa mount angle (rad), 0 if square to the body
+        self.servos = [prefix + j for j in JOINTS]
+        self.labels = [prefix + "_" + j.strip().upper() for j in JOINTS]
+
+class ChainSolver:
+    """ Solves any Chain. Everything that only depends on the dimensions is
+    computed once in configure(), and the body rotation once per pose in
+    setBody(), rather than for each leg. """
+
+    def __init__(self, chains):
+        self.chains = chains
+        self.setBody(0.0, 0.0, 0.0, 0.0, 0.0)
+
+    def configure(self, coxa, femur, tibia, xCoxa, yCoxa, yMid):
+        self.coxa = coxa
+        self.femur = femur
+        self.tibia = tibia
+        self.femurSq = femur*femur
+        self.tibiaSq = tibia*tibia
+        self.femur2 = 2*femur
+        self.femurTibia2 = float(2*tibia*femur)
+        self.mounts = dict()
+        for c in self.chains:
+            mx, my, mm = c.mount
+            self.mounts[c.prefix] = (mx*xCoxa, my*yCoxa + mm*yMid, cos(c.angle), sin(c.angle))
+
+    def setBody(self, rotX, rotY, rotZ, posX, posY):
+        self.cosB = cos(rotX)
+        self.sinB = sin(rotX)
+        self.cosG = cos(rotY)
+        self.sinG = sin(rotY)
+        self.rotZ = rotZ
+        self.cosA0 = cos(rotZ)
+        self.sinA0 = sin(rotZ)
+        self.posX = posX
+        self.posY = posY
+
+    def bodyIK(self, X, Y, Z, Xdisp, Ydisp, Zrot):
+        """ Offsets of a foot due to the body pose, from setBody().
+          BodyIK based on the work of Xan """
+        cosB, sinB, cosG, sinG = self.cosB, self.sinB, self.cosG, self.sinG
+        if Zrot == 0:
+            cosA, sinA = self.cosA0, self.sinA0
+        else:
+            cosA = cos(self.rotZ+Zrot)
+            sinA = sin(self.rotZ+Zrot)
+
+        totalX = int(X + Xdisp + self.posX)
+        totalY = int(Y + Ydisp + self.posY)
+
+        return [int(totalX - int(totalX*cosG*cosA + totalY*sinB*sinG*cosA + Z*cosB*sinG*cosA - totalY*cosB*sinA + Z*sinB*sinA)) + self.posX,
+                int(totalY - int(totalX*cosG*sinA + totalY*sinB*sinG*sinA + Z*cosB*sinG*sinA + totalY*cosB*cosA - Z*sinB*cosA)) + self.posY,
+                int(Z - int(-totalX*sinG + totalY*sinB*cosG + Z*cosB*cosG))]
+
+    def legIK(self, X, Y, Z):
+        """ Coxa, femur and tibia angles (rad) for a target in the leg frame,
+        None if it can't be reached. """
+        # first, make this a 2DOF problem... by solving coxa
+        coxa = atan2(X,Y)
+        trueX = int(sqrt(X*X + Y*Y)) - self.coxa
+        im = int(sqrt(trueX*trueX + Z*Z))  # length of imaginary leg
+        if im == 0:
+            return None
+        # get femur angle above horizon...
+        c = (self.femurSq - self.tibiaSq + im*im)/float(self.femur2*im)
+        # and tibia angle from femur...
+        t = (self.femurSq - im*im + self.tibiaSq)/self.femurTibia2
+        if c < -1 or c > 1 or t < -1 or t > 1:
+            return None
+        return (coxa, -atan2(Z,trueX) + acos(c), acos(t) - 1.57)
+
+    def toServos(self, angles, resolution):
+        """ Servo offsets for the angles from legIK, [1024,1024,1024] if
+        there was no solution. """
+        if angles == None:
+            return [1024,1024,1024]
+        k = RAD_TO_SERVO.get(resolution, RAD_TO_SERVO[1024])
+        return [int(a*k) for a in angles]
+
+    def toLeg(self, chain, x, y):
+        """ body X, Y relative to the coxa into the frame of the leg. """
+        sx, sy = chain.mirror
+        x = sx*x
+        y = sy*y
+        if chain.angle != 0:
+            xDisp, yDisp, cosM, sinM = self.mounts[chain.prefix]
+            x, y = x*cosM + y*sinM, y*cosM - x*sinM
+        return x, y
+
+    def solve(self, chain, end, gait):
+        """ Body and leg IK of a chain, for its endpoint and gait offsets
+        (x,y,z,r). Returns the leg angles (or None) and the body IK. """
+        xDisp, yDisp, cosM, sinM = self.mounts[chain.prefix]
+        req = self.bodyIK(end[0]+gait[0], end[1]+gait[1], end[2]+gait[2], xDisp, yDisp, gait[3])
+        x, y = self.toLeg(chain, end[0]+req[0]+gait[0], end[1]+req[1]+gait[1])
+        return self.legIK(x, y, end[2]+req[2]+gait[2]), req
+
+    def legTarget(self, chain, X, Y, Z, r=0):
+        """ Foot position (endpoint plus gait) into the frame of the leg.
+        Returns that and the body IK. """
+        xDisp, yDisp, cosM, sinM = self.mounts[chain.prefix]
+        req = self.bodyIK(X, Y, Z, xDisp, yDisp, r)
+        x, y = self.toLeg(chain, X+req[0], Y+req[1])
+        return (x, y, Z+req[2]), req
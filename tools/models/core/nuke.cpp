@@ -65,6 +65,118 @@ void setupIK(){
 
 #include "gaits.h"
 
+@IF math fixed
+/* Fixed point math, the same as PyPose's fixedik.py: angles in brads
+ * (16384 to a turn), sin/cos in Q14, from tables. */
+#include <avr/pgmspace.h>
+#define Q14     16384L
+const int sinTable[] PROGMEM = {@SIN_TABLE};
+const int atanTable[] PROGMEM = {@ATAN_TABLE};
+
+long radToBrad(float rads){
+  return (long) (rads * @RAD_TO_BRAD);
+}
+
+/* Convert brads to servo position offset. */
+int bradToServo(long b){
+  return (int) (@BRAD_TO_SERVO);
+}
+
+long isin(long a){
+  a = a & 16383;
+  long r = a & 4095;
+  if(a & 4096)
+    r = 4096 - r;
+  int i = r >> 4;
+  long s = pgm_read_word(&sinTable[i]);
+  long v = s + ((((long)pgm_read_word(&sinTable[i+1]) - s)*(r & 15)) >> 4);
+  if(a & 8192)
+    return -v;
+  return v;
+}
+
+long icos(long a){
+  return isin(a + 4096);
+}
+
+/* atan of r/65536, 0 <= r <= 65536 */
+long lookupAtan(long r){
+  int i = r >> 8;
+  long t = pgm_read_word(&atanTable[i]);
+  return t + ((((long)pgm_read_word(&atanTable[i+1]) - t)*(r & 255)) >> 8);
+}
+
+long iatan2(long y, long x){
+  long ax = labs(x);
+  long ay = labs(y);
+  long a;
+  if(ay <= ax){
+    if(ax == 0)
+      return 0;
+    a = lookupAtan((ay << 16)/ax);
+  }else{
+    a = 4096 - lookupAtan((ax << 16)/ay);
+  }
+  if(x < 0)
+    a = 8192 - a;
+  if(y < 0)
+    a = -a;
+  return a;
+}
+
+unsigned long isqrt(unsigned long n){
+  unsigned long root = 0;
+  unsigned long bit = 1UL << 30;
+  while(bit > n)
+    bit >>= 2;
+  while(bit != 0){
+    if(n >= root + bit){
+      n -= root + bit;
+      root = (root >> 1) + bit;
+    }else{
+      root >>= 1;
+    }
+    bit >>= 2;
+  }
+  return root;
+}
+
+/* acos of num/den, for |num| <= den */
+long iacos(long num, long den){
+  long x = (num*4096)/den;
+  return iatan2((long)isqrt(16777216L - x*x), x);
+}
+
+/* Body IK solver: compute where legs should be. */
+ik_req_t bodyIK(int X, int Y, int Z, int Xdisp, int Ydisp, float Zrot){
+    ik_req_t ans;
+
+    long rotX = radToBrad(bodyRotX);
+    long rotY = radToBrad(bodyRotY);
+    long cosB = icos(rotX);
+    long sinB = isin(rotX);
+    long cosG = icos(rotY);
+    long sinG = isin(rotY);
+    long a = radToBrad(bodyRotZ) + radToBrad(Zrot);
+    long cosA = icos(a);
+    long sinA = isin(a);
+    long sBsG = (sinB*sinG)/Q14;
+    long cBsG = (cosB*sinG)/Q14;
+
+    long totalX = (long)X + Xdisp + bodyPosX;
+    long totalY = (long)Y + Ydisp + bodyPosY;
+
+    long x = totalX*((cosG*cosA)/Q14) + totalY*((sBsG*cosA)/Q14 - (cosB*sinA)/Q14) + Z*((cBsG*cosA)/Q14 + (sinB*sinA)/Q14);
+    long y = totalX*((cosG*sinA)/Q14) + totalY*((sBsG*sinA)/Q14 + (cosB*cosA)/Q14) + Z*((cBsG*sinA)/Q14 - (sinB*cosA)/Q14);
+    long z = -totalX*sinG + totalY*((sinB*cosG)/Q14) + Z*((cosB*cosG)/Q14);
+
+    ans.x = totalX - x/Q14 + bodyPosX;
+    ans.y = totalY - y/Q14 + bodyPosY;
+    ans.z = Z - z/Q14;
+
+    return ans;
+}
+@ELSE
 /* Convert radians to servo position offset. */
 int radToServo(float rads){ 
   float val = rads * @RAD_TO_SERVO_RESOLUTION;
@@ -91,6 +203,7 @@ ik_req_t bodyIK(int X, int Y, int Z, int Xdisp, int Ydisp, float Zrot){
     
     return ans;
 }
+@END_IF
 
 @LEG_IK
 
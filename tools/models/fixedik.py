@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+
+""" Fixed-point body and leg IK, the same integer math as the exported
+    firmware (template.ik/nuke.cpp with "math fixed"), for checking it
+    offline. Angles are in brads, 16384 to a turn, trig is Q14 from tables.
+    Division truncates toward zero and float inputs are rounded to single
+    precision first, as on the AVR. Intermediates fit in 32 bits for links
+    up to 300mm. """
+
+import struct
+from math import sin, atan, pi, sqrt
+from models.chain import ChainSolver
+
+try:
+    import numpy
+    HAS_NUMPY=True
+except ImportError:
+    HAS_NUMPY=False
+
+BRADS = 16384               # brads per turn
+HALF = BRADS//2
+QUARTER = BRADS//4
+Q = 16384                   # 1.0 in Q14
+RAD_TO_BRAD = "2607.5945876"    # BRADS/(2*pi), as written into the firmware
+TIBIA_OFFSET = 4094         # 1.57 rad, as in the float solver
+
+# quarter wave of sin, and atan over 0..1, 256 steps each; the last entry
+# is repeated so interpolating at the end of the table needs no test
+SIN = [int(round(Q*sin(i*pi/512))) for i in range(257)]
+SIN.append(SIN[-1])
+ATAN = [int(round(atan(i/256.0)*BRADS/(2*pi))) for i in range(257)]
+ATAN.append(ATAN[-1])
+
+def f32(x):
+    """ round to single precision, like a float on the AVR. """
+    return struct.unpack("f", struct.pack("f", x))[0]
+
+RAD_TO_BRAD_F = f32(float(RAD_TO_BRAD))
+
+def brad(rads):
+    """ (long)(rads * RAD_TO_BRAD), in single precision. """
+    return int(f32(f32(rads)*RAD_TO_BRAD_F))
+
+def tdiv(a, b):
+    """ integer division, truncated toward zero as in C. """
+    q = abs(a)//abs(b)
+    if (a < 0) != (b < 0):
+        return -q
+    return q
+
+def isqrt(n):
+    """ floor(sqrt(n)). """
+    r = int(sqrt(n))
+    while r*r > n:
+        r = r - 1
+    while (r+1)*(r+1) <= n:
+        r = r + 1
+    return r
+
+def isin(a):
+    """ sin of a (brads), in Q14. """
+    a = a & (BRADS-1)
+    r = a & (QUARTER-1)
+    if a & QUARTER:
+        r = QUARTER - r
+    i = r >> 4
+    v = SIN[i] + (((SIN[i+1] - SIN[i])*(r & 15)) >> 4)
+    if a & HALF:
+        return -v
+    return v
+
+def icos(a):
+    return isin(a + QUARTER)
+
+def lookupAtan(r):
+    """ atan of r/65536, 0 <= r <= 65536, in brads. """
+    i = r >> 8
+    return ATAN[i] + (((ATAN[i+1] - ATAN[i])*(r & 255)) >> 8)
+
+def iatan2(y, x):
+    """ atan2 in brads. """
+    ax = abs(x)
+    ay = abs(y)
+    if ay <= ax:
+        if ax == 0:
+            return 0
+        a = lookupAtan((ay << 16)//ax)
+    else:
+        a = QUARTER - lookupAtan((ax << 16)//ay)
+    if x < 0:
+        a = HALF - a
+    if y < 0:
+        a = -a
+    return a
+
+def iacos(num, den):
+    """ acos of num/den in brads, for |num| <= den. """
+    x = tdiv(num*4096, den)
+    return iatan2(isqrt(4096*4096 - x*x), x)
+
+def toServo(b, resolution=1024):
+    """ brads to servo offset: 300 degree AX (3/40) or 360 degree MX (1/4). """
+    if resolution == 4096:
+        return tdiv(b, 4)
+    return tdiv(b*3, 40)
+
+###############################################################################
+# The solver, drop in for ChainSolver
+class FixedChainSolver(ChainSolver):
+    """ ChainSolver in the firmware's fixed-point math. legIK returns
+    brads, bodyIK integer offsets. """
+
+    def configure(self, coxa, femur, tibia, xCoxa, yCoxa, yMid):
+        ChainSolver.configure(self, int(coxa), int(femur), int(tibia), int(xCoxa), int(yCoxa), int(yMid))
+        self.femurTibia2 = 2*self.tibia*self.femur
+
+    def setBody(self, rotX, rotY, rotZ, posX, posY):
+        self.rotX = brad(rotX)
+        self.rotY = brad(rotY)
+        self.rotZ = brad(rotZ)
+        self.posX = int(posX)
+        self.posY = int(posY)
+        self.cosB = icos(self.rotX)
+        self.sinB = isin(self.rotX)
+        self.cosG = icos(self.rotY)
+        self.sinG = isin(self.rotY)
+
+    def bodyIK(self, X, Y, Z, Xdisp, Ydisp, Zrot):
+        """ Offsets of a foot due to the body pose, from setBody(). """
+        X, Y, Z = int(X), int(Y), int(Z)
+        cosB, sinB, cosG, sinG = self.cosB, self.sinB, self.cosG, self.sinG
+        a = self.rotZ + brad(Zrot)
+        cosA = icos(a)
+        sinA = isin(a)
+        sBsG = tdiv(sinB*sinG, Q)
+        cBsG = tdiv(cosB*sinG, Q)
+
+        totalX = X + int(Xdisp) + self.posX
+        totalY = Y + int(Ydisp) + self.posY
+
+        x = totalX*tdiv(cosG*cosA, Q) + totalY*(tdiv(sBsG*cosA, Q) - tdiv(cosB*sinA, Q)) + Z*(tdiv(cBsG*cosA, Q) + tdiv(sinB*sinA, Q))
+        y = totalX*tdiv(cosG*sinA, Q) + totalY*(tdiv(sBsG*sinA, Q) + tdiv(cosB*cosA, Q)) + Z*(tdiv(cBsG*sinA, Q) - tdiv(sinB*cosA, Q))
+        z = -totalX*sinG + totalY*tdiv(sinB*cosG, Q) + Z*tdiv(cosB*cosG, Q)
+        return [totalX - tdiv(x, Q) + self.posX, totalY - tdiv(y, Q) + self.posY, Z - tdiv(z, Q)]
+
+    def legIK(self, X, Y, Z):
+        """ Coxa, femur and tibia angles (brads), None if out of reach. """
+        X, Y, Z = int(X), int(Y), int(Z)
+        coxa = iatan2(X, Y)
+        trueX = isqrt(X*X + Y*Y) - self.coxa
+        im = isqrt(trueX*trueX + Z*Z)
+        if im == 0:
+            return None
+        d1 = self.femurSq - self.tibiaSq + im*im
+        d2 = self.femur2*im
+        if abs(d1) > d2:
+            return None
+        femur = iacos(d1, d2) - iatan2(Z, trueX)
+        d1 = self.femurSq - im*im + self.tibiaSq
+        if abs(d1) > self.femurTibia2:
+            return None
+        return (coxa, femur, iacos(d1, self.femurTibia2) - TIBIA_OFFSET)
+
+    def toServos(self, angles, resolution):
+        if angles == None:
+            return [1024,1024,1024]
+        return [toServo(a, resolution) for a in angles]
+
+###############################################################################
+# The same, over numpy arrays, for bulk solving
+if HAS_NUMPY:
+    SIN_A = numpy.array(SIN, dtype=numpy.int64)
+    ATAN_A = numpy.array(ATAN, dtype=numpy.int64)
+
+def bradArray(rads):
+    r = numpy.asarray(rads, dtype=numpy.float32)*numpy.float32(RAD_TO_BRAD_F)
+    return r.astype(numpy.int64)
+
+def tdivArray(a, b):
+    q = numpy.abs(a)//numpy.abs(b)
+    return numpy.where((a < 0) != (numpy.asarray(b) < 0), -q, q)
+
+def isqrtArray(n):
+    r = numpy.sqrt(n.astype(numpy.float64)).astype(numpy.int64)
+    r = r - (r*r > n)
+    return r + ((r+1)*(r+1) <= n)
+
+def isinArray(a):
+    a = a & (BRADS-1)
+    r = a & (QUARTER-1)
+    r = numpy.where(a & QUARTER, QUARTER - r, r)
+    i = r >> 4
+    v = SIN_A[i] + (((SIN_A[i+1] - SIN_A[i])*(r & 15)) >> 4)
+    return numpy.where(a & HALF, -v, v)
+
+def icosArray(a):
+    return isinArray(a + QUARTER)
+
+def iatan2Array(y, x):
+    ax = numpy.abs(x)
+    ay = numpy.abs(y)
+    low = ay <= ax
+    num = numpy.where(low, ay, ax)
+    den = numpy.where(low, ax, ay)
+    r = (num << 16)//numpy.where(den == 0, 1, den)
+    i = r >> 8
+    a = ATAN_A[i] + (((ATAN_A[i+1] - ATAN_A[i])*(r & 255)) >> 8)
+    a = numpy.where(low, a, QUARTER - a)
+    a = numpy.where(x < 0, HALF - a, a)
+    return numpy.where(y < 0, -a, a)
+
+def iacosArray(num, den):
+    """ den > 0 and |num| <= den, where it matters. """
+    x = numpy.clip(tdivArray(num*4096, numpy.where(den == 0, 1, den)), -4096, 4096)
+    return iatan2Array(isqrtArray(4096*4096 - x*x), x)
+
+def toServoArray(b, resolution=1024):
+    if resolution == 4096:
+        return tdivArray(b, 4)
+    return tdivArray(b*3, 40)
+
+def bodyIKArrays(solver, X, Y, Z, xDisp, yDisp, rot, pos, Zrot):
+    """ FixedChainSolver.bodyIK over arrays: X, Y, Z, Zrot are (N, legs),
+    xDisp, yDisp (legs), rot (N, 3) radians, pos (N, 2). """
+    X = numpy.trunc(X).astype(numpy.int64)
+    Y = numpy.trunc(Y).astype(numpy.int64)
+    Z = numpy.trunc(Z).astype(numpy.int64)
+    rot = bradArray(rot)
+    posX = numpy.trunc(pos[:,0:1]).astype(numpy.int64)
+    posY = numpy.trunc(pos[:,1:2]).astype(numpy.int64)
+    cosB = icosArray(rot[:,0:1])
+    sinB = isinArray(rot[:,0:1])
+    cosG = icosArray(rot[:,1:2])
+    sinG = isinArray(rot[:,1:2])
+    a = rot[:,2:3] + bradArray(Zrot)
+    cosA = icosArray(a)
+    sinA = isinArray(a)
+    sBsG = tdivArray(sinB*sinG, Q)
+    cBsG = tdivArray(cosB*sinG, Q)
+    totalX = X + numpy.asarray(xDisp, dtype=numpy.int64) + posX
+    totalY = Y + numpy.asarray(yDisp, dtype=numpy.int64) + posY
+    x = totalX*tdivArray(cosG*cosA, Q) + totalY*(tdivArray(sBsG*cosA, Q) - tdivArray(cosB*sinA, Q)) + Z*(tdivArray(cBsG*cosA, Q) + tdivArray(sinB*sinA, Q))
+    y = totalX*tdivArray(cosG*sinA, Q) + totalY*(tdivArray(sBsG*sinA, Q) + tdivArray(cosB*cosA, Q)) + Z*(tdivArray(cBsG*sinA, Q) - tdivArray(sinB*cosA, Q))
+    z = -totalX*sinG + totalY*tdivArray(sinB*cosG, Q) + Z*tdivArray(cosB*cosG, Q)
+    return totalX - tdivArray(x, Q) + posX, totalY - tdivArray(y, Q) + posY, Z - tdivArray(z, Q)
+
+def legIKArrays(solver, X, Y, Z):
+    """ FixedChainSolver.legIK over arrays, returns coxa, femur, tibia
+    (brads) and where it is reachable. """
+    X = numpy.trunc(X).astype(numpy.int64)
+    Y = numpy.trunc(Y).astype(numpy.int64)
+    Z = numpy.trunc(Z).astype(numpy.int64)
+    coxa = iatan2Array(X, Y)
+    trueX = isqrtArray(X*X + Y*Y) - solver.coxa
+    im = isqrtArray(trueX*trueX + Z*Z)
+    d1 = solver.femurSq - solver.tibiaSq + im*im
+    d2 = solver.femur2*im
+    t1 = solver.femurSq - im*im + solver.tibiaSq
+    reach = (im != 0) & (numpy.abs(d1) <= d2) & (numpy.abs(t1) <= solver.femurTibia2)
+    femur = iacosArray(d1, d2) - iatan2Array(Z, trueX)
+    tibia = iacosArray(t1, numpy.full(t1.shape, solver.femurTibia2, dtype=numpy.int64)) - TIBIA_OFFSET
+    return coxa, femur, tibia, reach
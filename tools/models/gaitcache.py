@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+
+""" LRU cache of precomputed gait cycles, for IK models. """
+
+from collections import OrderedDict
+
+class GaitCache:
+    def __init__(self, size=32):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        """ Return the table for key, or None. """
+        table = self.entries.pop(key, None)
+        if table != None:
+            self.entries[key] = table   # most recently used
+        return table
+
+    def put(self, key, table):
+        self.entries[key] = table
+        self.trim()
+
+    def resize(self, size):
+        self.size = size
+        self.trim()
+
+    def trim(self):
+        """ Drop least recently used tables until we fit. """
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries = OrderedDict()
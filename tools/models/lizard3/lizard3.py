@@ -19,9 +19,22 @@
   Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 """
 
-import wx
-from math import cos,sin,atan2,sqrt,acos
-from NukeEditor import NukeDialog
+try:
+    import wx
+    from NukeEditor import NukeDialog
+except ImportError:
+    # headless, as in the benchmarks, only the sign test needs wx
+    wx = None
+from models.gaitcache import GaitCache
+from models.reach import ReachMap
+from models.chain import Chain, ChainSolver, JOINTS, RAD_TO_SERVO
+from models import fixedik
+
+try:
+    import numpy
+    HAS_NUMPY=True
+except ImportError:
+    HAS_NUMPY=False
 
 # Some preliminaries
 def sq(x):  
@@ -29,14 +42,27 @@ def sq(x):
 # Convert radians to servo position offset.
 def radToServo(rads, resolution = 1024):
     if resolution == 4096:
-        return int(val*651.8986469044033)
+        return int(rads*651.8986469044033)
     else:
-        return int(val*195.56959407132098)
+        return int(rads*195.56959407132098)
 
 COXA = 0
 FEMUR = 1
 TIBIA = 2
 
+# legs, in doIK order: endpoint, gait, servo prefix, 
+#   coxa mount (X,Y) in units of (X_COXA, Y_COXA, Y_MID), mirror of the X/Y given to legIK
+LEGS = [("RIGHT_FRONT", "RF_GAIT", "RF", ( 1, 1, 0), ( 1, 1)),
+        ("RIGHT_REAR",  "RR_GAIT", "RR", (-1, 1, 0), (-1, 1)),
+        ("LEFT_FRONT",  "LF_GAIT", "LF", ( 1,-1, 0), ( 1,-1)),
+        ("LEFT_REAR",   "LR_GAIT", "LR", (-1,-1, 0), (-1,-1)),
+        ("RIGHT_MIDDLE","RM_GAIT", "RM", ( 0, 0, 1), ( 1, 1)),
+        ("LEFT_MIDDLE", "LM_GAIT", "LM", ( 0, 0,-1), ( 1,-1))]
+CHAINS = [Chain(*leg) for leg in LEGS]
+
+# solvers: floats as the Python model always did, or the firmware's fixed point
+SOLVERS = {"float": ChainSolver, "fixed": fixedik.FixedChainSolver}
+
 class lizard3(dict):
     X_COXA = 50     # MM between front and back legs /2
     Y_COXA = 50     # MM between front/back legs /2
@@ -44,6 +70,7 @@ class lizard3(dict):
     L_COXA = 50     # MM distance from coxa servo to femur servo 
     L_FEMUR = 50    # MM distance from femur servo to tibia servo 
     L_TIBIA = 50    # MM distance from tibia servo to foot 
+    Y_MID = 50      # MM between two middle legs /2
 
     bodyRotX = 0.0
     bodyRotY = 0.0
@@ -52,6 +79,12 @@ class lizard3(dict):
     bodyPosX = 0.0
     bodyPosY = 0.0
 
+    travelX = 50        # MM per cycle, just walk forward for now
+    travelY = 0
+    travelRotZ = 0      # rad per cycle
+
+    STEPS = 8           # steps in a gait cycle
+
     def setNextPose(self, servo, pos):
         self.nextPose[servo] = pos
 
@@ -91,9 +124,19 @@ class lizard3(dict):
         self.nextPose = [512 for i in range(3*self.legs+1)]
         self.signs = [1 for i in range(3*self.legs+1)]
         self.step = 0
+        self.gaitCache = GaitCache()    # gait cycle tables, see gaitTable()
+        self.gaitLast = None            # (gaitInputs(), table) walked last
+        self.reach = None               # (calibration, ReachMap per leg), see reachMaps()
+        self.reachLimits = True         # reach maps know the servo limits, not just the envelope
+        self.feet = None                # foot targets out of reach: None (solve anyway), "reject" or "clamp"
+        self.rejected = 0               # foot targets found out of reach
+        self.setMath("float")
 
     def config(self, opt, dims=None, servos=None, resolutions=None):
         self.legs = int(opt)
+        self.gaitCache.clear()
+        self.gaitLast = None
+        self.reach = None
 
         # VARS = coxaLen, femurLen, tibiaLen, xBody, yBody, midyBody, xCOG, yCOG
         if dims != None:
@@ -104,6 +147,7 @@ class lizard3(dict):
             self.Y_COXA = dims[4]
             self.Y_MID = dims[5]
             # cogs? 
+        self.solver.configure(self.L_COXA, self.L_FEMUR, self.L_TIBIA, self.X_COXA, self.Y_COXA, self.Y_MID)
 
         # SERVOS = Coxa, Femur, Tibia (LF, RF, LM, RM, LR, RR)
         if servos != None:
@@ -148,265 +192,300 @@ class lizard3(dict):
     def bodyIK(self, X, Y, Z, Xdisp, Ydisp, Zrot):
         """ Compute offsets based on Body positions. 
           BodyIK based on the work of Xan """    
-        ans = [0,0,0]   # (X,Y,Z)
-    
-        cosB = cos(self.bodyRotX)
-        sinB = sin(self.bodyRotX)
-        cosG = cos(self.bodyRotY)
-        sinG = sin(self.bodyRotY)
-        cosA = cos(self.bodyRotZ+Zrot)
-        sinA = sin(self.bodyRotZ+Zrot)
-    
-        totalX = int(X + Xdisp + self.bodyPosX); 
-        totalY = int(Y + Ydisp + self.bodyPosY); 
-    
-        ans[0] = int(totalX - int(totalX*cosG*cosA + totalY*sinB*sinG*cosA + Z*cosB*sinG*cosA - totalY*cosB*sinA + Z*sinB*sinA)) + self.bodyPosX
-        ans[1] = int(totalY - int(totalX*cosG*sinA + totalY*sinB*sinG*sinA + Z*cosB*sinG*sinA + totalY*cosB*cosA - Z*sinB*cosA)) + self.bodyPosY
-        ans[2] = int(Z - int(-totalX*sinG + totalY*sinB*cosG + Z*cosB*cosG))
-        
+        self.solver.setBody(self.bodyRotX, self.bodyRotY, self.bodyRotZ, self.bodyPosX, self.bodyPosY)
+        ans = self.solver.bodyIK(X, Y, Z, Xdisp, Ydisp, Zrot)
         if self.debug:        
             print "BodyIK:",ans
         return ans
 
     def legIK(self, X, Y, Z, resolution):
         """ Compute leg servo positions. """
-        ans = [0,0,0,0]    # (coxa, femur, tibia)
-       
-        try:
-            # first, make this a 2DOF problem... by solving coxa
-            ans[0] = radToServo(atan2(X,Y), resolution)
-            trueX = int(sqrt(sq(X)+sq(Y))) - self.L_COXA
-            im = int(sqrt(sq(trueX)+sq(Z)))  # length of imaginary leg
-            
-            # get femur angle above horizon...
-            q1 = -atan2(Z,trueX)
-            d1 = sq(self.L_FEMUR)-sq(self.L_TIBIA)+sq(im)
-            d2 = 2*self.L_FEMUR*im
-            q2 = acos(d1/float(d2))
-            ans[1] = radToServo(q1+q2, resolution)  
-        
-            # and tibia angle from femur...
-            d1 = sq(self.L_FEMUR)-sq(im)+sq(self.L_TIBIA)
-            d2 = 2*self.L_TIBIA*self.L_FEMUR;
-            ans[2] = radToServo(acos(d1/float(d2))-1.57, resolution)
-        except:
-            if self.debug:
-                "LegIK FAILED"
-            return [1024,1024,1024,0]
-
+        ans = self.solver.toServos(self.solver.legIK(X, Y, Z), resolution) + [0]    # (coxa, femur, tibia)
         if self.debug:
             print "LegIK:",ans
         return ans
 
-    def doIK(self):
-        fail = 0
-        req = [0,0,0,0]     # [x,y,z,r]
-        gait = [0,0,0,0]    # [x,y,z,r]
-        sol = [0,0,0]       # [coxa,femur,tibia]
+    def setMath(self, math):
+        """ Solve in "float", or in "fixed" point exactly as the exported
+        firmware does with math fixed. Fixed is slower here, it is for
+        checking an export, the editor always solves in float. """
+        self.math = math
+        self.solver = SOLVERS[math](CHAINS)
+        self.solver.configure(self.L_COXA, self.L_FEMUR, self.L_TIBIA, self.X_COXA, self.Y_COXA, self.Y_MID)
+
+    ###########################################################################
+    # Batched IK, for gait generation and offline analysis
+    def legMounts(self):
+        """ Return (Xdisp, Ydisp) of each leg's coxa. """
+        return [(mx*self.X_COXA, my*self.Y_COXA + mm*self.Y_MID) for (e,g,n,(mx,my,mm),m) in LEGS[0:self.legs]]
+
+    def batchIK(self, endpoints, gaits=None, bodyRot=None, bodyPos=None):
+        """ Solve body and leg IK for N poses of the robot in one pass.
+              endpoints: (N, legs, 3) foot positions, legs in LEGS order
+              gaits: (N, legs, 4) gait offsets (x,y,z,r), default none
+              bodyRot: (N, 3) body rotation X,Y,Z, default current
+              bodyPos: (N, 2) body position X,Y, default current
+            Returns (servos, ok), both (N, 3*legs+1) and indexed by servo ID
+            like nextPose. ok is False where the target is unreachable or
+            outside mins/maxs, those servos are left at neutral. Needs numpy. """
+        if not HAS_NUMPY:
+            raise ImportError("batchIK needs numpy")
+        ends = numpy.asarray(endpoints, dtype=numpy.float64)
+        n = ends.shape[0]
+        legs = self.legs
+        if gaits is None:
+            gaits = numpy.zeros((n, legs, 4))
+        gaits = numpy.asarray(gaits, dtype=numpy.float64)
+        if bodyRot is None:
+            bodyRot = [[self.bodyRotX, self.bodyRotY, self.bodyRotZ]]*n
+        bodyRot = numpy.asarray(bodyRot, dtype=numpy.float64)
+        if bodyPos is None:
+            bodyPos = [[self.bodyPosX, self.bodyPosY]]*n
+        bodyPos = numpy.asarray(bodyPos, dtype=numpy.float64)
+        trunc = numpy.trunc
+
+        # body IK, every leg of every pose at once -- (N, legs) arrays
+        X = ends[:,:,0] + gaits[:,:,0]
+        Y = ends[:,:,1] + gaits[:,:,1]
+        Z = ends[:,:,2] + gaits[:,:,2]
+        mounts = numpy.array(self.legMounts(), dtype=numpy.float64)
+        if self.math == "fixed":
+            return self.batchLegs(X, Y, Z, *fixedik.bodyIKArrays(self.solver, X, Y, Z, mounts[:,0], mounts[:,1], bodyRot, bodyPos, gaits[:,:,3]))
+        posX = bodyPos[:,0:1]
+        posY = bodyPos[:,1:2]
+        cosB = numpy.cos(bodyRot[:,0:1])
+        sinB = numpy.sin(bodyRot[:,0:1])
+        cosG = numpy.cos(bodyRot[:,1:2])
+        sinG = numpy.sin(bodyRot[:,1:2])
+        cosA = numpy.cos(bodyRot[:,2:3] + gaits[:,:,3])
+        sinA = numpy.sin(bodyRot[:,2:3] + gaits[:,:,3])
+        totalX = trunc(X + mounts[:,0] + posX)
+        totalY = trunc(Y + mounts[:,1] + posY)
+        reqX = trunc(totalX - trunc(totalX*cosG*cosA + totalY*sinB*sinG*cosA + Z*cosB*sinG*cosA - totalY*cosB*sinA + Z*sinB*sinA)) + posX
+        reqY = trunc(totalY - trunc(totalX*cosG*sinA + totalY*sinB*sinG*sinA + Z*cosB*sinG*sinA + totalY*cosB*cosA - Z*sinB*cosA)) + posY
+        reqZ = trunc(Z - trunc(-totalX*sinG + totalY*sinB*cosG + Z*cosB*cosG))
+        return self.batchLegs(X, Y, Z, reqX, reqY, reqZ)
+
+    def batchLegs(self, X, Y, Z, reqX, reqY, reqZ):
+        """ Leg half of batchIK, for feet at X, Y, Z with body IK req. """
+        n = X.shape[0]
+        legs = self.legs
+        mirror = numpy.array([m for (e,g,p,mount,m) in LEGS[0:legs]], dtype=numpy.float64)
+        coxa, femur, tibia, reach = self.legAngles(mirror[:,0]*(X + reqX), mirror[:,1]*(Y + reqY), Z + reqZ)
+
+        # to servo values, indexed by ID
+        servos = numpy.empty((n, 3*legs+1), dtype=numpy.int64)
+        servos[:] = numpy.asarray(self.neutrals[0:3*legs+1])
+        ok = numpy.ones((n, 3*legs+1), dtype=bool)
+        for i in range(legs):
+            prefix = LEGS[i][2]
+            resolution = self.resolutions[self.servos[prefix+JOINTS[COXA]]]
+            for joint, rads in zip(JOINTS, (coxa[:,i], femur[:,i], tibia[:,i])):
+                servo = self.servos[prefix+joint]
+                val = self.toServo(servo, rads, resolution)
+                good = reach[:,i] & (val < self.maxs[servo]) & (val > self.mins[servo])
+                servos[:,servo] = numpy.where(good, val, self.neutrals[servo])
+                ok[:,servo] = good
+        return servos, ok
+
+    def legAngles(self, lx, ly, lz):
+        """ legIK over numpy arrays of targets in the leg's frame. Returns
+        coxa, femur and tibia angles (radians, or brads in fixed point),
+        and where it is reachable. """
+        if self.math == "fixed":
+            return fixedik.legIKArrays(self.solver, lx, ly, lz)
+        trunc = numpy.trunc
+        coxa = numpy.arctan2(lx, ly)
+        trueX = trunc(numpy.sqrt(lx*lx + ly*ly)) - self.L_COXA
+        im = trunc(numpy.sqrt(trueX*trueX + lz*lz))
+        q1 = -numpy.arctan2(lz, trueX)
+        d2 = 2*self.L_FEMUR*im
+        cosQ2 = (self.L_FEMUR**2 - self.L_TIBIA**2 + im*im)/numpy.where(d2 == 0, 1, d2)
+        cosT = (self.L_FEMUR**2 - im*im + self.L_TIBIA**2)/float(2*self.L_TIBIA*self.L_FEMUR)
+        reach = (d2 != 0) & (numpy.abs(cosQ2) <= 1) & (numpy.abs(cosT) <= 1)
+        femur = q1 + numpy.arccos(numpy.clip(cosQ2, -1, 1))
+        tibia = numpy.arccos(numpy.clip(cosT, -1, 1)) - 1.57
+        return coxa, femur, tibia, reach
+
+    def toServo(self, servo, rads, resolution):
+        """ Servo value for numpy arrays of angles, as doIK computes it:
+        resolution is that of the leg's coxa, for all three joints. """
+        if self.math == "fixed":
+            return self.neutrals[servo] + self.signs[servo]*fixedik.toServoArray(rads, resolution)
+        return self.neutrals[servo] + self.signs[servo]*numpy.trunc(rads*RAD_TO_SERVO.get(resolution, RAD_TO_SERVO[1024]))
+
+    ###########################################################################
+    # Reachability, check or clamp foot targets before solving
+    def calibration(self):
+        """ Everything about the robot itself that the IK depends on. """
+        return (self.math, self.legs, self.L_COXA, self.L_FEMUR, self.L_TIBIA, self.X_COXA, self.Y_COXA, self.Y_MID,
+                tuple(sorted(self.servos.items())), tuple(self.resolutions),
+                tuple(self.mins), tuple(self.maxs), tuple(self.neutrals), tuple(self.signs))
+
+    def reachMaps(self, cell=5):
+        """ A ReachMap per leg, in LEGS order, built when the dimensions or
+        the captured limits (ik_min/ik_max) change. Without numpy, or with
+        reachLimits off, only the envelope is known, not the limits. """
+        key = (self.calibration(), self.reachLimits, cell)
+        if self.reach == None or self.reach[0] != key:
+            feasible = lambda i: self.reachLimits and self.legFeasible(i) or None
+            maps = [ReachMap(self.L_COXA, self.L_FEMUR, self.L_TIBIA, feasible(i), cell) for i in range(self.legs)]
+            self.reach = (key, maps)
+        return self.reach[1]
+
+    def legFeasible(self, i):
+        """ function telling, for arrays of leg frame targets, whether leg i
+        can reach them within its servo limits. """
+        prefix = LEGS[i][2]
+        resolution = self.resolutions[self.servos[prefix+JOINTS[COXA]]]
+        def feasible(x, y, z):
+            angles = self.legAngles(x, y, z)
+            good = angles[3]
+            for joint, rads in zip(JOINTS, angles[0:3]):
+                servo = self.servos[prefix+joint]
+                val = self.toServo(servo, rads, resolution)
+                good = good & (val < self.maxs[servo]) & (val > self.mins[servo])
+            return good
+        return feasible
+
+    def legTarget(self, i, X, Y, Z, r=0):
+        """ Foot position (endpoint plus gait) of leg i, into the frame of
+        the leg, with the current body pose. Returns that and the body IK. """
+        self.solver.setBody(self.bodyRotX, self.bodyRotY, self.bodyRotZ, self.bodyPosX, self.bodyPosY)
+        return self.solver.legTarget(CHAINS[i], X, Y, Z, r)
+
+    def footReachable(self, i, X, Y, Z, r=0):
+        """ Can leg i put its foot at X, Y, Z? """
+        target, req = self.legTarget(i, X, Y, Z, r)
+        return self.reachMaps()[i].reachable(*target)
+
+    def clampFoot(self, i, X, Y, Z, r=0):
+        """ Nearest foot position to X, Y, Z that leg i can reach, keeping
+        the body IK of the original target. """
+        (sx, sy) = LEGS[i][4]
+        target, req = self.legTarget(i, X, Y, Z, r)
+        x, y, z = self.reachMaps()[i].clamp(*target)
+        return (sx*x - req[0], sy*y - req[1], z - req[2])
+
+    def endpoints(self):
+        """ Current endpoints, as a (legs, 3) list for batchIK. """
+        return [list(self[e]) for (e,g,p,mount,m) in LEGS[0:self.legs]]
 
-        # right front leg
-        if self.gaitGen != None:
-            gait = self.gaitGen("RF_GAIT")    
-        if self.debug:
-            print "RIGHT_FRONT: ", [self["RIGHT_FRONT"][i] + gait[i] for i in range(3)]
-        servo = self.servos["RF Coxa"]  
-        req = self.bodyIK(self["RIGHT_FRONT"][0]+gait[0], self["RIGHT_FRONT"][1]+gait[1], self["RIGHT_FRONT"][2]+gait[2], self.X_COXA, self.Y_COXA, gait[3])
-        sol = self.legIK(self["RIGHT_FRONT"][0]+req[0]+gait[0],self["RIGHT_FRONT"][1]+req[1]+gait[1],self["RIGHT_FRONT"][2]+req[2]+gait[2], self.resolutions[servo])
-        output = self.neutrals[servo]+self.signs[servo]*sol[COXA]
-        if output < self.maxs[servo] and output > self.mins[servo]:
-            self.setNextPose(servo, output)
-        else:
-            if self.debug:
-                print "RF_COXA FAIL: ", output
-            fail = fail + 1
-        servo = self.servos["RF Femur"]
-        output = self.neutrals[servo]+self.signs[servo]*sol[FEMUR]
-        if output < self.maxs[servo] and output > self.mins[servo]:
-            self.setNextPose(servo, output)
-        else:
-            if self.debug:
-                print "RF_FEMUR FAIL: ", output
-            fail = fail + 1
-        servo = self.servos["RF Tibia"]
-        output = self.neutrals[servo]+self.signs[servo]*sol[TIBIA]
-        if output < self.maxs[servo] and output > self.mins[servo]:
-            self.setNextPose(servo, output)
-        else:            
-            if self.debug:
-                print "RF_TIBIA FAIL: ",output
-            fail = fail + 1
-        
-        # right rear leg 
-        if self.gaitGen != None:
-            gait = self.gaitGen("RR_GAIT")    
-        if self.debug:
-            print "RIGHT_REAR: ", [self["RIGHT_REAR"][i] + gait[i] for i in range(3)]
-        servo = self.servos["RR Coxa"]
-        req = self.bodyIK(self["RIGHT_REAR"][0]+gait[0],self["RIGHT_REAR"][1]+gait[1],self["RIGHT_REAR"][2]+gait[2], -self.X_COXA, self.Y_COXA, gait[3])
-        sol = self.legIK(-self["RIGHT_REAR"][0]-req[0]-gait[0],self["RIGHT_REAR"][1]+req[1]+gait[1],self["RIGHT_REAR"][2]+req[2]+gait[2], self.resolutions[servo])
-        output = self.neutrals[servo]+self.signs[servo]*sol[COXA]
-        if output < self.maxs[servo] and output > self.mins[servo]:
-            self.setNextPose(servo, output)
-        else:
-            if self.debug:
-                print "RR_COXA FAIL: ", output
-            fail = fail + 1
-        servo = self.servos["RR Femur"]
-        output = self.neutrals[servo]+self.signs[servo]*sol[FEMUR]
-        if output < self.maxs[servo] and output > self.mins[servo]:
-            self.setNextPose(servo, output)
-        else:
-            if self.debug:
-                print "RR_FEMUR FAIL:", output
-            fail = fail + 1
-        servo = self.servos["RR Tibia"]
-        output = self.neutrals[servo]+self.signs[servo]*sol[TIBIA]
-        if output < self.maxs[servo] and output > self.mins[servo]:
-            self.setNextPose(servo, output)
-        else:
-            if self.debug:
-                print "RR_TIBIA FAIL:", output
-            fail = fail + 1
-        
-        # left front leg
-        if self.gaitGen != None:
-            gait = self.gaitGen("LF_GAIT")    
-        if self.debug:
-            print "LEFT_FRONT: ", [self["LEFT_FRONT"][i] + gait[i] for i in range(3)]
-        servo = self.servos["LF Coxa"]
-        req = self.bodyIK(self["LEFT_FRONT"][0]+gait[0],self["LEFT_FRONT"][1]+gait[1],self["LEFT_FRONT"][2]+gait[2], self.X_COXA, -self.Y_COXA, gait[3])
-        sol = self.legIK(self["LEFT_FRONT"][0]+req[0]+gait[0],-self["LEFT_FRONT"][1]-req[1]-gait[1],self["LEFT_FRONT"][2]+req[2]+gait[2], self.resolutions[servo])
-        output = self.neutrals[servo]+self.signs[servo]*sol[COXA]
-        if output < self.maxs[servo] and output > self.mins[servo]:
-            self.setNextPose(servo, output)
-        else:
-            if self.debug:
-                print "LF_COXA FAIL:", output
-            fail = fail + 1
-        servo = self.servos["LF Femur"]
-        output = self.neutrals[servo]+self.signs[servo]*sol[FEMUR]
-        if output < self.maxs[servo] and output > self.mins[servo]:
-            self.setNextPose(servo, output)
-        else:
-            if self.debug:
-                print"LF_FEMUR FAIL:", output
-            fail = fail + 1
-        servo = self.servos["LF Tibia"]
-        output = self.neutrals[servo]+self.signs[servo]*sol[TIBIA]
-        if output < self.maxs[servo] and output > self.mins[servo]:
-            self.setNextPose(servo, output)
-        else:
-            if self.debug:
-                print "LF_TIBIA FAIL:", output
-            fail = fail + 1
+    def doIK(self):
+        fail = self.solveLegs(self.gaits())
+        self.step = self.step + 1
+        if self.step > 7:
+            self.step = 0   #gaitStep = (gaitStep+1)%stepsInGait
+        return fail
 
-        # left rear leg
-        if self.gaitGen != None:
-            gait = self.gaitGen("LR_GAIT")   
-        if self.debug:
-            print "LEFT_REAR: ", [self["LEFT_REAR"][i] + gait[i] for i in range(3)]
-        servo = self.servos["LR Coxa"]
-        req = self.bodyIK(self["LEFT_REAR"][0]+gait[0],self["LEFT_REAR"][1]+gait[1],self["LEFT_REAR"][2]+gait[2], -self.X_COXA, -self.Y_COXA, gait[3])
-        sol = self.legIK(-self["LEFT_REAR"][0]-req[0]-gait[0],-self["LEFT_REAR"][1]-req[1]-gait[1],self["LEFT_REAR"][2]+req[2]+gait[2], self.resolutions[servo])
-        output = self.neutrals[servo]+self.signs[servo]*sol[COXA]
-        if output < self.maxs[servo] and output > self.mins[servo]:
-            self.setNextPose(servo, output)
-        else:
-            if self.debug:
-                print "LR_COXA FAIL:", output
-            fail = fail + 1
-        servo = self.servos["LR Femur"]
-        output = self.neutrals[servo]+self.signs[servo]*sol[FEMUR]
-        if output < self.maxs[servo] and output > self.mins[servo]:
-            self.setNextPose(servo, output)
-        else:
+    def gaits(self):
+        """ Gait offsets [x,y,z,r] of each leg for this step. """
+        if self.gaitGen == None:
+            return [[0,0,0,0] for chain in CHAINS[0:self.legs]]
+        return [list(self.gaitGen(chain.gait)) for chain in CHAINS[0:self.legs]]
+
+    def solveLegs(self, gaits):
+        """ Body and leg IK of every leg for these gait offsets, into
+        nextPose. Returns the number of servos out of limits. With feet
+        set, targets are checked against the reach maps first: counted in
+        rejected, and then the leg is left where it was ("reject") or the
+        foot is pulled back within reach ("clamp"). """
+        fail = 0
+        self.solver.setBody(self.bodyRotX, self.bodyRotY, self.bodyRotZ, self.bodyPosX, self.bodyPosY)
+        if self.feet != None:
+            maps = self.reachMaps()
+        for i, (chain, gait) in enumerate(zip(CHAINS[0:self.legs], gaits)):
+            end = self[chain.endpoint]
+            if self.feet != None:
+                target, req = self.solver.legTarget(chain, end[0]+gait[0], end[1]+gait[1], end[2]+gait[2], gait[3])
+                if not maps[i].reachable(*target):
+                    self.rejected = self.rejected + 1
+                    if self.feet == "reject":
+                        continue
+                    (sx, sy) = chain.mirror
+                    x, y, z = maps[i].clamp(*target)
+                    gait = [sx*x - req[0] - end[0], sy*y - req[1] - end[1], z - req[2] - end[2], gait[3]]
             if self.debug:
-                print "LR_FEMUR FAIL:",output
-            fail = fail + 1
-        servo = self.servos["LR Tibia"]        
-        output = self.neutrals[servo]+self.signs[servo]*sol[TIBIA]
-        if output < self.maxs[servo] and output > self.mins[servo]:
-            self.setNextPose(servo, output)
-        else:
+                print chain.endpoint+": ", [end[i] + gait[i] for i in range(3)]
+            angles, req = self.solver.solve(chain, end, gait)
+            # all three joints use the resolution of the coxa servo
+            sol = self.solver.toServos(angles, self.resolutions[self.servos[chain.servos[COXA]]])
             if self.debug:
-                print "LR_TIBIA FAIL:", output
-            fail = fail + 1
-    
-        if self.legs > 4:
-            # right middle leg
-            if self.gaitGen != None:
-                gait = self.gaitGen("RM_GAIT")    
-            if self.debug:
-                print "RIGHT_MIDDLE: ", [self["RIGHT_MIDDLE"][i] + gait[i] for i in range(3)]
-            servo = self.servos["RM Coxa"]
-            req = self.bodyIK(self["RIGHT_MIDDLE"][0]+gait[0],self["RIGHT_MIDDLE"][1]+gait[1],self["RIGHT_MIDDLE"][2]+gait[2], 0, self.Y_MID, gait[3])
-            sol = self.legIK(+self["RIGHT_MIDDLE"][0]+req[0]+gait[0],self["RIGHT_MIDDLE"][1]+req[1]+gait[1],self["RIGHT_MIDDLE"][2]+req[2]+gait[2], self.resolutions[servo])
-            output = self.neutrals[servo]+self.signs[servo]*sol[COXA]
-            if output < self.maxs[servo] and output > self.mins[servo]:
-                self.setNextPose(servo, output)
-            else:
-                if self.debug:
-                    print "RM_COXA FAIL:", output
-                fail = fail + 1
-            servo = self.servos["RM Femur"]
-            output = self.neutrals[servo]+self.signs[servo]*sol[FEMUR]
-            if output < self.maxs[servo] and output > self.mins[servo]:
-                self.setNextPose(servo, output)
-            else:
-                if self.debug:
-                    print"RM_FEMUR FAIL:", output
-                fail = fail + 1
-            servo = self.servos["RM Tibia"]
-            output = self.neutrals[servo]+self.signs[servo]*sol[TIBIA]
-            if output < self.maxs[servo] and output > self.mins[servo]:
-                self.setNextPose(servo, output)
-            else:
-                if self.debug:
-                    print "RM_TIBIA FAIL:", output
-                fail = fail + 1
+                print "BodyIK:",req
+                print "LegIK:",sol
+            for joint in (COXA, FEMUR, TIBIA):
+                servo = self.servos[chain.servos[joint]]
+                output = self.neutrals[servo]+self.signs[servo]*sol[joint]
+                if output < self.maxs[servo] and output > self.mins[servo]:
+                    self.setNextPose(servo, output)
+                else:
+                    if self.debug:
+                        print chain.labels[joint]+" FAIL:", output
+                    fail = fail + 1
+        return fail
 
-            # left middle leg
-            if self.gaitGen != None:
-                gait = self.gaitGen("LM_GAIT")    
-            if self.debug:
-                print "LEFT_MIDDLE: ", [self["LEFT_MIDDLE"][i] + gait[i] for i in range(3)]
-            servo = self.servos["LM Coxa"] 
-            req = self.bodyIK(self["LEFT_MIDDLE"][0]+gait[0],self["LEFT_MIDDLE"][1]+gait[1],self["LEFT_MIDDLE"][2]+gait[2], 0, -self.Y_MID, gait[3])
-            sol = self.legIK(self["LEFT_MIDDLE"][0]+req[0]+gait[0],-self["LEFT_MIDDLE"][1]-req[1]-gait[1],self["LEFT_MIDDLE"][2]+req[2]+gait[2], self.resolutions[servo])
-            output = self.neutrals[servo]+self.signs[servo]*sol[COXA]
-            if output < self.maxs[servo] and output > self.mins[servo]:
-                self.setNextPose(servo, output)
-            else:
-                if self.debug:
-                    print "LM_COXA FAIL:", output
-                fail = fail + 1
-            servo = self.servos["LM Femur"]
-            output = self.neutrals[servo]+self.signs[servo]*sol[FEMUR]
-            if output < self.maxs[servo] and output > self.mins[servo]:
-                self.setNextPose(servo, output)
-            else:
-                if self.debug:
-                    print "LM_FEMUR FAIL:",output
-                fail = fail + 1
-            servo = self.servos["LM Tibia"]        
-            output = self.neutrals[servo]+self.signs[servo]*sol[TIBIA]
-            if output < self.maxs[servo] and output > self.mins[servo]:
-                self.setNextPose(servo, output)
-            else:
-                if self.debug:
-                    print "LM_TIBIA FAIL:", output
-                fail = fail + 1
-       
-        self.step = self.step + 1
-        if self.step > 7:
-            self.step = 0   #gaitStep = (gaitStep+1)%stepsInGait
+    ###########################################################################
+    # Cached gait cycles
+    def gaitInputs(self):
+        """ What a gait cycle depends on that changes while walking. """
+        return (getattr(self.gaitGen, "__name__", None), self.travelX, self.travelY, self.travelRotZ,
+                self.bodyRotX, self.bodyRotY, self.bodyRotZ, self.bodyPosX, self.bodyPosY, self.feet, self.reachLimits)
+
+    def gaitKey(self):
+        """ Everything a gait cycle depends on. """
+        return self.gaitInputs() + (tuple([tuple(e) for e in self.endpoints()]), self.calibration())
+
+    def gaitTable(self):
+        """ Return (poses, fails, rejected) for each step of the gait
+        cycle, from the cache if we have walked with these parameters
+        before. While the inputs stay the same this is one tuple compare,
+        the stance and calibration are only looked at when they change:
+        call config() after changing the robot itself. """
+        inputs = self.gaitInputs()
+        if self.gaitLast == None or self.gaitLast[0] != inputs:
+            key = self.gaitKey()
+            table = self.gaitCache.get(key)
+            if table == None:
+                table = self.buildGaitTable()
+                self.gaitCache.put(key, table)
+            self.gaitLast = (inputs, table)
+        return self.gaitLast[1]
+
+    def buildGaitTable(self):
+        """ Run doIK for two cycles, so the gait settles, and keep the second. """
+        saved = (self.step, self.debug, list(self.nextPose), dict([(g, list(self[g])) for (e,g,p,m,mi) in LEGS]))
+        self.debug = False
+        self.step = 0
+        poses = list()
+        fails = list()
+        rejected = list()
+        counted = self.rejected
+        for i in range(2*self.STEPS):
+            r = self.rejected
+            f = self.doIK()
+            if i >= self.STEPS:
+                poses.append(list(self.nextPose))
+                fails.append(f)
+                rejected.append(self.rejected - r)
+        self.step, self.debug, self.nextPose, gaits = saved
+        self.rejected = counted
+        for g, v in gaits.items():
+            self[g] = v
+        return (poses, fails, rejected)
+
+    def gaitStep(self):
+        """ Same as doIK, but a lookup in the gait table. """
+        poses, fails, rejected = self.gaitTable()
+        self.nextPose = list(poses[self.step])
+        self.rejected = self.rejected + rejected[self.step]
+        fail = fails[self.step]
+        self.step = (self.step + 1) % self.STEPS
         return fail
 
     def defaultGait(self,leg):        
-        # just walk forward for now
-        travelX = 50
-        travelY = 0
-        travelRotZ = 0
+        travelX = self.travelX
+        travelY = self.travelY
+        travelRotZ = self.travelRotZ
 
         if abs(travelX)>5 or abs(travelY)>5 or abs(travelRotZ) > 0.05:   # are we moving?
             if(self.order[leg] == self.step):
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+""" Reachability maps for 3DOF (coxa, femur, tibia) legs. """
+
+from math import sqrt, copysign
+
+try:
+    import numpy
+    HAS_NUMPY=True
+except ImportError:
+    HAS_NUMPY=False
+
+class ReachMap:
+    """ Where a foot can go, in the leg's own frame (the X, Y, Z handed to
+    legIK). The envelope is analytic and exact: the femur-tibia triangle
+    can close. If given a feasible(x, y, z) function over numpy arrays, a
+    voxel grid also records where the servo limits allow it, sampled at
+    the cell centers. Both are checked in constant time. """
+
+    def __init__(self, coxa, femur, tibia, feasible=None, cell=5):
+        self.coxa = coxa
+        self.rMin = abs(femur - tibia)  # femur-tibia reach, from the femur servo
+        self.rMax = femur + tibia
+        self.cell = float(cell)
+        self.grid = None
+        if feasible != None and HAS_NUMPY:
+            self.build(feasible)
+
+    def build(self, feasible):
+        """ sample feasible() at the center of each cell. """
+        self.lo = (-(self.coxa + self.rMax), -(self.coxa + self.rMax), -self.rMax)
+        axes = list()
+        for lo in self.lo:
+            count = int(-2*lo/self.cell) + 1
+            axes.append(lo + self.cell*(numpy.arange(count) + 0.5))
+        x, y, z = numpy.meshgrid(axes[0], axes[1], axes[2], indexing="ij")
+        self.grid = feasible(x, y, z) & self.envelope(x, y, z)
+
+    def envelope(self, x, y, z):
+        """ numpy version of inEnvelope, for arrays of points. """
+        trueX = numpy.trunc(numpy.sqrt(x*x + y*y)) - self.coxa
+        im = numpy.trunc(numpy.sqrt(trueX*trueX + z*z))
+        return (im > 0) & (im >= self.rMin) & (im <= self.rMax)
+
+    def inEnvelope(self, x, y, z):
+        """ Will legIK find a solution? Same truncation as legIK. """
+        trueX = int(sqrt(x*x + y*y)) - self.coxa
+        im = int(sqrt(trueX*trueX + z*z))
+        return im > 0 and im >= self.rMin and im <= self.rMax
+
+    def reachable(self, x, y, z):
+        """ Inside the envelope and, if we have a grid, the servo limits. """
+        if not self.inEnvelope(x, y, z):
+            return False
+        if self.grid is None:
+            return True
+        i = int((x - self.lo[0])/self.cell)
+        j = int((y - self.lo[1])/self.cell)
+        k = int((z - self.lo[2])/self.cell)
+        shape = self.grid.shape
+        if i < 0 or j < 0 or k < 0 or i >= shape[0] or j >= shape[1] or k >= shape[2]:
+            return False
+        return bool(self.grid[i,j,k])
+
+    def clamp(self, x, y, z):
+        """ Pull a target onto the envelope, along the line from the femur
+        servo, keeping its heading. Servo limits are not considered. """
+        if self.inEnvelope(x, y, z):
+            return (x, y, z)
+        rho = sqrt(x*x + y*y)
+        trueX = rho - self.coxa
+        im = sqrt(trueX*trueX + z*z)
+        if im == 0:
+            trueX, im = 1.0, 1.0
+        # inside the limits by a little, so truncation can't put us back outside
+        r = min(max(im, self.rMin + 2), self.rMax - 1)
+        trueX = trueX*r/im
+        z = z*r/im
+        rho2 = trueX + self.coxa
+        if rho2 < 0:
+            # would pass through the coxa axis, stay on it instead
+            rho2 = 0.0
+            z = copysign(sqrt(max(r*r - self.coxa*self.coxa, 0)), z)
+        if rho == 0:
+            return (0.0, rho2, z)
+        return (x*rho2/rho, y*rho2/rho, z)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+""" Template engine for the NUKE sketch export. Templates are compiled once
+    into a list of literal text and @NAME tokens, kept until their file
+    changes, and rendered in one pass. """
+
+import os, re
+
+NAME = re.compile(r"@[A-Za-z0-9_]+")
+
+def tokenize(text):
+    """ Split text into literals (str) and names (1-tuples). """
+    tokens = list()
+    last = 0
+    for m in NAME.finditer(text):
+        if m.start() > last:
+            tokens.append(text[last:m.start()])
+        tokens.append((m.group(0),))
+        last = m.end()
+    if last < len(text):
+        tokens.append(text[last:])
+    return tokens
+
+def render(tokens, values, sections, out=None):
+    """ Substitute sections (which are themselves token lists) and values
+    for names, in one pass. Unknown names are left as they are. """
+    if out == None:
+        out = list()
+    for t in tokens:
+        if type(t) is not tuple:
+            out.append(t)
+        elif t[0] in sections:
+            render(sections[t[0]], values, sections, out)
+        else:
+            out.append(values.get(t[0], t[0]))
+    return out
+
+def parseSections(lines):
+    """ Code sections of a template.ik: a line starting with @NAME opens
+    one, a line with @END_SECTION closes it. """
+    code = dict()
+    current = ""
+    for line in lines:
+        if line.find("@") == 0 and current == "":
+            current = line.strip().rstrip()
+        elif line.find("@END_SECTION") > -1:
+            current = ""
+        else:
+            code[current] = code.get(current, "") + line
+    code.pop("", None)
+    return code
+
+def conditionals(text, params):
+    """ Apply @IF var val [val..] / @ELSE / @END_IF to the lines of text,
+    blocks do not nest. Trailing whitespace is dropped from every line. """
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    out = list()
+    keep = True
+    for line in lines:
+        if line.find("@IF") >= 0:
+            rest = line[line.find("@IF")+3:].strip()
+            var = rest[0:rest.find(" ")].rstrip()
+            keep = params[var] in rest[rest.find(" ")+1:].split()
+        elif line.find("@ELSE") >= 0:
+            keep = not keep
+        elif line.find("@END_IF") >= 0:
+            keep = True
+        elif keep:
+            out.append(line.rstrip())
+    out.append("")
+    return "\n".join(out)
+
+class TemplateCache:
+    """ Compiled templates and code sections, by path, recompiled when the
+    file's mtime changes. """
+
+    def __init__(self):
+        self.entries = dict()   # (kind, path) -> (mtime, compiled)
+
+    def get(self, kind, path, build):
+        mtime = os.path.getmtime(path)
+        entry = self.entries.get((kind, path))
+        if entry == None or entry[0] != mtime:
+            entry = (mtime, build(open(path).read()))
+            self.entries[(kind, path)] = entry
+        return entry[1]
+
+    def template(self, path):
+        """ Token list of a template file. """
+        return self.get("template", path, tokenize)
+
+    def sections(self, path):
+        """ name -> token list, for the code sections of a template.ik. """
+        return self.get("sections", path, lambda text: dict([(k, tokenize(v)) for k, v in parseSections(text.splitlines(True)).items()]))
+
+    def clear(self):
+        self.entries = dict()
+
+CACHE = TemplateCache()
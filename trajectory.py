@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+"""
+  PyPose: precompiled trajectories for sequences
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software Foundation,
+  Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+from array import array
+from collections import OrderedDict
+import project
+import motion
+
+###############################################################################
+# A compiled sequence
+class Trajectory:
+    """ Dense frame table for a sequence, frames x servos of uint16.
+    Transition i runs from pose i-1 to pose i, and the first one runs from
+    the last pose, so looping the table is seamless. """
+
+    def __init__(self, poses, times, frameRate, profile):
+        self.poses = poses          # keyframe poses
+        self.times = times          # keyframe delta-T (mS)
+        self.frameRate = frameRate
+        self.profile = profile
+        self.keyframes = list()     # table row of each keyframe
+        blocks = list()
+        rows = 0
+        for i in range(len(poses)):
+            n = max(1, int(times[i]*frameRate/1000))
+            blocks.append(motion.interpolate(poses[i-1], poses[i], n, profile))
+            rows = rows + n
+            self.keyframes.append(rows-1)
+        if motion.HAS_NUMPY:
+            self.table = motion.numpy.vstack(blocks)
+        else:
+            self.table = [array('H', frame) for block in blocks for frame in block]
+        self._packets = None
+
+    def __len__(self):
+        return len(self.table)
+
+    def packets(self):
+        """ syncWrite parameters for every row, built once. """
+        if self._packets == None:
+            self._packets = motion.packets(self.table)
+        return self._packets
+
+###############################################################################
+# Cache of compiled sequences
+class TrajectoryCache:
+    """ LRU of Trajectories, keyed by the content of the sequence and of
+    the poses it references, so edits never replay a stale table. """
+
+    def __init__(self, size=16):
+        self.size = size
+        self.entries = OrderedDict()
+        self.users = dict()     # pose name -> keys of entries that use it
+
+    def key(self, prj, seqName, frameRate, profile):
+        names = [project.tranPose(t) for t in prj.sequences[seqName]]
+        poses = tuple([(p, tuple(prj.poses[p])) for p in names if p in prj.poses])
+        return (tuple(prj.sequences[seqName]), poses, frameRate, profile)
+
+    def get(self, prj, seqName, frameRate=30, profile="linear"):
+        """ Return the Trajectory for a sequence, None if it has no poses. """
+        k = self.key(prj, seqName, frameRate, profile)
+        if k in self.entries:
+            traj = self.entries.pop(k)
+            self.entries[k] = traj  # most recently used
+            return traj
+        poses = list()
+        times = list()
+        for t in prj.sequences[seqName]:
+            p = project.tranPose(t)
+            if p not in prj.poses:
+                print("Skipping transition to unknown pose " + p)
+                continue
+            poses.append(list(prj.poses[p]))
+            times.append(project.tranTime(t))
+        if len(poses) == 0:
+            return None
+        traj = Trajectory(poses, times, frameRate, profile)
+        self.entries[k] = traj
+        for p, values in k[1]:
+            self.users.setdefault(p, set()).add(k)
+        while len(self.entries) > self.size:
+            self.drop(next(iter(self.entries)))
+        return traj
+
+    def drop(self, k):
+        if k in self.entries:
+            del self.entries[k]
+            for p, values in k[1]:
+                self.users.get(p, set()).discard(k)
+
+    def invalidatePose(self, poseName):
+        """ A pose was edited, drop every table that uses it. """
+        for k in list(self.users.pop(poseName, ())):
+            self.drop(k)
+
+    def clear(self):
+        self.entries = OrderedDict()
+        self.users = dict()
+
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+
+"""
+  PyPose: host-side walking, the IK model driven by a Commander
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software Foundation,
+  Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+"""
+
+import time, threading
+import motion
+from ax12 import P_GOAL_POSITION_L
+from player import FrameStats
+from monotonic import clock
+
+# Commander buttons, as in commander.py
+BUT_RT = 64
+BUT_LT = 128
+
+STD_TRANSITION = 0.098  # S per gait step, as in the NUKE firmware
+
+###############################################################################
+# Frame timing statistics
+class Duration:
+    """ Mean and worst of a time taken once per frame. """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+
+    def record(self, dt):
+        self.count = self.count + 1
+        self.total = self.total + dt
+        if dt > self.worst:
+            self.worst = dt
+
+    def __str__(self):
+        if self.count == 0:
+            return "-"
+        return "mean %.2f max %.2f mS" % (1000*self.total/self.count, 1000*self.worst)
+
+class WalkStats(FrameStats):
+    """ FrameStats, plus how long the IK solve and the send take. """
+
+    def reset(self):
+        FrameStats.reset(self)
+        self.solve = Duration()
+        self.send = Duration()
+        self.fails = 0      # servo positions out of limits, not sent
+        self.clamped = 0    # foot targets out of reach, pulled back within it
+
+    def __str__(self):
+        return (FrameStats.__str__(self) + ", solve " + str(self.solve) + ", send " + str(self.send) + ", " +
+                str(self.fails) + " fails, " + str(self.clamped) + " clamped")
+
+###############################################################################
+# The walking loop
+class Walker:
+    """ Runs the IK model on the host: Commander inputs are mapped to body
+    rotation and travel the way the NUKE firmware does it, the IK is solved
+    every frame and the pose is streamed with one syncWrite, through any
+    driver. Gait offsets are interpolated between steps, so the legs move
+    smoothly however fast the frame rate. The model needs gaits(),
+    solveLegs(), nextPose, step and STEPS, like lizard3. If it also has
+    gaitTable(), once the inputs have held for a whole gait cycle the
+    frames are interpolated between the poses of its table instead of
+    solved, until the inputs change. If it has reachMaps(), foot targets
+    out of reach are clamped back within it before they are solved. """
+
+    def __init__(self, port, model, frameRate=40, stepTime=STD_TRANSITION):
+        self.port = port
+        self.model = model
+        self.frameRate = frameRate
+        self.stepTime = stepTime    # S per gait step
+        self.stats = WalkStats()
+        self.thread = None
+        self.halted = threading.Event()
+        self.multiplier = 1         # 2 gives up to 200mm/s, as on the firmware
+        self.inputs = (0, 0, 0, 0, 0)
+        self.stepInputs = None      # inputs at the last step, and
+        self.steadySteps = 0        # how many steps they have held
+        self.model.debug = False    # printing every frame would wreck the timing
+        if hasattr(self.model, "reachMaps"):
+            self.model.feet = "clamp"
+
+    def command(self, lookV, lookH, walkV, walkH, buttons):
+        """ Latest Commander values, -100 to 100, same order as
+        Commander.sendPacket. Safe to call from the GUI thread. """
+        self.inputs = (lookV, lookH, walkV, walkH, buttons)
+
+    def applyInputs(self):
+        """ Commander to model, as default.pde does. Speeds are mm/s and
+        rad/s, the model wants travel per gait cycle. """
+        lookV, lookH, walkV, walkH, buttons = self.inputs
+        m = self.model
+        cycleTime = m.STEPS*self.stepTime
+        m.travelX = self.multiplier*walkV*cycleTime
+        if buttons & BUT_LT:
+            m.travelY = (self.multiplier*walkH)/2.0*cycleTime
+        else:
+            m.travelRotZ = -(self.multiplier*walkH)/250.0*cycleTime
+        m.bodyRotY = lookV/250.0
+        if buttons & BUT_RT:
+            m.bodyRotX = lookH/250.0
+        else:
+            m.bodyRotZ = lookH/250.0
+
+    def walking(self):
+        return self.thread != None and self.thread.is_alive()
+
+    def start(self):
+        """ Start walking, returns immediately. """
+        self.halt()
+        self.halted.clear()
+        self.stats.reset()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def halt(self):
+        """ Stop, at the next frame. The robot holds the last pose. """
+        if self.walking():
+            self.halted.set()
+            self.thread.join()
+            print("Walk done: " + str(self.stats))
+
+    def nextStep(self):
+        """ Advance the gait a step, return (step, its offsets). """
+        m = self.model
+        step = m.step
+        gaits = m.gaits()   # the gait keeps its state even from the table
+        m.step = (m.step + 1) % m.STEPS
+        inputs = (self.inputs, self.multiplier)
+        if inputs == self.stepInputs:
+            self.steadySteps = self.steadySteps + 1
+        else:
+            self.stepInputs = inputs
+            self.steadySteps = 0
+        return (step, gaits)
+
+    def steady(self):
+        """ Have the inputs held long enough for the gait to settle into
+        the cycle the model's gaitTable() has? """
+        return (hasattr(self.model, "gaitTable") and self.steadySteps >= self.model.STEPS
+                and (self.inputs, self.multiplier) == self.stepInputs)
+
+    def frame(self, prev, next, t):
+        """ Solve the IK for the gait offsets a fraction t from prev to
+        next, (step, offsets) each, and send the pose. """
+        start = clock()
+        self.applyInputs()
+        m = self.model
+        if self.steady():
+            poses, fails, rejected = m.gaitTable()
+            a = poses[prev[0]]
+            b = poses[next[0]]
+            m.nextPose = [a[0]] + [int(p + (n-p)*t) for p, n in zip(a[1:], b[1:])]
+            if t < 0.5:
+                step = prev[0]
+            else:
+                step = next[0]
+            self.stats.fails = self.stats.fails + fails[step]
+            self.stats.clamped = self.stats.clamped + rejected[step]
+        else:
+            gaits = [[p + (n-p)*t for p, n in zip(pg, ng)] for pg, ng in zip(prev[1], next[1])]
+            clamped = getattr(m, "rejected", 0)
+            self.stats.fails = self.stats.fails + m.solveLegs(gaits)
+            self.stats.clamped = self.stats.clamped + getattr(m, "rejected", 0) - clamped
+        packet = motion.packets([m.nextPose[1:]])[0]
+        solved = clock()
+        self.port.syncWrite(P_GOAL_POSITION_L, packet)
+        self.stats.solve.record(solved - start)
+        self.stats.send.record(clock() - solved)
+
+    def run(self):
+        period = 1.0/self.frameRate
+        if hasattr(self.model, "reachMaps"):
+            self.model.reachMaps()      # build them now, not in the first frame
+        self.applyInputs()
+        prev = self.nextStep()
+        next = self.nextStep()
+        phase = 0.0         # fraction of the way from prev to next
+        start = clock()
+        k = 0               # frame number since start, deadlines are absolute so we don't drift
+        while not self.halted.is_set():
+            k = k + 1
+            deadline = start + k*period
+            now = clock()
+            if now < deadline:
+                time.sleep(deadline - now)
+            if now - deadline > period:
+                # fell behind, skip the frame but keep the gait moving
+                self.stats.miss()
+            else:
+                self.stats.record(clock() - deadline)
+                self.frame(prev, next, phase)
+            phase = phase + period/self.stepTime
+            while phase >= 1.0:
+                phase = phase - 1.0
+                prev = next
+                next = self.nextStep()